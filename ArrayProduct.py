@@ -0,0 +1,247 @@
+import Node
+import numpy as np
+
+
+class ArrayProduct:
+    # @brief    The product of an ArrayTransitionSystem and an automaton, built
+    #           and solved with bulk array operations
+    #
+    # The product is searched breadth first like DFA.formAndSolveProduct, but
+    # a whole BFS layer at a time: the successors of every product state in
+    # the frontier are gathered from the TS's CSR arrays, and their automaton
+    # states are computed in one table lookup,
+    #
+    #   qNext = transTable[q, TS obs bitmask]
+    #
+    # across the whole frontier. Product states are identified by the packed
+    # key (TS state index * numQ + q), and the product graph is emitted as
+    # arrays rather than linked Nodes:
+    #   - tsState[i], q[i]: the TS state and automaton state of product
+    #     state i
+    #   - parent[i]: the product state i was first reached from (-1 for the
+    #     start), which makes the BFS tree
+    #   - edgeSources, edgeTargets: all of the product transitions found
+    #
+    # Product states are numbered in the order DFA.formAndSolveProduct would
+    # discover them in, so both find the same optimal trace.
+
+    #
+    # @brief      Constructs the ArrayProduct object.
+    #
+    # @param      self              The ArrayProduct object instance
+    # @param      ATS               The ArrayTransitionSystem to product with
+    #                               the automaton
+    # @param      automaton         The automaton encoding the specification,
+    #                               e.g. an LDBA.LDBA or an S_PDFA.S_PDFA
+    # @param      stopAtFirstAccept Whether to stop the search at the BFS
+    #                               layer with the first accepting product
+    #                               state, or to build the whole reachable
+    #                               product
+    #
+    def __init__(self, ATS, automaton, stopAtFirstAccept=True):
+
+        transTable = getTransTable(automaton)
+        numQ = len(transTable)
+        isAccepting = np.zeros(numQ, dtype=bool)
+        isAccepting[list(automaton.DFA.accepts)] = True
+        isDead = getDeadStates(transTable, isAccepting)
+
+        startQ = automaton.DFA.startNode.state.q
+
+        # product state index of every packed (TS state, q) key found so far
+        prodIndex = np.full(len(ATS) * numQ, -1, dtype=np.int64)
+        prodIndex[0 * numQ + startQ] = 0
+
+        tsStates = [np.array([0], dtype=np.int64)]
+        qs = [np.array([startQ], dtype=np.int64)]
+        parents = [np.array([-1], dtype=np.int64)]
+        edgeSources = []
+        edgeTargets = []
+
+        frontierProd = np.array([0], dtype=np.int64)
+        frontierTS = tsStates[0]
+        frontierQ = qs[0]
+        numProd = 1
+        numExpanded = 0
+        acceptingIndex = None
+        isDone = False
+
+        while len(frontierProd) and not isDone:
+
+            numExpanded += len(frontierProd)
+
+            # gather the TS successors of the whole frontier from the CSR
+            # arrays, in frontier order and then edge order
+            starts = ATS.edgeOffsets[frontierTS]
+            counts = ATS.edgeOffsets[frontierTS + 1] - starts
+            parentLocal = np.repeat(np.arange(len(frontierProd)), counts)
+            edgeRank = np.arange(len(parentLocal)) - \
+                np.repeat(np.cumsum(counts) - counts, counts)
+            childTS = ATS.edgeTargets[starts[parentLocal] + edgeRank]\
+                .astype(np.int64)
+
+            childQ = transTable[frontierQ[parentLocal], ATS.obs[childTS]]
+
+            # anything after reaching a dead automaton state will not work
+            alive = ~isDead[childQ]
+            parentLocal = parentLocal[alive]
+            childTS = childTS[alive]
+            childQ = childQ[alive]
+            keys = childTS * numQ + childQ
+
+            # number the product states seen for the first time, in order of
+            # their first appearance
+            isNew = (prodIndex[keys] < 0)
+            _, firstIdx = np.unique(keys[isNew], return_index=True)
+            newIdx = np.flatnonzero(isNew)[np.sort(firstIdx)]
+            prodIndex[keys[newIdx]] = np.arange(numProd,
+                                                numProd + len(newIdx))
+
+            edgeSources.append(frontierProd[parentLocal])
+            edgeTargets.append(prodIndex[keys])
+
+            tsStates.append(childTS[newIdx])
+            qs.append(childQ[newIdx])
+            parents.append(frontierProd[parentLocal[newIdx]])
+
+            # the first accepting state found is the optimal one either way,
+            # the flag only decides whether the rest is built too
+            newAccepting = np.flatnonzero(isAccepting[childQ[newIdx]])
+            if len(newAccepting) and acceptingIndex is None:
+                acceptingIndex = numProd + int(newAccepting[0])
+                isDone = stopAtFirstAccept
+
+            frontierProd = np.arange(numProd, numProd + len(newIdx))
+            frontierTS = childTS[newIdx]
+            frontierQ = childQ[newIdx]
+            numProd += len(newIdx)
+
+        self.ATS = ATS
+        self.numQ = numQ
+        self.tsState = np.concatenate(tsStates)
+        self.q = np.concatenate(qs)
+        self.parent = np.concatenate(parents)
+        self.edgeSources = np.concatenate(edgeSources) if edgeSources else \
+            np.zeros(0, dtype=np.int64)
+        self.edgeTargets = np.concatenate(edgeTargets) if edgeTargets else \
+            np.zeros(0, dtype=np.int64)
+        self.acceptingIndex = acceptingIndex
+        self.numExpanded = numExpanded
+
+    #
+    # @brief      The number of product states found
+    #
+    # @param      self  The ArrayProduct object instance
+    #
+    def __len__(self):
+
+        return len(self.tsState)
+
+    #
+    # @brief      Gets the BFS tree path from the start to a product state
+    #
+    # @param      self   The ArrayProduct object instance
+    # @param      index  The product state index, defaults to the first
+    #                    accepting product state found
+    #
+    # @return     array of product state indices with the start at index = 0,
+    #             or None if there is no such product state
+    #
+    def getPath(self, index=None):
+
+        if index is None:
+            index = self.acceptingIndex
+        if index is None:
+            return None
+
+        path = []
+        while index >= 0:
+            path.append(index)
+            index = self.parent[index]
+        path.reverse()
+
+        return np.array(path, dtype=np.int64)
+
+    #
+    # @brief      Gets the BFS tree path to a product state as Node objects,
+    #             like DFA.getPathToRootFromLeaf returns, for printing and
+    #             POS.plotCarAndPOS
+    #
+    # @param      self   The ArrayProduct object instance
+    # @param      index  The product state index, defaults to the first
+    #                    accepting product state found
+    #
+    # @return     A list of Node objects with the start at index = 0, or None
+    #             if there is no such product state
+    #
+    def getNodePath(self, index=None):
+
+        path = self.getPath(index)
+        if path is None:
+            return None
+
+        ATS = self.ATS
+        Nodes = []
+        for prodIdx in path:
+            tsIdx = self.tsState[prodIdx]
+            state = Node.NodeState(carX=int(ATS.carX[tsIdx]),
+                                   carY=int(ATS.carY[tsIdx]),
+                                   carT=int(ATS.carT[tsIdx]),
+                                   q=int(self.q[prodIdx]),
+                                   prevLane=int(ATS.prevLane[tsIdx]),
+                                   prevVel=int(ATS.prevVel[tsIdx]))
+            obs = Node.observationFromBitmask(int(ATS.obs[tsIdx]))
+            parent = Nodes[-1] if Nodes else None
+            Nodes.append(Node.Node(state=state, index=int(prodIdx), obs=obs,
+                                   adjList=[], parent=parent))
+
+        return Nodes
+
+
+#
+# @brief      Gets the dense transition table of an automaton
+#
+# @param      automaton  The automaton, e.g. an LDBA.LDBA or an S_PDFA.S_PDFA
+#
+# @return     int64 array such that table[q, obs bitmask] is the next state.
+#             Automata compiled from LTL already carry their table, any other
+#             automaton has its transFcn tabulated over every observation.
+#
+def getTransTable(automaton):
+
+    if hasattr(automaton, 'transTable'):
+        return np.asarray(automaton.transTable, dtype=np.int64)
+
+    numQ = len(automaton.DFA.nodes)
+    numObs = Node.AT_GOAL | Node.CRASHED | Node.SPEEDING
+
+    table = np.zeros((numQ, numObs + 1), dtype=np.int64)
+    for q in range(numQ):
+        for obsMask in range(numObs + 1):
+            obs = Node.observationFromBitmask(obsMask)
+            table[q, obsMask] = automaton.DFA.transFcn(q, obs)
+
+    return table
+
+
+#
+# @brief      Finds the automaton states from which no accepting state can be
+#             reached, under any sequence of observations
+#
+# @param      transTable   The dense transition table
+# @param      isAccepting  Boolean array, True for the accepting states
+#
+# @return     boolean array, True for the dead states
+#
+def getDeadStates(transTable, isAccepting):
+
+    canAccept = isAccepting.copy()
+
+    # grow the set of states with a path to acceptance until it is closed
+    while True:
+        grown = canAccept | canAccept[transTable].any(axis=1)
+        if np.array_equal(grown, canAccept):
+            break
+        canAccept = grown
+
+    return ~canAccept
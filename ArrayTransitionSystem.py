@@ -0,0 +1,611 @@
+import Node
+import DFA
+import TransitionSystem
+import Collision
+import GoalSet
+import Instrumentation
+import numpy as np
+from array import array
+from collections import deque
+
+
+class ArrayTransitionSystem(TransitionSystem.TransitionSystem):
+    # @brief    A compact, array backed version of the TransitionSystem
+    #
+    # Instead of one Node object per state, every state is a row index into a
+    # set of parallel numpy arrays (struct-of-arrays), and the transitions are
+    # stored in CSR form: the successors of state i are
+    # edgeTargets[edgeOffsets[i]:edgeOffsets[i + 1]].
+    #
+    # The observations of each state are packed into the obs array as a
+    # bitmask of Node.AT_GOAL, Node.CRASHED and Node.SPEEDING.
+    #
+    # Existing Node based callers (DFA.formAndSolveProduct,
+    # PDFA.formAndSolveProduct) can still walk the system through self.DFA,
+    # which hands out light ArrayNodeView objects built on demand from the
+    # arrays.
+
+    #
+    # @brief      Constructs the ArrayTransitionSystem object.
+    #
+    #             Takes exactly the same arguments as
+    #             TransitionSystem.TransitionSystem and builds the same set of
+    #             (deduplicated) states and transitions, in the same order.
+    #
+    # @param      self             The ArrayTransitionSystem object instance
+    # @param      initCarX         The initial carX state. CarX ~ lane on
+    #                              highway
+    # @param      initCarY         The initial carY state. CarY ~ distance down
+    #                              highway
+    # @param      initCarT         The initial carT state. CarT ~ time step
+    # @param      initCarVel       The initial velocity of the car
+    # @param      maxTime          The maximum time step allowed
+    # @param      allLanes         A list of all possible lane numbers on the
+    #                              highway.
+    # @param      allVelocities    A list of all possible car velocities for
+    #                              ALL lanes
+    # @param      allowedLaneVels  The allowed lane velocities tuple for a
+    #                              certain lane number
+    # @param      goalStates       The goal states for the car
+    # @param      POS              The POS (physical occupancy set) object
+    #                              which contains the 3D projection of a Node
+    #                              state onto the x, y, and time grid for the
+    #                              empty road.
+    # @param      vectorized       Whether to expand each time layer in bulk
+    #                              with numpy (buildLayers) or one state at a
+    #                              time (buildSerially). Both give identical
+    #                              arrays.
+    #
+    def __init__(self, initCarX, initCarY, initCarT, initCarVel,
+                 maxTime, allLanes, allVelocities, allowedLaneVels,
+                 goalStates, POS, vectorized=True):
+
+        self.maxTime = maxTime
+        self.allLanes = allLanes
+        self.allVelocities = allVelocities
+        self.allowedLaneVels = allowedLaneVels
+        self.goalStates = GoalSet.getGoalSet(goalStates)
+
+        POS = Collision.getCollisionChecker(POS)
+
+        if vectorized:
+            build = self.buildLayers
+        else:
+            build = self.buildSerially
+
+        (self.carX, self.carY, self.carT,
+         self.prevLane, self.prevVel, self.obs,
+         self.edgeOffsets, self.edgeTargets) = build(initCarX, initCarY,
+                                                     initCarVel, maxTime,
+                                                     allLanes, allVelocities,
+                                                     allowedLaneVels,
+                                                     self.goalStates, POS)
+
+        self.resetVisited()
+        self.DFA = DFA.DFA(nodes=ArrayNodeList(self),
+                           startNode=self.getNode(0))
+
+    #
+    # @brief      Builds the state and CSR edge arrays one state at a time,
+    #             with a BFS over the states just like TransitionSystem
+    #
+    # @param      self             The ArrayTransitionSystem object instance
+    # @param      initCarX         The initial carX state
+    # @param      initCarY         The initial carY state
+    # @param      initCarVel       The initial velocity of the car
+    # @param      maxTime          The maximum time step allowed
+    # @param      allLanes         A list of all possible lane numbers
+    # @param      allVelocities    A list of all possible car velocities
+    # @param      allowedLaneVels  The allowed lane velocities for each lane
+    # @param      goalStates       The goal states for the car
+    # @param      POS              The collision checker for the POS
+    #
+    # @return     (carX, carY, carT, prevLane, prevVel, obs, edgeOffsets,
+    #             edgeTargets) arrays
+    #
+    def buildSerially(self, initCarX, initCarY, initCarVel, maxTime,
+                      allLanes, allVelocities, allowedLaneVels, goalStates,
+                      POS):
+
+        # growable, compactly typed build buffers for each state component
+        carXs = array('h', [initCarX])
+        carYs = array('i', [initCarY])
+        carTs = array('h', [0])
+        prevLanes = array('h', [initCarX])
+        prevVels = array('h', [initCarVel])
+        obsMasks = array('B', [0])
+
+        edgeOffsets = array('q', [0])
+        edgeTargets = array('i')
+
+        stateIndex = {}
+        stateIndex[(initCarX, initCarY, 0, initCarX, initCarVel)] = 0
+
+        # states are numbered in the order they are discovered, and as the
+        # BFS pops them in that same order the edges come out grouped by
+        # source state, which is exactly the CSR layout
+        nodeQueue = deque()
+        nodeQueue.append(0)
+
+        while nodeQueue:
+
+            currIdx = nodeQueue.popleft()
+            currCarX = carXs[currIdx]
+            currCarY = carYs[currIdx]
+            currCarT = carTs[currIdx]
+
+            if currCarT == maxTime:
+                break
+
+            for lane in self.getAdjLanes(currCarX, allLanes):
+                for vel in allVelocities:
+
+                    carX = lane
+                    carY = currCarY + vel
+                    carT = currCarT + 1
+                    prevLane = currCarX
+                    prevVel = vel
+
+                    stateKey = (carX, carY, carT, prevLane, prevVel)
+                    if stateKey in stateIndex:
+                        nextIdx = stateIndex[stateKey]
+                        if nextIdx is not None:
+                            edgeTargets.append(nextIdx)
+                        continue
+
+                    allowedVelsPrevLane = allowedLaneVels[prevLane]
+                    allowedVelsCarXLane = allowedLaneVels[carX]
+
+                    minSpeedInPrevLane = min(allowedVelsPrevLane)
+                    minSpeedInCarXLane = min(allowedVelsCarXLane)
+
+                    crashed = self.crashed(prevLane, prevVel, carX, carY,
+                                           carT, minSpeedInPrevLane,
+                                           minSpeedInCarXLane, POS)
+                    if crashed:
+                        stateIndex[stateKey] = None
+                        continue
+
+                    speeding = self.speeding(prevLane, prevVel, carX,
+                                             allowedVelsPrevLane,
+                                             allowedVelsCarXLane)
+                    atGoal = self.inGoalStates(carX, carY, goalStates)
+
+                    obsMask = 0
+                    if atGoal:
+                        obsMask |= Node.AT_GOAL
+                    if speeding:
+                        obsMask |= Node.SPEEDING
+
+                    nextIdx = len(carXs)
+                    stateIndex[stateKey] = nextIdx
+
+                    carXs.append(carX)
+                    carYs.append(carY)
+                    carTs.append(carT)
+                    prevLanes.append(prevLane)
+                    prevVels.append(prevVel)
+                    obsMasks.append(obsMask)
+
+                    edgeTargets.append(nextIdx)
+                    nodeQueue.append(nextIdx)
+
+            edgeOffsets.append(len(edgeTargets))
+
+        # all states left unexpanded are leaves at maxTime
+        numStates = len(carXs)
+        while len(edgeOffsets) < numStates + 1:
+            edgeOffsets.append(len(edgeTargets))
+
+        # every state key but the initial state's was collision checked once
+        stats = Instrumentation.active
+        if stats is not None:
+            numChecked = len(stateIndex) - 1
+            stats.add('statesCreated', numStates - 1)
+            stats.add('edgesCrashChecked', numChecked)
+            stats.add('crashHits', numChecked - (numStates - 1))
+
+        return (np.frombuffer(carXs, dtype=np.int16),
+                np.frombuffer(carYs, dtype=np.int32),
+                np.frombuffer(carTs, dtype=np.int16),
+                np.frombuffer(prevLanes, dtype=np.int16),
+                np.frombuffer(prevVels, dtype=np.int16),
+                np.frombuffer(obsMasks, dtype=np.uint8),
+                np.frombuffer(edgeOffsets, dtype=np.int64),
+                np.frombuffer(edgeTargets, dtype=np.int32))
+
+    #
+    # @brief      Builds the state and CSR edge arrays one whole time layer at
+    #             a time
+    #
+    #             All lane x velocity successors of the time t frontier are
+    #             formed in one broadcasted step, the crashed, speeding and
+    #             atGoal observations are computed as masks over all of them,
+    #             and the surviving successors are deduplicated with np.unique
+    #             to give the time t + 1 frontier. The new states are numbered
+    #             in order of their first appearance, which is the same order
+    #             the serial BFS discovers them in.
+    #
+    # @param      self             The ArrayTransitionSystem object instance
+    # @param      initCarX         The initial carX state
+    # @param      initCarY         The initial carY state
+    # @param      initCarVel       The initial velocity of the car
+    # @param      maxTime          The maximum time step allowed
+    # @param      allLanes         A list of all possible lane numbers
+    # @param      allVelocities    A list of all possible car velocities
+    # @param      allowedLaneVels  The allowed lane velocities for each lane
+    # @param      goalStates       The goal states for the car
+    # @param      POS              The collision checker for the POS
+    #
+    # @return     (carX, carY, carT, prevLane, prevVel, obs, edgeOffsets,
+    #             edgeTargets) arrays
+    #
+    def buildLayers(self, initCarX, initCarY, initCarVel, maxTime,
+                    allLanes, allVelocities, allowedLaneVels, goalStates,
+                    POS):
+
+        minLane = min(allLanes)
+        maxLane = max(allLanes)
+        numLanes = maxLane + 1
+
+        velocities = np.asarray(allVelocities, dtype=np.int64)
+        numVels = len(velocities)
+
+        # per lane lookup tables, so the observations are plain array lookups
+        minLaneSpeeds = np.array([min(allowedLaneVels[lane])
+                                  for lane in range(numLanes)])
+        isAllowedVel = np.array([[vel in allowedLaneVels[lane]
+                                  for vel in allVelocities]
+                                 for lane in range(numLanes)])
+
+        carXs = [np.array([initCarX], dtype=np.int16)]
+        carYs = [np.array([initCarY], dtype=np.int32)]
+        carTs = [np.array([0], dtype=np.int16)]
+        prevLanes = [np.array([initCarX], dtype=np.int16)]
+        prevVels = [np.array([initCarVel], dtype=np.int16)]
+        obsMasks = [np.array([0], dtype=np.uint8)]
+        edgeCounts = []
+        edgeTargets = []
+
+        frontierX = carXs[0].astype(np.int64)
+        frontierY = carYs[0].astype(np.int64)
+        numStates = 1
+
+        stats = Instrumentation.active
+
+        for t in range(0, maxTime):
+
+            numFrontier = len(frontierX)
+            if numFrontier == 0:
+                break
+
+            (parent, nextX, nextY,
+             prevLane, velIdx) = self.expandFrontier(frontierX, frontierY, t,
+                                                     POS, velocities,
+                                                     minLaneSpeeds, minLane,
+                                                     maxLane)
+
+            # a successor state is identified by (carX, carY, prevLane,
+            # prevVel) within the layer, packed into a single integer key
+            maxY = int(nextY.max()) + 1 if len(nextY) else 1
+            keys = ((nextX * numLanes + prevLane) * numVels + velIdx) * maxY +\
+                nextY
+
+            _, firstIdx, inverse = np.unique(keys, return_index=True,
+                                             return_inverse=True)
+            inverse = inverse.reshape(-1)
+
+            # renumber the unique states by first appearance
+            order = np.argsort(firstIdx, kind='stable')
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+
+            newIdx = firstIdx[order]
+            edgeTargets.append(numStates + rank[inverse])
+            edgeCounts.append(np.bincount(parent, minlength=numFrontier))
+
+            newX = nextX[newIdx]
+            newY = nextY[newIdx]
+            newPrevLane = prevLane[newIdx]
+            newVelIdx = velIdx[newIdx]
+
+            speeding = ~(isAllowedVel[newPrevLane, newVelIdx] &
+                         isAllowedVel[newX, newVelIdx])
+            atGoal = self.inGoalStatesMany(newX, newY, goalStates)
+
+            obsMask = np.zeros(len(newIdx), dtype=np.uint8)
+            obsMask[atGoal] |= Node.AT_GOAL
+            obsMask[speeding] |= Node.SPEEDING
+
+            carXs.append(newX.astype(np.int16))
+            carYs.append(newY.astype(np.int32))
+            carTs.append(np.full(len(newIdx), t + 1, dtype=np.int16))
+            prevLanes.append(newPrevLane.astype(np.int16))
+            prevVels.append(velocities[newVelIdx].astype(np.int16))
+            obsMasks.append(obsMask)
+
+            # every on road lane x velocity candidate was collision checked
+            if stats is not None:
+                numOffRoad = (np.count_nonzero(frontierX == minLane) +
+                              np.count_nonzero(frontierX == maxLane))
+                numChecked = numVels * (3 * numFrontier - int(numOffRoad))
+                stats.add('statesCreated', len(newIdx))
+                stats.add('edgesCrashChecked', numChecked)
+                stats.add('crashHits', numChecked - len(parent))
+
+            numStates += len(newIdx)
+            frontierX = newX
+            frontierY = newY
+
+        # all states in the last frontier are leaves
+        numLeaves = numStates - sum(len(counts) for counts in edgeCounts)
+        edgeCounts.append(np.zeros(numLeaves, dtype=np.int64))
+
+        edgeOffsets = np.zeros(numStates + 1, dtype=np.int64)
+        np.cumsum(np.concatenate(edgeCounts), out=edgeOffsets[1:])
+
+        return (np.concatenate(carXs),
+                np.concatenate(carYs),
+                np.concatenate(carTs),
+                np.concatenate(prevLanes),
+                np.concatenate(prevVels),
+                np.concatenate(obsMasks),
+                edgeOffsets,
+                np.concatenate(edgeTargets).astype(np.int32))
+
+    #
+    # @brief      Forms the successors of one time layer's frontier that do not
+    #             crash (see expandFrontier)
+    #
+    # @param      self           The ArrayTransitionSystem object instance
+    # @param      frontierX      The carX array of the frontier states
+    # @param      frontierY      The carY array of the frontier states
+    # @param      t              The time of the frontier
+    # @param      POS            The collision checker for the POS
+    # @param      velocities     The int64 array of all car velocities
+    # @param      minLaneSpeeds  The minimum legal speed of each lane
+    # @param      minLane        The lowest lane number
+    # @param      maxLane        The highest lane number
+    #
+    # @return     the (parent, nextX, nextY, prevLane, velIdx) arrays
+    #
+    def expandFrontier(self, frontierX, frontierY, t, POS, velocities,
+                       minLaneSpeeds, minLane, maxLane):
+
+        return expandFrontier(frontierX, frontierY, t, POS, velocities,
+                              minLaneSpeeds, minLane, maxLane)
+
+    #
+    # @brief      Vectorized version of TransitionSystem.inGoalStates
+    #
+    # @param      self        The ArrayTransitionSystem object instance
+    # @param      carXs       The array of carX values ~ lane on highway
+    # @param      carYs       The array of carY values ~ distance down highway
+    # @param      goalStates  The GoalSet of goal regions (or a legacy list of
+    #                         goal states, see GoalSet.getGoalSet)
+    #
+    # @return     boolean array, True where the state is in the goal states
+    #
+    def inGoalStatesMany(self, carXs, carYs, goalStates):
+
+        return GoalSet.getGoalSet(goalStates).containsMany(carXs, carYs)
+
+    #
+    # @brief      The number of states in the transition system
+    #
+    # @param      self  The ArrayTransitionSystem object instance
+    #
+    def __len__(self):
+
+        return len(self.carX)
+
+    #
+    # @brief      The total number of bytes used by the state and edge arrays
+    #
+    # @param      self  The ArrayTransitionSystem object instance
+    #
+    # @return     the sum of the nbytes of all of the backing arrays
+    #
+    @property
+    def nbytes(self):
+
+        return sum(arr.nbytes for arr in (self.carX, self.carY, self.carT,
+                                          self.prevLane, self.prevVel,
+                                          self.obs, self.visited,
+                                          self.edgeOffsets, self.edgeTargets))
+
+    #
+    # @brief      Gets the indices of the successor states of a state
+    #
+    # @param      self   The ArrayTransitionSystem object instance
+    # @param      index  The state index
+    #
+    # @return     a view into edgeTargets holding the successor state indices
+    #
+    def getSuccessorIndices(self, index):
+
+        return self.edgeTargets[self.edgeOffsets[index]:
+                                self.edgeOffsets[index + 1]]
+
+    #
+    # @brief      Rejects occupancy updates, as the CSR arrays can not be
+    #             edited in place: an occupancy change needs a new
+    #             ArrayTransitionSystem
+    #
+    # @param      self          The ArrayTransitionSystem object instance
+    # @param      changedCells  An iterable of (lane, y, t, isOccupied) POS
+    #                           cells
+    #
+    def updateOccupancy(self, changedCells):
+
+        raise TypeError('the occupancy of an ArrayTransitionSystem can not '
+                        'be updated, rebuild it or use a '
+                        '(Lazy)TransitionSystem')
+
+    #
+    # @brief      Gets a Node-like view of one of the states
+    #
+    # @param      self   The ArrayTransitionSystem object instance
+    # @param      index  The state index
+    #
+    # @return     an ArrayNodeView for the state at index
+    #
+    def getNode(self, index):
+
+        return ArrayNodeView(self, int(index))
+
+    #
+    # @brief      Clears the isVisited flags of all of the states, so the
+    #             system can be searched again
+    #
+    # @param      self  The ArrayTransitionSystem object instance
+    #
+    def resetVisited(self):
+
+        self.visited = np.zeros(len(self.carX), dtype=bool)
+
+
+class ArrayNodeList:
+    # @brief    Read only, list-like access to the states of an
+    #           ArrayTransitionSystem as ArrayNodeView objects
+
+    #
+    # @brief      Constructs the ArrayNodeList object.
+    #
+    # @param      self  The ArrayNodeList object instance
+    # @param      ATS   The ArrayTransitionSystem to view
+    #
+    def __init__(self, ATS):
+
+        self.ATS = ATS
+
+    def __len__(self):
+
+        return len(self.ATS)
+
+    def __getitem__(self, index):
+
+        if index < 0:
+            index += len(self.ATS)
+        if not 0 <= index < len(self.ATS):
+            raise IndexError(index)
+
+        return self.ATS.getNode(index)
+
+    def __iter__(self):
+
+        for index in range(len(self.ATS)):
+            yield self.ATS.getNode(index)
+
+
+class ArrayNodeView:
+    # @brief    A thin adapter presenting one state of an ArrayTransitionSystem
+    #           with the same attributes as a Node.Node
+    #
+    # Nothing is stored on the view itself apart from the state index, so
+    # views are cheap to make and can be thrown away; isVisited is written
+    # through to the ArrayTransitionSystem's visited array.
+
+    #
+    # @brief      Constructs the ArrayNodeView object.
+    #
+    # @param      self   The ArrayNodeView object instance
+    # @param      ATS    The ArrayTransitionSystem the state belongs to
+    # @param      index  The state index
+    #
+    def __init__(self, ATS, index):
+
+        self.ATS = ATS
+        self.index = index
+        self.isAccepting = False
+        self.parent = None
+
+    @property
+    def state(self):
+
+        ATS = self.ATS
+        index = self.index
+
+        return Node.NodeState(carX=int(ATS.carX[index]),
+                              carY=int(ATS.carY[index]),
+                              carT=int(ATS.carT[index]),
+                              prevLane=int(ATS.prevLane[index]),
+                              prevVel=int(ATS.prevVel[index]))
+
+    @property
+    def obs(self):
+
+        return Node.observationFromBitmask(int(self.ATS.obs[self.index]))
+
+    @property
+    def adjList(self):
+
+        return [ArrayNodeView(self.ATS, int(nextIdx))
+                for nextIdx in self.ATS.getSuccessorIndices(self.index)]
+
+    @property
+    def isVisited(self):
+
+        return bool(self.ATS.visited[self.index])
+
+    @isVisited.setter
+    def isVisited(self, isVisited):
+
+        self.ATS.visited[self.index] = isVisited
+
+
+#
+# @brief      Forms every (parent, lane change, velocity) successor of a time
+#             layer's frontier, and drops the ones that crash
+#
+#             The candidates are flattened in the parent -> lane -> velocity
+#             order of the serial loops, so expanding contiguous slices of a
+#             frontier separately and concatenating the results (offsetting
+#             the parent indices) gives exactly the arrays of expanding the
+#             whole frontier at once.
+#
+# @param      frontierX      The carX array of the frontier states
+# @param      frontierY      The carY array of the frontier states
+# @param      t              The time of the frontier
+# @param      POS            The collision checker for the POS
+# @param      velocities     The int64 array of all car velocities
+# @param      minLaneSpeeds  The minimum legal speed of each lane
+# @param      minLane        The lowest lane number
+# @param      maxLane        The highest lane number
+#
+# @return     the (parent, nextX, nextY, prevLane, velIdx) arrays of the
+#             successors that do not crash, parent indexing into the frontier
+#
+def expandFrontier(frontierX, frontierY, t, POS, velocities, minLaneSpeeds,
+                   minLane, maxLane):
+
+    numFrontier = len(frontierX)
+    numVels = len(velocities)
+    laneOffsets = np.array([-1, 0, 1])
+
+    candShape = (numFrontier, len(laneOffsets), numVels)
+    parent = np.broadcast_to(np.arange(numFrontier)[:, None, None],
+                             candShape)
+    nextX = np.broadcast_to(frontierX[:, None, None] +
+                            laneOffsets[None, :, None], candShape)
+    velIdx = np.broadcast_to(np.arange(numVels)[None, None, :], candShape)
+
+    onRoad = (nextX >= minLane) & (nextX <= maxLane)
+    parent = parent[onRoad]
+    nextX = nextX[onRoad]
+    velIdx = velIdx[onRoad]
+
+    prevLane = frontierX[parent]
+    prevY = frontierY[parent]
+    vel = velocities[velIdx]
+    nextY = prevY + vel
+
+    crashed = (POS.anyOccupiedMany(prevLane, prevY, t,
+                                   vel - minLaneSpeeds[prevLane]) |
+               POS.anyOccupiedMany(nextX, prevY, t,
+                                   vel - minLaneSpeeds[nextX]))
+
+    notCrashed = ~crashed
+
+    return (parent[notCrashed], nextX[notCrashed], nextY[notCrashed],
+            prevLane[notCrashed], velIdx[notCrashed])
@@ -0,0 +1,231 @@
+import numpy as np
+
+
+class SweptCollisionTable:
+    # @brief    Precomputed swept collision queries over a dense POS matrix
+    #
+    # The table holds the cumulative number of occupied cells along the
+    # distance axis of the POS, such that
+    #
+    #   cumOcc[x, y, t] = sum(POS[x, 0:y, t] != 0)
+    #
+    # which means whether any other car is in lane x between distances
+    # [y, y + window) at time t is answered in O(1) as
+    #
+    #   cumOcc[x, y + window, t] != cumOcc[x, y, t]
+    #
+    # instead of summing window individual POS cells every time.
+
+    #
+    # @brief      Constructs the SweptCollisionTable object.
+    #
+    # @param      self    The SweptCollisionTable object instance
+    # @param      POS     The POS (physical occupancy set) matrix with shape
+    #                     (numLanes, maxDist, maxTime)
+    # @param      cumOcc  An already computed cumOcc table to use instead of
+    #                     POS, as is and without copying (e.g. one in shared
+    #                     memory)
+    #
+    def __init__(self, POS=None, cumOcc=None):
+
+        if cumOcc is not None:
+            numLanes, maxDistPlusOne, maxTime = cumOcc.shape
+            self.shape = (numLanes, maxDistPlusOne - 1, maxTime)
+            self.cumOcc = cumOcc
+            return
+
+        POS = np.asarray(POS)
+        numLanes, maxDist, maxTime = POS.shape
+
+        self.shape = POS.shape
+        self.cumOcc = np.zeros((numLanes, maxDist + 1, maxTime),
+                               dtype=np.int32)
+        np.cumsum(POS != 0, axis=1, out=self.cumOcc[:, 1:, :])
+
+    #
+    # @brief      Determines if any other car occupies a stretch of a lane
+    #
+    # @param      self    The SweptCollisionTable object instance
+    # @param      lane    The lane (x) index
+    # @param      y       The first distance (y) index of the stretch
+    # @param      t       The time index
+    # @param      window  The length of the stretch, a window <= 0 is empty
+    #
+    # @return     True if any of POS[lane, y:y + window, t] is occupied
+    #
+    def anyOccupied(self, lane, y, t, window):
+
+        if window <= 0:
+            return False
+
+        cumOcc = self.cumOcc
+
+        return bool(cumOcc[lane, y + window, t] != cumOcc[lane, y, t])
+
+    #
+    # @brief      Vectorized version of anyOccupied
+    #
+    # @param      self     The SweptCollisionTable object instance
+    # @param      lanes    The array of lane (x) indices
+    # @param      ys       The array of the first distance (y) index of each
+    #                      stretch
+    # @param      ts       The array of time indices
+    # @param      windows  The array of stretch lengths
+    #
+    # @return     boolean array broadcast from the arguments, True where the
+    #             corresponding stretch is occupied
+    #
+    def anyOccupiedMany(self, lanes, ys, ts, windows):
+
+        windows = np.asarray(windows)
+        isEmpty = (windows <= 0)
+
+        # empty windows are never indexed, just like the scalar query
+        starts = np.where(isEmpty, 0, ys)
+        ends = np.where(isEmpty, 0, starts + windows)
+
+        cumOcc = self.cumOcc
+
+        return cumOcc[lanes, ends, ts] != cumOcc[lanes, starts, ts]
+
+    #
+    # @brief      Sets whether a single POS cell is occupied, updating the
+    #             cumulative counts of the rest of its lane in place
+    #
+    # @param      self        The SweptCollisionTable object instance
+    # @param      lane        The lane (x) index of the cell
+    # @param      y           The distance (y) index of the cell
+    # @param      t           The time index of the cell
+    # @param      isOccupied  Whether another car is now in the cell
+    #
+    # @return     True if the occupancy of the cell changed, False otherwise.
+    #
+    def setOccupied(self, lane, y, t, isOccupied):
+
+        cumOcc = self.cumOcc
+        wasOccupied = bool(cumOcc[lane, y + 1, t] != cumOcc[lane, y, t])
+        if wasOccupied == bool(isOccupied):
+            return False
+
+        cumOcc[lane, y + 1:, t] += 1 if isOccupied else -1
+
+        return True
+
+    #
+    # @brief      Calculates the full swept collision mask at once
+    #
+    #             A car moving at velocity v sweeps through the cells
+    #             [y, y + v - minSpeed) of every lane it touches, where
+    #             minSpeed is the minimum legal speed of that lane (see
+    #             TransitionSystem.crashed).
+    #
+    #             Stretches that would run off the end of the simulated road
+    #             cannot be checked and are flagged as collisions.
+    #
+    # @param      self           The SweptCollisionTable object instance
+    # @param      allVelocities  A list of all possible car velocities
+    # @param      minLaneSpeeds  The minimum legal speed of each lane
+    #
+    # @return     boolean array with shape
+    #             (numLanes, maxDist, len(allVelocities), maxTime), True where
+    #             moving from y at time t with the velocity hits another car in
+    #             the lane
+    #
+    def sweptMask(self, allVelocities, minLaneSpeeds):
+
+        numLanes, maxDist, maxTime = self.shape
+
+        lanes = np.arange(numLanes)[:, None, None, None]
+        ys = np.arange(maxDist)[None, :, None, None]
+        velocities = np.asarray(allVelocities)[None, None, :, None]
+        ts = np.arange(maxTime)[None, None, None, :]
+
+        windows = velocities - np.asarray(minLaneSpeeds)[lanes]
+        offRoad = (ys + windows > maxDist)
+        windows = np.where(offRoad, 0, windows)
+
+        return self.anyOccupiedMany(lanes, ys, ts, windows) | offRoad
+
+    #
+    # @brief      Calculates a boolean for whether the car has crashed into
+    #             another car, with the same semantics as
+    #             TransitionSystem.crashed
+    #
+    # @param      self                The SweptCollisionTable object instance
+    # @param      prevLane            The previous lane for the car during the
+    #                                 last time step
+    # @param      prevVel             The previous velocity for the car during
+    #                                 the last time step
+    # @param      carX                The current carX value ~ lane on highway
+    # @param      carY                The current carY value ~ distance down
+    #                                 highway
+    # @param      carT                The current carT value ~ current time
+    #                                 step
+    # @param      minSpeedInPrevLane  The minimum legal speed in the previous
+    #                                 lane
+    # @param      minSpeedInCarXLane  The minimum legal speed in the carX lane
+    #
+    # @return     @bool indicating whether or not the car will crash into
+    #             another driver during the previous -> current time step
+    #
+    def crashed(self, prevLane, prevVel, carX, carY, carT,
+                minSpeedInPrevLane, minSpeedInCarXLane):
+
+        return crashed(self, prevLane, prevVel, carX, carY, carT,
+                       minSpeedInPrevLane, minSpeedInCarXLane)
+
+
+#
+# @brief      Calculates a boolean for whether the car has crashed into
+#             another one of the obstacle cars along the highway
+#
+#             The car sweeps from prevY = carY - prevVel at time carT - 1, and
+#             has to pass the cars in its previous lane over the first
+#             (prevVel - minSpeedInPrevLane) cells and the cars in its new lane
+#             over the first (prevVel - minSpeedInCarXLane) cells.
+#
+# @param      checker             Any collision checker with an anyOccupied
+#                                 method (see getCollisionChecker)
+# @param      prevLane            The previous lane for the car during the last
+#                                 time step
+# @param      prevVel             The previous velocity for the car during the
+#                                 last time step
+# @param      carX                The current carX value ~ lane on highway
+# @param      carY                The current carY value ~ distance down
+#                                 highway
+# @param      carT                The current carT value ~ current time step
+# @param      minSpeedInPrevLane  The minimum legal speed in the previous lane
+# @param      minSpeedInCarXLane  The minimum legal speed in the carX lane
+#
+# @return     @bool indicating whether or not the car will crash into another
+#             driver during the previous -> current time step
+#
+def crashed(checker, prevLane, prevVel, carX, carY, carT,
+            minSpeedInPrevLane, minSpeedInCarXLane):
+
+    # time steps are unit length for simplification
+    timeStepLength = 1
+    prevY = carY - prevVel * (timeStepLength)
+    prevT = carT - timeStepLength
+
+    return (checker.anyOccupied(prevLane, prevY, prevT,
+                                prevVel - minSpeedInPrevLane) or
+            checker.anyOccupied(carX, prevY, prevT,
+                                prevVel - minSpeedInCarXLane))
+
+
+#
+# @brief      Gets a collision checker for an occupancy set
+#
+# @param      POS   The POS (physical occupancy set), either a dense matrix or
+#                   an object that already answers anyOccupied queries
+#
+# @return     POS itself if it can already answer the collision queries,
+#             otherwise a SweptCollisionTable precomputed from POS
+#
+def getCollisionChecker(POS):
+
+    if hasattr(POS, 'anyOccupied'):
+        return POS
+
+    return SweptCollisionTable(POS)
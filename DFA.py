@@ -1,5 +1,8 @@
 from __future__ import print_function
 import Node
+import Instrumentation
+import heapq
+import itertools
 from collections import deque
 
 
@@ -60,97 +63,259 @@ def formAndSolveProduct(DTS, LDBA):
 
     index = 0
     prevProdNode = None
-    prevTSNode = None
     startProdNode = Node.Node(state=startProdState, index=index,
                               obs=obs, adjList=[],
                               isAccepting=False, isVisited=False,
                               parent=prevProdNode)
-
-    Nodes = []
-    Nodes.append(startProdNode)
     index += 1
 
+    # a product state is the pair (TS state, automaton state), so that is what
+    # has to be marked as visited - not the TS Node, which is shared by every
+    # automaton state it is paired with. The pairs are packed into a single
+    # integer key: TS Node index * number of automaton states + q
+    numQ = len(LDBA.DFA.nodes)
+    visited = set()
+    visited.add(startTSNode.index * numQ + q)
+
     nodeQueue = deque()
-    nodeQueue.append((startProdNode, prevTSNode, startTSNode))
-    accepts = []
+    nodeQueue.append((startProdNode, startTSNode))
+
+    stats = Instrumentation.active
 
     while nodeQueue:
 
-        prevProdNode,\
-            prevTSNode, currTSNode = nodeQueue.popleft()
-        newProdNode = prevProdNode
-
-        if not currTSNode.isVisited:
-
-            currTSNode.isVisited = True
-            keepSearching = True
-
-            if (prevTSNode is not None) and (prevProdNode is not None):
-                currObsv = currTSNode.obs
-
-                currState = currTSNode.state
-
-                carX = currState.carX
-                carY = currState.carY
-                carT = currState.carT
-                prevLane = currState.prevLane
-                prevVel = currState.prevVel
-
-                qNew = LDBA.DFA.transFcn(prevProdNode.state.q, currObsv)
-                qNewAccepts = (qNew in LDBA.DFA.accepts)
-
-                newProdState = Node.NodeState(carX, carY, carT, qNew,
-                                              prevLane, prevVel)
-                newProdNode = Node.Node(state=newProdState, index=index,
-                                        isAccepting=qNewAccepts,
-                                        parent=prevProdNode)
-
-                # anything Node after reaching state 1 will not work
-                keepSearching = (qNew != 1)
-                if keepSearching:
-                    accepts.append(index)
-                    prevProdNode.adjList.append(newProdNode)
-
-                # turn on for debug :)
-                # print('X:', carX,
-                #       'Y:', carY,
-                #       'T:', carT,
-                #       'index:', newProdNode.index,
-                #       'parentIdx:', newProdNode.parent.index,
-                #       'prevLane:', prevLane,
-                #       'q:', qNew,
-                #       'atGoal:', currObsv.atGoal,
-                #       'crashed:', currObsv.crashed,
-                #       'speeding:', currObsv.speeding,
-                #       'keepSearching:', keepSearching)
-
-                # goal state is defined in LDBA as q = 2
-                atGoal = (qNew == 2)
-                if atGoal:
-                    return newProdNode
-
-                index += 1
-
-            if keepSearching:
-                # now need after we have relaxed some of da edges its time to
-                # do the BFS queuing
-                for neighbor in currTSNode.adjList:
-                    if not neighbor.isVisited:
-                        nodeQueue.append((newProdNode, currTSNode, neighbor))
+        if stats is not None:
+            stats.add('productNodesExpanded')
+            stats.setMax('queueHighWater', len(nodeQueue))
+
+        prevProdNode, prevTSNode = nodeQueue.popleft()
+        prevQ = prevProdNode.state.q
+
+        # now need after we have relaxed some of da edges its time to do the
+        # BFS queuing
+        for currTSNode in DTS.successors(prevTSNode):
+
+            currObsv = currTSNode.obs
+            qNew = LDBA.DFA.transFcn(prevQ, currObsv)
+
+            prodKey = currTSNode.index * numQ + qNew
+            if prodKey in visited:
+                continue
+            visited.add(prodKey)
+
+            # anything Node after reaching the sink state will not work
+            keepSearching = (qNew != LDBA.sink)
+            if not keepSearching:
+                continue
+
+            currState = currTSNode.state
+
+            carX = currState.carX
+            carY = currState.carY
+            carT = currState.carT
+            prevLane = currState.prevLane
+            prevVel = currState.prevVel
+
+            qNewAccepts = (qNew in LDBA.DFA.accepts)
+
+            newProdState = Node.NodeState(carX, carY, carT, qNew,
+                                          prevLane, prevVel)
+            newProdNode = Node.Node(state=newProdState, index=index,
+                                    adjList=[], isAccepting=qNewAccepts,
+                                    parent=prevProdNode)
+            prevProdNode.adjList.append(newProdNode)
+            index += 1
+
+            # turn on for debug :)
+            # print('X:', carX,
+            #       'Y:', carY,
+            #       'T:', carT,
+            #       'index:', newProdNode.index,
+            #       'parentIdx:', newProdNode.parent.index,
+            #       'prevLane:', prevLane,
+            #       'q:', qNew,
+            #       'atGoal:', currObsv.atGoal,
+            #       'crashed:', currObsv.crashed,
+            #       'speeding:', currObsv.speeding)
+
+            # the goal is reached as soon as the automaton accepts (q = 2 for
+            # the 'G(!crashed & !speeding) & F(atGoal)' LDBA)
+            if qNewAccepts:
+                return newProdNode
+
+            nodeQueue.append((newProdNode, currTSNode))
 
     # if you get here things have gone horribly wrong
     return None
 
 
+#
+# @brief      Forms the product automata like formAndSolveProduct, but searches
+#             it best-first (A*) instead of breadth first
+#
+#             Every product transition takes one time step, and
+#             DTS.timeToGoalLowerBound gives an admissible, consistent bound on
+#             the time steps left before the car can observe atGoal. The bound
+#             is only used in automaton states that cannot accept without
+#             observing atGoal first (see getGoalDependentStates), so the
+#             search stays admissible for any specification. The first
+#             accepting product state popped is then time-optimal, and far
+#             fewer product states have to be expanded than with BFS, which
+#             expands every time layer in full.
+#
+# @param      DTS          A TransistionSystem to product with the LBDA,
+#                          containing the physical modeling transitions
+# @param      LDBA         The LDBA (LTL Deterministic Buchi Automata)
+#                          encoding the LTL specification on DTS
+# @param      startTSNode  The DTS Node to search from, defaults to the start
+#                          of DTS
+# @param      startQ       The LDBA state to search from, defaults to the start
+#                          of LDBA
+#
+# @return     (the first Node object in the product to accept - None if there
+#             is none, the number of product Nodes expanded)
+#
+def formAndSolveProductAStar(DTS, LDBA, startTSNode=None, startQ=None):
+
+    if startTSNode is None:
+        startTSNode = DTS.DFA.startNode
+    if startQ is None:
+        startQ = LDBA.DFA.startNode.state.q
+
+    startTSState = startTSNode.state
+    q = startQ
+
+    startProdState = Node.NodeState(startTSState.carX, startTSState.carY,
+                                    startTSState.carT, q,
+                                    startTSState.prevLane,
+                                    startTSState.prevVel)
+
+    index = 0
+    startProdNode = Node.Node(state=startProdState, index=index,
+                              obs=startTSNode.obs, adjList=[],
+                              isAccepting=False, isVisited=False,
+                              parent=None)
+    index += 1
+
+    numQ = len(LDBA.DFA.nodes)
+    needsGoal = getGoalDependentStates(LDBA)
+
+    def heuristic(state, q):
+        if needsGoal[q]:
+            return DTS.timeToGoalLowerBound(state.carX, state.carY)
+        else:
+            return 0
+
+    # the open list is ordered by f = g + h, then by deeper g, then FIFO
+    tieBreaker = itertools.count()
+    openList = [(heuristic(startTSState, q), 0, next(tieBreaker),
+                 startProdNode, startTSNode)]
+    bestCost = {startTSNode.index * numQ + q: 0}
+    closed = set()
+    numExpanded = 0
+
+    stats = Instrumentation.active
+
+    while openList:
+
+        _, negCost, _, prevProdNode, prevTSNode = heapq.heappop(openList)
+        prevQ = prevProdNode.state.q
+
+        prodKey = prevTSNode.index * numQ + prevQ
+        if prodKey in closed:
+            continue
+        closed.add(prodKey)
+
+        # with a consistent heuristic the first accepting product state off
+        # of the open list is optimal
+        if prevProdNode.isAccepting:
+            return (prevProdNode, numExpanded)
+
+        numExpanded += 1
+        cost = -negCost + 1
+
+        for currTSNode in DTS.successors(prevTSNode):
+
+            qNew = LDBA.DFA.transFcn(prevQ, currTSNode.obs)
+
+            # anything Node after reaching the sink state will not work
+            if qNew == LDBA.sink:
+                continue
+
+            prodKey = currTSNode.index * numQ + qNew
+            if prodKey in closed or cost >= bestCost.get(prodKey, cost + 1):
+                continue
+            bestCost[prodKey] = cost
+
+            currState = currTSNode.state
+            newProdState = Node.NodeState(currState.carX, currState.carY,
+                                          currState.carT, qNew,
+                                          currState.prevLane,
+                                          currState.prevVel)
+            newProdNode = Node.Node(state=newProdState, index=index,
+                                    adjList=[],
+                                    isAccepting=(qNew in LDBA.DFA.accepts),
+                                    parent=prevProdNode)
+            prevProdNode.adjList.append(newProdNode)
+            index += 1
+
+            heapq.heappush(openList, (cost + heuristic(currState, qNew),
+                                      -cost, next(tieBreaker),
+                                      newProdNode, currTSNode))
+
+        # the open list only grows while a Node is being expanded, so its
+        # high water mark is always reached at the end of an expansion
+        if stats is not None:
+            stats.add('productNodesExpanded')
+            stats.setMax('queueHighWater', len(openList))
+
+    return (None, numExpanded)
+
+
+#
+# @brief      Finds the automaton states that cannot reach an accepting state
+#             without an atGoal observation
+#
+# @param      LDBA  The LDBA (LTL Deterministic Buchi Automata)
+#
+# @return     list of bools indexed by q, True if the state can only accept
+#             after observing atGoal
+#
+def getGoalDependentStates(LDBA):
+
+    numQ = len(LDBA.DFA.nodes)
+    noGoalObs = [obs for obs in Node.OBSERVATIONS if not obs.atGoal]
+
+    needsGoal = []
+    for q in range(numQ):
+
+        # search the automaton from q, only following non-atGoal observations
+        reached = set([q])
+        stateQueue = deque([q])
+        while stateQueue:
+            currQ = stateQueue.popleft()
+            for obs in noGoalObs:
+                nextQ = LDBA.DFA.transFcn(currQ, obs)
+                if nextQ not in reached:
+                    reached.add(nextQ)
+                    stateQueue.append(nextQ)
+
+        needsGoal.append(not any(reachedQ in LDBA.DFA.accepts
+                                 for reachedQ in reached))
+
+    return needsGoal
+
+
 #
 # @brief      Gets the path to root from leaf of the DFA
 #
-# @param      leaf  The leaf Node object
+# @param      leaf     The leaf Node object
+# @param      verbose  Whether to print out each state along the path
 #
 # @return     A list of Node objects with the root at index = 0 and the leaf at
 #             the last index
 #
-def getPathToRootFromLeaf(leaf):
+def getPathToRootFromLeaf(leaf, verbose=True):
 
     currNode = leaf
     nodeQueue = deque()
@@ -167,8 +332,10 @@ def getPathToRootFromLeaf(leaf):
         currNode = nodeQueue.pop()
         Nodes.append(currNode)
 
-        state = currNode.state
+        if not verbose:
+            continue
 
+        state = currNode.state
         print('Lane:', state.carX,
               'Distance:', state.carY,
               'Time:', state.carT,
@@ -0,0 +1,177 @@
+import bisect
+import numpy as np
+
+
+class GoalSet:
+    # @brief    A set of goal regions for the car, e.g. the stretches of road
+    #           leading up to one or more highway exits
+    #
+    # Each goal region is a closed interval [yMin, yMax] of distances down the
+    # highway in one lane. The regions of each lane are kept merged and sorted
+    # by their start, so checking whether a state is in any of the k regions
+    # of its lane is a binary search, O(log k).
+
+    #
+    # @brief      Constructs the GoalSet object.
+    #
+    # @param      self     The GoalSet object instance
+    # @param      regions  An iterable of (lane, yMin, yMax) goal regions
+    #
+    def __init__(self, regions=()):
+
+        # lane -> (sorted region starts, corresponding region ends)
+        self.laneIntervals = {}
+
+        for lane, yMin, yMax in regions:
+            self.addRegion(lane, yMin, yMax)
+
+    #
+    # @brief      Adds a goal region, merging it with any regions of the lane
+    #             it overlaps or touches
+    #
+    # @param      self  The GoalSet object instance
+    # @param      lane  The lane (x) of the region
+    # @param      yMin  The first distance (y) in the region
+    # @param      yMax  The last distance (y) in the region
+    #
+    def addRegion(self, lane, yMin, yMax):
+
+        if yMax < yMin:
+            raise ValueError('empty goal region [%s, %s] in lane %s'
+                             % (yMin, yMax, lane))
+
+        starts, ends = self.laneIntervals.setdefault(lane, ([], []))
+
+        # find the run of regions that overlap or touch [yMin, yMax]
+        first = bisect.bisect_left(ends, yMin - 1)
+        last = bisect.bisect_right(starts, yMax + 1)
+        if first < last:
+            yMin = min(yMin, starts[first])
+            yMax = max(yMax, ends[last - 1])
+
+        starts[first:last] = [yMin]
+        ends[first:last] = [yMax]
+
+    #
+    # @brief      Gets all of the goal regions
+    #
+    # @param      self  The GoalSet object instance
+    #
+    # @return     list of (lane, yMin, yMax) goal regions, sorted by lane and
+    #             then yMin
+    #
+    def getRegions(self):
+
+        return [(lane, yMin, yMax)
+                for lane in sorted(self.laneIntervals)
+                for yMin, yMax in zip(*self.laneIntervals[lane])]
+
+    #
+    # @brief      Determines if a state is in any of the goal regions
+    #
+    # @param      self  The GoalSet object instance
+    # @param      carX  The carX value ~ lane on highway
+    # @param      carY  The carY value ~ distance down highway
+    #
+    # @return     True if in a goal region, False otherwise.
+    #
+    def contains(self, carX, carY):
+
+        intervals = self.laneIntervals.get(carX)
+        if intervals is None:
+            return False
+
+        starts, ends = intervals
+        idx = bisect.bisect_right(starts, carY) - 1
+
+        return idx >= 0 and carY <= ends[idx]
+
+    #
+    # @brief      Determines if a (carX, carY) tuple is in any of the goal
+    #             regions, so a GoalSet can stand in for a set of goal labels
+    #
+    # @param      self   The GoalSet object instance
+    # @param      state  The (carX, carY) tuple
+    #
+    # @return     True if in a goal region, False otherwise.
+    #
+    def __contains__(self, state):
+
+        return self.contains(state[0], state[1])
+
+    #
+    # @brief      Vectorized version of contains
+    #
+    # @param      self   The GoalSet object instance
+    # @param      carXs  The array of carX values ~ lane on highway
+    # @param      carYs  The array of carY values ~ distance down highway
+    #
+    # @return     boolean array, True where the state is in a goal region
+    #
+    def containsMany(self, carXs, carYs):
+
+        carXs, carYs = np.broadcast_arrays(carXs, carYs)
+        isGoal = np.zeros(carXs.shape, dtype=bool)
+
+        for lane, (starts, ends) in self.laneIntervals.items():
+
+            idx = np.searchsorted(starts, carYs, side='right') - 1
+            inRegion = (idx >= 0) & \
+                (carYs <= np.asarray(ends)[np.maximum(idx, 0)])
+            isGoal |= (carXs == lane) & inRegion
+
+        return isGoal
+
+    #
+    # @brief      Calculates a lower bound on the number of time steps needed
+    #             to get from a state into any of the goal regions
+    #
+    #             Getting into a region takes at least the steps needed to
+    #             cover the distance to its start at maxVel, and at least one
+    #             step per lane changed.
+    #
+    # @param      self    The GoalSet object instance
+    # @param      carX    The carX value ~ lane on highway
+    # @param      carY    The carY value ~ distance down highway
+    # @param      maxVel  The maximum distance the car covers in a time step
+    #
+    # @return     the lower bound on the time steps to the goal regions, inf if
+    #             there are no goal regions
+    #
+    def getStepsLowerBound(self, carX, carY, maxVel):
+
+        bound = np.inf
+        for lane, (starts, ends) in self.laneIntervals.items():
+
+            # the car never drives backwards, so the nearest region of the
+            # lane to get into is the first one not entirely behind the car
+            idx = bisect.bisect_left(ends, carY)
+            if idx == len(ends):
+                idx -= 1
+
+            distLeft = max(0, starts[idx] - carY)
+            stepsDownRoad = -(-distLeft // maxVel)
+            stepsAcross = abs(carX - lane)
+            bound = min(bound, max(stepsDownRoad, stepsAcross))
+
+        return bound
+
+
+#
+# @brief      Gets the GoalSet to use for a set of goal states
+#
+# @param      goalStates  Either a GoalSet, or a list of (x, y) goal state
+#                         tuples like initialize.makeGoalStates used to make
+#
+# @return     goalStates if it is a GoalSet already, otherwise the GoalSet
+#             TransitionSystem.inGoalStates always read the list as: the lane
+#             of the first goal state, anywhere past its y
+#
+def getGoalSet(goalStates):
+
+    if isinstance(goalStates, GoalSet):
+        return goalStates
+
+    goalX, goalY = goalStates[0]
+
+    return GoalSet([(goalX, goalY + 1, np.inf)])
@@ -0,0 +1,469 @@
+import DFA
+import Node
+import graph
+import numpy as np
+
+
+# the virtual goal every goal vertex leads into with a zero cost edge, so
+# searches with many goal vertices (e.g. every accepting product state) have
+# a single vertex to plan to
+GOAL = 'virtual goal'
+
+
+class LPAStar:
+    # @brief    Lifelong Planning A* (Koenig, Likhachev and Furcy, 2004)
+    #
+    # Keeps every vertex's g value (its cost from the start as of its last
+    # expansion) and rhs value (the one step lookahead min over its
+    # predecessors u of g(u) + cost(u, v)) between searches. When the edges
+    # out of some vertices change, only those vertices' successors get their
+    # rhs recomputed, and only the vertices made inconsistent (g != rhs) by
+    # the change are expanded again to repair the search, so replanning costs
+    # about the size of the change rather than a whole new search.
+    #
+    # Vertices and their edges are discovered lazily through a successor
+    # function, and each vertex's predecessors are recorded as its
+    # predecessors are expanded. Any predecessor that was never expanded has
+    # g = inf, so it could not have lowered the rhs anyway.
+    #
+    # Edge costs have to be positive (edges into GOAL have cost 0).
+
+    #
+    # @brief      Constructs the LPAStar object.
+    #
+    # @param      self           The LPAStar object instance
+    # @param      start          The start vertex
+    # @param      getSuccessors  Function returning an iterable of the
+    #                            (successor vertex, edge cost) tuples of a
+    #                            vertex
+    # @param      heuristic      Function returning a consistent lower bound
+    #                            on the cost from a vertex to a goal vertex
+    # @param      isGoal         Function returning whether a vertex is a goal
+    #                            vertex
+    #
+    def __init__(self, start, getSuccessors, heuristic, isGoal):
+
+        self.start = start
+        self.getSuccessorsFcn = getSuccessors
+        self.heuristic = heuristic
+        self.isGoal = isGoal
+
+        self.g = {}
+        self.rhs = {start: 0}
+
+        # the cached out edges of every expanded vertex, and the in edges of
+        # every vertex recorded from them
+        self.succs = {}
+        self.preds = {}
+
+        self.queue = graph.IndexedPriorityQueue()
+        self.queue.put((self.calcKey(start), start))
+
+        self.numExpanded = 0
+
+    #
+    # @brief      Gets the g value of a vertex, inf if it was never expanded
+    #
+    # @param      self    The LPAStar object instance
+    # @param      vertex  The vertex
+    #
+    # @return     the g value of the vertex
+    #
+    def getG(self, vertex):
+
+        return self.g.get(vertex, np.inf)
+
+    #
+    # @brief      Gets the rhs value of a vertex, inf if it was never reached
+    #
+    # @param      self    The LPAStar object instance
+    # @param      vertex  The vertex
+    #
+    # @return     the rhs value of the vertex
+    #
+    def getRhs(self, vertex):
+
+        return self.rhs.get(vertex, np.inf)
+
+    #
+    # @brief      Calculates the priority of a vertex in the queue
+    #
+    # @param      self    The LPAStar object instance
+    # @param      vertex  The vertex
+    #
+    # @return     the (min(g, rhs) + h, min(g, rhs), isGoal) key tuple. The
+    #             last entry orders GOAL after the goal vertices tied with it
+    #             through their zero cost edges, so they are repaired before
+    #             the search can stop.
+    #
+    def calcKey(self, vertex):
+
+        cost = min(self.getG(vertex), self.getRhs(vertex))
+        if vertex == GOAL:
+            return (cost, cost, 1)
+
+        return (cost + self.heuristic(vertex), cost, 0)
+
+    #
+    # @brief      Gets the out edges of a vertex, discovering and caching them
+    #             (and recording the in edges they make) the first time
+    #
+    # @param      self    The LPAStar object instance
+    # @param      vertex  The vertex
+    #
+    # @return     dict of successor vertex to edge cost
+    #
+    def expand(self, vertex):
+
+        succ = self.succs.get(vertex)
+        if succ is not None:
+            return succ
+
+        succ = {}
+        if vertex == GOAL:
+            pass
+        elif self.isGoal(vertex):
+            succ[GOAL] = 0
+        else:
+            for nextVertex, cost in self.getSuccessorsFcn(vertex):
+                if cost < succ.get(nextVertex, np.inf):
+                    succ[nextVertex] = cost
+
+        self.succs[vertex] = succ
+        for nextVertex, cost in succ.items():
+            self.preds.setdefault(nextVertex, {})[vertex] = cost
+
+        return succ
+
+    #
+    # @brief      Recomputes the rhs value of a vertex and (re)queues it if it
+    #             is now inconsistent
+    #
+    # @param      self    The LPAStar object instance
+    # @param      vertex  The vertex
+    #
+    def updateVertex(self, vertex):
+
+        if vertex != self.start:
+            preds = self.preds.get(vertex, {})
+            self.rhs[vertex] = min((self.getG(prevVertex) + cost
+                                    for prevVertex, cost in preds.items()),
+                                   default=np.inf)
+
+        if self.getG(vertex) != self.getRhs(vertex):
+            self.queue.put((self.calcKey(vertex), vertex))
+        elif vertex in self.queue:
+            self.queue.remove(vertex)
+
+    #
+    # @brief      Expands inconsistent vertices until the shortest path to the
+    #             goal is known again
+    #
+    # @param      self  The LPAStar object instance
+    #
+    # @return     the cost of the shortest path to the goal, inf if there is
+    #             no path
+    #
+    def computeShortestPath(self):
+
+        queue = self.queue
+        numExpanded = 0
+
+        while queue and (queue.heap[0][0] < self.calcKey(GOAL) or
+                         self.getRhs(GOAL) != self.getG(GOAL)):
+
+            _, vertex = queue.get()
+            numExpanded += 1
+
+            if self.getG(vertex) > self.getRhs(vertex):
+                # overconsistent, the vertex got cheaper
+                self.g[vertex] = self.rhs[vertex]
+                for nextVertex in self.expand(vertex):
+                    self.updateVertex(nextVertex)
+
+            else:
+                # underconsistent, the vertex got more expensive
+                self.g[vertex] = np.inf
+                for nextVertex in self.expand(vertex):
+                    self.updateVertex(nextVertex)
+                self.updateVertex(vertex)
+
+        self.numExpanded = numExpanded
+
+        return self.getG(GOAL)
+
+    #
+    # @brief      Tells the planner the out edges of some vertices changed,
+    #             then repairs the shortest path
+    #
+    # @param      self      The LPAStar object instance
+    # @param      vertices  The iterable of vertices whose out edges changed
+    #
+    # @return     the cost of the shortest path to the goal, inf if there is
+    #             no path
+    #
+    def updateEdges(self, vertices):
+
+        for vertex in vertices:
+
+            # a vertex that was never expanded reads its new edges when it is
+            oldSucc = self.succs.pop(vertex, None)
+            if oldSucc is None:
+                continue
+
+            for nextVertex in oldSucc:
+                del self.preds[nextVertex][vertex]
+
+            newSucc = self.expand(vertex)
+            for nextVertex in set(oldSucc) | set(newSucc):
+                self.updateVertex(nextVertex)
+
+        return self.computeShortestPath()
+
+    #
+    # @brief      Gets the current shortest path by walking back from the goal
+    #             along the predecessors that give each vertex its g value
+    #
+    # @param      self  The LPAStar object instance
+    #
+    # @return     list of the vertices from the start to the goal vertex
+    #             reached, None if there is no path
+    #
+    def getPath(self):
+
+        if self.getG(GOAL) == np.inf:
+            return None
+
+        path = []
+        vertex = GOAL
+        while vertex != self.start:
+            preds = self.preds[vertex]
+            vertex = min(preds, key=lambda prevVertex:
+                         self.getG(prevVertex) + preds[prevVertex])
+            path.append(vertex)
+
+        path.reverse()
+
+        return path
+
+
+class ProductPlanner(LPAStar):
+    # @brief    Incrementally replans the product of a TransitionSystem and an
+    #           LDBA when the POS changes
+    #
+    # The LPA* vertices are (TS Node index, automaton state q) tuples, every
+    # product transition costs one time step and the goal vertices are the
+    # accepting product states, so the first plan is as short as the one
+    # DFA.formAndSolveProduct finds. After updateOccupancy, only the TS
+    # transitions whose swept collision checks cover the changed cells are
+    # checked again, and only the product vertices built on top of them are
+    # repaired.
+
+    #
+    # @brief      Constructs the ProductPlanner object and plans the first
+    #             path
+    #
+    # @param      self  The ProductPlanner object instance
+    # @param      DTS   The (Lazy)TransitionSystem, built over a dense POS
+    #                   matrix
+    # @param      LDBA  The LDBA (LTL Deterministic Buchi Automata)
+    #
+    def __init__(self, DTS, LDBA):
+
+        self.DTS = DTS
+        self.LDBA = LDBA
+        self.needsGoal = DFA.getGoalDependentStates(LDBA)
+
+        # TS Node index -> the automaton states it was expanded with
+        self.expandedQs = {}
+
+        start = (DTS.DFA.startNode.index, LDBA.DFA.startNode.state.q)
+        LPAStar.__init__(self, start, self.getProductSuccessors,
+                         self.productHeuristic,
+                         lambda vertex: vertex[1] in LDBA.DFA.accepts)
+
+        self.computeShortestPath()
+
+    #
+    # @brief      Gets the successors of a product vertex
+    #
+    # @param      self    The ProductPlanner object instance
+    # @param      vertex  The (TS Node index, q) tuple
+    #
+    # @return     list of the (successor vertex, 1) tuples
+    #
+    def getProductSuccessors(self, vertex):
+
+        tsIndex, q = vertex
+        self.expandedQs.setdefault(tsIndex, set()).add(q)
+
+        succ = []
+        for currTSNode in self.DTS.successors(self.DTS.nodes[tsIndex]):
+
+            qNew = self.LDBA.DFA.transFcn(q, currTSNode.obs)
+
+            # anything Node after reaching the sink state will not work
+            if qNew == self.LDBA.sink:
+                continue
+
+            succ.append(((currTSNode.index, qNew), 1))
+
+        return succ
+
+    #
+    # @brief      The same goal distance heuristic as
+    #             DFA.formAndSolveProductAStar
+    #
+    # @param      self    The ProductPlanner object instance
+    # @param      vertex  The (TS Node index, q) tuple
+    #
+    # @return     the lower bound on the time steps to an accepting state
+    #
+    def productHeuristic(self, vertex):
+
+        tsIndex, q = vertex
+        if not self.needsGoal[q]:
+            return 0
+
+        state = self.DTS.nodes[tsIndex].state
+
+        return self.DTS.timeToGoalLowerBound(state.carX, state.carY)
+
+    #
+    # @brief      Updates the TS for a batch of changed POS cells, and repairs
+    #             the plan
+    #
+    # @param      self          The ProductPlanner object instance
+    # @param      changedCells  An iterable of (lane, y, t, isOccupied) POS
+    #                           cells
+    #
+    # @return     the number of time steps of the new plan, inf if there is
+    #             no plan anymore
+    #
+    def updateOccupancy(self, changedCells):
+
+        changedTSNodes = self.DTS.updateOccupancy(changedCells)
+
+        return self.updateEdges([(tsNode.index, q)
+                                 for tsNode in changedTSNodes
+                                 for q in self.expandedQs.get(tsNode.index,
+                                                              ())])
+
+    #
+    # @brief      Gets the current plan as a chain of product Nodes, like the
+    #             one DFA.formAndSolveProduct returns
+    #
+    # @param      self  The ProductPlanner object instance
+    #
+    # @return     the accepting product Node at the end of the plan (follow
+    #             its parents, e.g. with DFA.getPathToRootFromLeaf), None if
+    #             there is no plan
+    #
+    def getAcceptingNode(self):
+
+        path = self.getPath()
+        if path is None:
+            return None
+
+        prodNode = None
+        for index, (tsIndex, q) in enumerate(path):
+
+            tsNode = self.DTS.nodes[tsIndex]
+            state = tsNode.state
+            prodState = Node.NodeState(state.carX, state.carY, state.carT, q,
+                                       state.prevLane, state.prevVel)
+            prodNode = Node.Node(state=prodState, index=index,
+                                 obs=tsNode.obs, adjList=[],
+                                 isAccepting=(q in self.LDBA.DFA.accepts),
+                                 isVisited=False, parent=prodNode)
+
+        return prodNode
+
+
+class GraphPlanner(LPAStar):
+    # @brief    Incrementally replans a path between two nodes of a
+    #           graph.Graph as its edge weights change
+
+    #
+    # @brief      Constructs the GraphPlanner object and plans the first path
+    #
+    # @param      self       The GraphPlanner object instance
+    # @param      G          The graph.Graph, with a 'weight' on every edge
+    # @param      start      The start node label
+    # @param      goal       The goal node label
+    # @param      heuristic  The optional heuristic(source, dest) lower bound
+    #                        on the distance between two node labels. It has
+    #                        to stay a lower bound as the weights change, so
+    #                        e.g. the ALT landmark heuristic is only valid if
+    #                        weights only ever go up.
+    #
+    def __init__(self, G, start, goal, heuristic=None):
+
+        self.G = G
+        self.goal = goal
+
+        if heuristic is None:
+            nodeHeuristic = lambda node: 0
+        else:
+            nodeHeuristic = lambda node: heuristic(node, goal)
+
+        LPAStar.__init__(self, start, self.getGraphSuccessors, nodeHeuristic,
+                         lambda node: node == goal)
+
+        self.computeShortestPath()
+
+    #
+    # @brief      Gets the neighbors of a node with their edge weights
+    #
+    # @param      self  The GraphPlanner object instance
+    # @param      node  The node label
+    #
+    # @return     list of the (neighbor label, edge weight) tuples
+    #
+    def getGraphSuccessors(self, node):
+
+        return [(neighbor, data['weight'])
+                for neighbor, data in self.G.adj[node].items()]
+
+    #
+    # @brief      Changes a batch of edge weights of the graph and repairs the
+    #             plan
+    #
+    # @param      self          The GraphPlanner object instance
+    # @param      changedEdges  An iterable of (source, dest, weight) tuples,
+    #                           a weight of None removes the edge
+    #
+    # @return     the length of the new shortest path, inf if there is none
+    #
+    def updateEdgeWeights(self, changedEdges):
+
+        changedNodes = set()
+        for source, dest, weight in changedEdges:
+
+            if weight is None:
+                if self.G.has_edge(source, dest):
+                    self.G.remove_edge(source, dest)
+            else:
+                self.G.add_edge(source, dest, weight=weight)
+
+            changedNodes.update((source, dest))
+
+        return self.updateEdges(changedNodes)
+
+    #
+    # @brief      Gets the current shortest path, in the same form as
+    #             graph.Graph.findPathToGoal
+    #
+    # @param      self  The GraphPlanner object instance
+    #
+    # @return     (the list of node labels from start to goal, the path
+    #             length, the number of vertices expanded by the last repair),
+    #             (None, None, ...) if there is no path
+    #
+    def findPath(self):
+
+        path = self.getPath()
+        if path is None:
+            return (None, None, self.numExpanded)
+
+        return (path, self.getG(GOAL), self.numExpanded)
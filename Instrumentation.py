@@ -0,0 +1,242 @@
+from __future__ import print_function
+import contextlib
+import cProfile
+import pstats
+import time
+import tracemalloc
+
+
+# the hot path counters every Stats object reports, in report order
+COUNTERS = ['statesCreated', 'edgesCrashChecked', 'crashHits',
+            'productNodesExpanded', 'queueHighWater']
+
+# the Stats of the current run, None while instrumentation is disabled.
+#
+# The hot paths read this once per call (or per expanded state) and only do
+# any bookkeeping if it is set, so leaving the hooks in costs a single None
+# check while disabled
+active = None
+
+# shared by every phase while disabled, so a disabled phase allocates nothing
+NULL_PHASE = contextlib.nullcontext()
+
+
+class Stats:
+    # @brief    The per phase wall times and peak memory, and the hot path
+    #           counters, of one planner run
+    #
+    # Phases may be nested. The peak memory of a phase is the tracemalloc
+    # peak over the phase, less the memory already traced when it started,
+    # so it is the most extra memory the phase needed at any one time.
+
+    #
+    # @brief      Constructs the Stats object.
+    #
+    # @param      self         The Stats object instance
+    # @param      traceMemory  Whether to measure the peak memory of phases
+    #                          with tracemalloc, which slows the run down
+    #
+    def __init__(self, traceMemory=True):
+
+        self.traceMemory = traceMemory
+
+        # phase name -> {'seconds', 'peakBytes', 'calls'}, in the order the
+        # phases first ran
+        self.phases = {}
+        self.counters = {name: 0 for name in COUNTERS}
+
+        # the [startMemory, peakSoFar] of every phase being run
+        self.phaseStack = []
+
+        # whether enable() started tracemalloc, so disable() stops it
+        self.startedTracing = False
+
+    #
+    # @brief      Adds to a counter
+    #
+    # @param      self    The Stats object instance
+    # @param      name    The counter name
+    # @param      amount  The amount to add
+    #
+    def add(self, name, amount=1):
+
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    #
+    # @brief      Raises a high water mark counter to a value
+    #
+    # @param      self   The Stats object instance
+    # @param      name   The counter name
+    # @param      value  The value seen
+    #
+    def setMax(self, name, value):
+
+        if value > self.counters.get(name, 0):
+            self.counters[name] = value
+
+    #
+    # @brief      Measures the wall time and peak memory of a phase, adding to
+    #             the totals of any earlier phase of the same name
+    #
+    # @param      self  The Stats object instance
+    # @param      name  The phase name
+    #
+    @contextlib.contextmanager
+    def phase(self, name):
+
+        traceMemory = self.traceMemory and tracemalloc.is_tracing()
+
+        if traceMemory:
+            currMemory, peakMemory = tracemalloc.get_traced_memory()
+
+            # the enclosing phase's peak is about to be reset, so keep it
+            if self.phaseStack:
+                outerPhase = self.phaseStack[-1]
+                outerPhase[1] = max(outerPhase[1], peakMemory)
+
+            tracemalloc.reset_peak()
+            self.phaseStack.append([currMemory, currMemory])
+
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - startTime
+
+            peakBytes = None
+            if traceMemory:
+                startMemory, peakSoFar = self.phaseStack.pop()
+                peakMemory = max(peakSoFar, tracemalloc.get_traced_memory()[1])
+                peakBytes = peakMemory - startMemory
+
+                if self.phaseStack:
+                    outerPhase = self.phaseStack[-1]
+                    outerPhase[1] = max(outerPhase[1], peakMemory)
+
+            phaseStats = self.phases.setdefault(name, {'seconds': 0.0,
+                                                       'peakBytes': None,
+                                                       'calls': 0})
+            phaseStats['seconds'] += seconds
+            phaseStats['calls'] += 1
+            if peakBytes is not None:
+                phaseStats['peakBytes'] = max(phaseStats['peakBytes'] or 0,
+                                              peakBytes)
+
+    #
+    # @brief      Gets the stats as plain data, e.g. to dump as JSON
+    #
+    # @param      self  The Stats object instance
+    #
+    # @return     dict of the 'phases' and 'counters'
+    #
+    def asDict(self):
+
+        return {'phases': {name: dict(phaseStats)
+                           for name, phaseStats in self.phases.items()},
+                'counters': dict(self.counters)}
+
+    #
+    # @brief      Formats the stats as a table
+    #
+    # @param      self  The Stats object instance
+    #
+    # @return     the report string
+    #
+    def report(self):
+
+        lines = ['%-22s %10s %12s' % ('phase', 'ms', 'peak KiB')]
+        for name, phaseStats in self.phases.items():
+            peakBytes = phaseStats['peakBytes']
+            lines.append('%-22s %10.2f %12s' %
+                         (name, 1e3 * phaseStats['seconds'],
+                          '-' if peakBytes is None else
+                          '%.1f' % (peakBytes / 1024.0)))
+
+        lines.append('')
+        lines.append('%-22s %10s' % ('counter', 'value'))
+        for name, value in self.counters.items():
+            lines.append('%-22s %10d' % (name, value))
+
+        return '\n'.join(lines)
+
+
+#
+# @brief      Turns instrumentation on, with a fresh Stats object
+#
+# @param      traceMemory  Whether to measure the peak memory of phases
+#
+# @return     the new active Stats object
+#
+def enable(traceMemory=True):
+
+    global active
+
+    active = Stats(traceMemory)
+    if traceMemory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        active.startedTracing = True
+
+    return active
+
+
+#
+# @brief      Turns instrumentation off
+#
+# @return     the Stats object that was active, None if there was none
+#
+def disable():
+
+    global active
+
+    stats = active
+    active = None
+
+    if stats is not None and stats.startedTracing:
+        tracemalloc.stop()
+
+    return stats
+
+
+#
+# @brief      Measures a phase of the run if instrumentation is enabled
+#
+#             Use as "with Instrumentation.phase('product'):".
+#
+# @param      name  The phase name
+#
+# @return     the phase's context manager, a shared no-op one if disabled
+#
+def phase(name):
+
+    if active is None:
+        return NULL_PHASE
+
+    return active.phase(name)
+
+
+#
+# @brief      Profiles a block of code with cProfile, dumping the profile to
+#             a file and printing its top functions
+#
+#             The dump is a standard pstats file, so it can be browsed with
+#             pstats or rendered as a flame graph by tools such as snakeviz
+#             or flameprof.
+#
+# @param      path     The path to dump the profile to
+# @param      numTop   The number of top functions (by cumulative time) to
+#                      print, 0 for none
+#
+@contextlib.contextmanager
+def profile(path, numTop=20):
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+        if numTop:
+            print('wrote the profile to', path)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(numTop)
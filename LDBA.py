@@ -1,5 +1,6 @@
 import Node
 import DFA
+import LTLCompiler
 
 
 class LDBA:
@@ -8,44 +9,39 @@ class LDBA:
     #
     # @brief      Constructs the LDBA object.
     #
+    #             The automaton is compiled from the formula into a transition
+    #             table indexed by (q, observation bitmask) - see
+    #             LTLCompiler.compileLTL - and cached on disk, so each
+    #             transition is a single table lookup.
+    #
     # @param      self        The LDBA object instance
     # @param      LTLFormula  The ltl formula to contruct this automata
     #                         automatically
+    # @param      cacheDir    The directory compiled automata are cached in.
+    #                         None disables the cache.
     #
-    def __init__(self, LTLFormula):
-
-        state0 = Node.NodeState(q=0)
-        state1 = Node.NodeState(q=1)
-        state2 = Node.NodeState(q=2)
+    def __init__(self, LTLFormula, cacheDir=LTLCompiler.DEFAULT_CACHE_DIR):
 
-        node0 = Node.Node(state=state0, index=0, isAccepting=False)
-        node1 = Node.Node(state=state1, index=1, isAccepting=False)
-        node2 = Node.Node(state=state2, index=2, isAccepting=True)
+        transTable, accepts = LTLCompiler.compileLTL(LTLFormula, cacheDir)
 
-        accepts = [2]
+        Nodes = []
+        for q in range(len(transTable)):
+            state = Node.NodeState(q=q)
+            Nodes.append(Node.Node(state=state, index=q, adjList=[],
+                                   isAccepting=(q in accepts)))
 
-        startNode = node0
+        startNode = Nodes[0]
 
-        Nodes = []
-        Nodes.append(node0)
-        Nodes.append(node1)
-        Nodes.append(node2)
+        # plain nested lists are the fastest to index one transition at a time
+        transRows = transTable.tolist()
 
         def transFcn(q, obs):
-            if q == 0:
-                if obs.atGoal and (not obs.crashed) and (not obs.speeding):
-                    return 2
-                elif obs.crashed or obs.speeding:
-                    return 1
-                else:
-                    return 0
-            elif q == 1:
-                return 1
-            elif q == 2:
-                if obs.crashed or obs.speeding:
-                    return 1
-                else:
-                    return 2
+            return transRows[q][obs.toBitmask()]
+
+        self.transTable = transTable
+
+        # the state every violation leads to, which can never accept
+        self.sink = LTLCompiler.SINK_STATE
 
         self.DFA = DFA.DFA(nodes=Nodes, startNode=startNode,
                            transFcn=transFcn, accepts=accepts)
@@ -0,0 +1,294 @@
+import Node
+import numpy as np
+import hashlib
+import os
+import re
+import tempfile
+
+
+# bump this whenever the construction below changes, so stale automata in the
+# on-disk cache are never reused
+COMPILER_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 '.automataCache')
+
+# the atomic predicates a formula can use, and their Observation bitmask bit
+OBSERVATION_BITS = {'atGoal': Node.AT_GOAL,
+                    'crashed': Node.CRASHED,
+                    'speeding': Node.SPEEDING}
+
+NUM_OBSERVATIONS = 2 ** len(OBSERVATION_BITS)
+
+# the non-accepting sink state every safety violation ends up in
+SINK_STATE = 1
+
+TOKEN_REGEX = re.compile(r'\s*(?:([A-Za-z_][A-Za-z0-9_]*)|(.))')
+
+
+#
+# @brief      Compiles an LTL formula into a table driven deterministic
+#             automaton over the Observation bitmasks
+#
+#             The supported fragment is a conjunction of
+#               - G(p): p has to hold in every observed state (safety)
+#               - F(p): p has to hold in some observed state (reachability)
+#             where each p is a propositional formula over the atomic
+#             predicates atGoal, crashed and speeding, built with !, & and |.
+#
+#             The automaton tracks which of the F terms have been satisfied so
+#             far. State 0 is the start state (no F term satisfied yet), state
+#             1 is the sink that any violation of a G term leads to, and state
+#             (mask + 1) has satisfied the F terms in the nonzero bitmask
+#             mask. The state with every F term satisfied is accepting. For
+#             the 'G(!crashed & !speeding) & F(atGoal)' specification this is
+#             exactly the three state LDBA drawn in the README.
+#
+# @param      LTLFormula  The LTL formula string, e.g.
+#                         'G(!crashed & !speeding) & F(atGoal)'
+# @param      cacheDir    The directory compiled automata are cached in, keyed
+#                         by a hash of the formula. None disables the cache.
+#
+# @return     (the (numStates, NUM_OBSERVATIONS) transition table such that
+#             table[q, obs bitmask] is the next state, list of the accepting
+#             states)
+#
+def compileLTL(LTLFormula, cacheDir=DEFAULT_CACHE_DIR):
+
+    cachePath = None
+    if cacheDir is not None:
+        cachePath = os.path.join(cacheDir,
+                                 getFormulaHash(LTLFormula) + '.npz')
+
+        if os.path.exists(cachePath):
+            with np.load(cachePath) as cached:
+                return (cached['table'], cached['accepts'].tolist())
+
+    safetyTerms, reachTerms = splitConjuncts(parseLTL(LTLFormula))
+    table, accepts = buildTable(safetyTerms, reachTerms)
+
+    if cachePath is not None:
+        saveCompiled(cachePath, table, accepts)
+
+    return (table, accepts)
+
+
+#
+# @brief      Gets the cache key of a formula
+#
+# @param      LTLFormula  The LTL formula string
+#
+# @return     hex digest of the whitespace-free formula and compiler version
+#
+def getFormulaHash(LTLFormula):
+
+    normalized = ''.join(LTLFormula.split())
+    key = '%d:%s' % (COMPILER_VERSION, normalized)
+
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+#
+# @brief      Writes a compiled automaton to the cache, atomically so
+#             concurrent runs never read a half written file
+#
+# @param      cachePath  The cache file path
+# @param      table      The transition table
+# @param      accepts    The list of accepting states
+#
+def saveCompiled(cachePath, table, accepts):
+
+    cacheDir = os.path.dirname(cachePath)
+    os.makedirs(cacheDir, exist_ok=True)
+
+    fd, tmpPath = tempfile.mkstemp(dir=cacheDir, suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, table=table, accepts=np.asarray(accepts))
+        os.replace(tmpPath, cachePath)
+    except BaseException:
+        os.remove(tmpPath)
+        raise
+
+
+#
+# @brief      Parses an LTL formula into a syntax tree of nested tuples:
+#             ('atom', name), ('const', bool), ('not', a), ('and', a, b),
+#             ('or', a, b), ('G', a) and ('F', a)
+#
+# @param      LTLFormula  The LTL formula string
+#
+# @return     the root of the syntax tree
+#
+def parseLTL(LTLFormula):
+
+    tokens = []
+    for name, symbol in TOKEN_REGEX.findall(LTLFormula):
+        if name:
+            tokens.append(name)
+        elif not symbol.isspace():
+            tokens.append(symbol)
+
+    tokens.append(None)
+    pos = [0]
+
+    def peek():
+        return tokens[pos[0]]
+
+    def take(expected=None):
+        token = tokens[pos[0]]
+        if expected is not None and token != expected:
+            raise ValueError('expected %r but found %r in %r' %
+                             (expected, token, LTLFormula))
+        pos[0] += 1
+        return token
+
+    def parseOr():
+        tree = parseAnd()
+        while peek() == '|':
+            take()
+            tree = ('or', tree, parseAnd())
+        return tree
+
+    def parseAnd():
+        tree = parseUnary()
+        while peek() == '&':
+            take()
+            tree = ('and', tree, parseUnary())
+        return tree
+
+    def parseUnary():
+        token = take()
+        if token == '!':
+            return ('not', parseUnary())
+        elif token in ('G', 'F'):
+            return (token, parseUnary())
+        elif token == '(':
+            tree = parseOr()
+            take(')')
+            return tree
+        elif token in ('true', 'false'):
+            return ('const', token == 'true')
+        elif token in OBSERVATION_BITS:
+            return ('atom', token)
+        else:
+            raise ValueError('unexpected %r in %r' % (token, LTLFormula))
+
+    tree = parseOr()
+    take(None)
+
+    return tree
+
+
+#
+# @brief      Splits the top level conjunction of a formula into its G and F
+#             terms
+#
+# @param      tree  The syntax tree from parseLTL
+#
+# @return     (list of the propositional trees of the G terms, list of the
+#             propositional trees of the F terms)
+#
+def splitConjuncts(tree):
+
+    safetyTerms = []
+    reachTerms = []
+
+    conjuncts = [tree]
+    while conjuncts:
+
+        term = conjuncts.pop(0)
+        if term[0] == 'and':
+            conjuncts[0:0] = [term[1], term[2]]
+        elif term[0] == 'G' and isPropositional(term[1]):
+            safetyTerms.append(term[1])
+        elif term[0] == 'F' and isPropositional(term[1]):
+            reachTerms.append(term[1])
+        else:
+            raise ValueError('unsupported LTL term %r: only conjunctions of '
+                             'G(p) and F(p) with propositional p are '
+                             'supported' % (term,))
+
+    return (safetyTerms, reachTerms)
+
+
+#
+# @brief      Determines if a syntax tree has no temporal operators
+#
+# @param      tree  The syntax tree
+#
+# @return     True if propositional, False otherwise.
+#
+def isPropositional(tree):
+
+    if tree[0] in ('atom', 'const'):
+        return True
+    elif tree[0] in ('G', 'F'):
+        return False
+    else:
+        return all(isPropositional(child) for child in tree[1:])
+
+
+#
+# @brief      Evaluates a propositional syntax tree on an observation
+#
+# @param      tree     The propositional syntax tree
+# @param      obsMask  The Observation bitmask
+#
+# @return     the truth value of the tree
+#
+def evaluate(tree, obsMask):
+
+    op = tree[0]
+    if op == 'atom':
+        return bool(obsMask & OBSERVATION_BITS[tree[1]])
+    elif op == 'const':
+        return tree[1]
+    elif op == 'not':
+        return not evaluate(tree[1], obsMask)
+    elif op == 'and':
+        return evaluate(tree[1], obsMask) and evaluate(tree[2], obsMask)
+    elif op == 'or':
+        return evaluate(tree[1], obsMask) or evaluate(tree[2], obsMask)
+    else:
+        raise ValueError(op)
+
+
+#
+# @brief      Builds the transition table of the automaton for a set of G and
+#             F terms (see compileLTL for the state numbering)
+#
+# @param      safetyTerms  The propositional trees of the G terms
+# @param      reachTerms   The propositional trees of the F terms
+#
+# @return     (the (numStates, NUM_OBSERVATIONS) transition table, list of the
+#             accepting states)
+#
+def buildTable(safetyTerms, reachTerms):
+
+    numMasks = 2 ** len(reachTerms)
+    fullMask = numMasks - 1
+
+    def maskToState(mask):
+        return 0 if mask == 0 else mask + 1
+
+    numStates = max(numMasks + 1, 2)
+    table = np.full((numStates, NUM_OBSERVATIONS), SINK_STATE, dtype=np.int8)
+
+    for obsMask in range(NUM_OBSERVATIONS):
+
+        isSafe = all(evaluate(term, obsMask) for term in safetyTerms)
+        if not isSafe:
+            continue
+
+        reached = 0
+        for bit, term in enumerate(reachTerms):
+            if evaluate(term, obsMask):
+                reached |= (1 << bit)
+
+        for mask in range(numMasks):
+            table[maskToState(mask), obsMask] = maskToState(mask | reached)
+
+    accepts = [maskToState(fullMask)]
+
+    return (table, accepts)
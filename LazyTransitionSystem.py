@@ -0,0 +1,103 @@
+import DFA
+import TransitionSystem
+
+
+class LazyTransitionSystem(TransitionSystem.TransitionSystem):
+    # @brief    A TransitionSystem whose transitions are only built on demand
+    #
+    # Constructing the object only makes the initial Node. The transitions out
+    # of a Node are built (and cached in its adjList) the first time a search
+    # asks for them through successors(), so a product search that stops at
+    # the first accepting state, or never continues past a crashed or
+    # speeding state, only ever pays for the part of the system it visits.
+
+    #
+    # @brief      Constructs the LazyTransitionSystem object.
+    #
+    # @param      self             The LazyTransitionSystem object instance
+    # @param      initCarX         The initial carX state. CarX ~ lane on
+    #                              highway
+    # @param      initCarY         The initial carY state. CarY ~ distance down
+    #                              highway
+    # @param      initCarT         The initial carT state. CarT ~ time step
+    # @param      initCarVel       The initial velocity of the car
+    # @param      maxTime          The maximum time step allowed
+    # @param      allLanes         A list of all possible lane numbers on the
+    #                              highway.
+    # @param      allVelocities    A list of all possible car velocities for
+    #                              ALL lanes
+    # @param      allowedLaneVels  The allowed lane velocities tuple for a
+    #                              certain lane number
+    # @param      goalStates       The goal states for the car
+    # @param      POS              The POS (physical occupancy set) object
+    #                              which contains the 3D projection of a Node
+    #                              state onto the x, y, and time grid for the
+    #                              empty road.
+    #
+    def __init__(self, initCarX, initCarY, initCarT, initCarVel,
+                 maxTime, allLanes, allVelocities, allowedLaneVels,
+                 goalStates, POS):
+
+        initNode = self.initStateSpace(initCarX, initCarY, initCarVel,
+                                       maxTime, allLanes, allVelocities,
+                                       allowedLaneVels, goalStates, POS)
+
+        # indices of the Nodes whose transitions have already been built
+        self.expandedNodes = set()
+
+        self.DFA = DFA.DFA(nodes=self.nodes, startNode=initNode)
+
+    #
+    # @brief      Gets the successors of a Node, building its transitions the
+    #             first time they are asked for
+    #
+    # @param      self  The LazyTransitionSystem object instance
+    # @param      node  The Node object
+    #
+    # @return     the list of successor Node objects
+    #
+    def successors(self, node):
+
+        # Nodes at the time horizon are left unexpanded rather than marked,
+        # so they can still be expanded if the horizon is moved out
+        if node.index not in self.expandedNodes and \
+           node.state.carT < self.maxTime:
+
+            self.expandedNodes.add(node.index)
+            self.expandNode(node)
+
+        return node.adjList
+
+    #
+    # @brief      Moves the time horizon out, so the Nodes at the old horizon
+    #             get expanded the next time a search reaches them
+    #
+    # @param      self      The LazyTransitionSystem object instance
+    # @param      numSteps  The number of time steps to extend the horizon by
+    #
+    def extendHorizon(self, numSteps=1):
+
+        self.maxTime += numSteps
+
+    #
+    # @brief      Determines if the transitions out of a Node have been built
+    #
+    # @param      self  The LazyTransitionSystem object instance
+    # @param      node  The Node object
+    #
+    # @return     True if expanded, False otherwise.
+    #
+    def isExpanded(self, node):
+
+        return node.index in self.expandedNodes
+
+    #
+    # @brief      Leaves the Nodes added by updateOccupancy unexpanded, they
+    #             are built on demand like every other Node
+    #
+    # @param      self      The LazyTransitionSystem object instance
+    # @param      newNodes  The list of new Node objects
+    #
+    def expandNewNodes(self, newNodes):
+
+        pass
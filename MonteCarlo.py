@@ -0,0 +1,349 @@
+from __future__ import print_function
+import initialize
+import POS
+import TransitionSystem
+import LazyTransitionSystem
+import ArrayTransitionSystem
+import LDBA
+import DFA
+import argparse
+import csv
+import os
+import time
+import tracemalloc
+import numpy as np
+from multiprocessing import Pool
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+RESULT_COLUMNS = ['seed', 'feasible', 'timeToGoal', 'productExpanded',
+                  'tsStates', 'wallTime', 'peakTracedKiB']
+
+TRANSITION_SYSTEMS = {
+    'lazy': LazyTransitionSystem.LazyTransitionSystem,
+    'eager': TransitionSystem.TransitionSystem,
+    'array': ArrayTransitionSystem.ArrayTransitionSystem}
+
+# the configuration and compiled LDBA of a worker process, set up once per
+# worker by initWorker
+workerState = {}
+
+
+#
+# @brief      Makes the scenario configuration, the simulation settings of
+#             initialize.getSimSettings with the command line overrides
+#
+# @param      args  The parsed command line arguments
+#
+# @return     the config dict
+#
+def makeConfig(args):
+
+    (allLanes, allVelocities,
+     allowedLaneVelocites, maxDist,
+     maxTime, goalStates, initCarX,
+     initCarY, initCarT, initCarVel,
+     _) = initialize.getSimSettings()
+
+    if args.maxTime is not None:
+        maxTime = args.maxTime
+
+    return {'allLanes': allLanes,
+            'allVelocities': allVelocities,
+            'allowedLaneVelocites': allowedLaneVelocites,
+            'maxDist': maxDist,
+            'maxTime': maxTime,
+            'goalStates': goalStates,
+            'initCarX': initCarX,
+            'initCarY': initCarY,
+            'initCarT': initCarT,
+            'initCarVel': initCarVel,
+            'LTLFormula': args.formula,
+            'method': args.method,
+            'system': args.system,
+            'representation': args.representation}
+
+
+#
+# @brief      Sets up a worker process of the pool
+#
+#             The LDBA's transition function is a closure, so instead of
+#             sending it each worker compiles (or loads the cached) LDBA once.
+#
+# @param      config  The config dict
+#
+def initWorker(config):
+
+    workerState['config'] = config
+    workerState['LDBA'] = LDBA.LDBA(config['LTLFormula'])
+
+    # each run's peak memory is measured from a reset tracemalloc peak, so
+    # tracing is left on for the life of the worker
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+#
+# @brief      Runs one random traffic scenario end to end
+#
+# @param      seed  The seed of the traffic
+#
+# @return     dict of the RESULT_COLUMNS of the run
+#
+def runScenario(seed):
+
+    config = workerState['config']
+    LDBAObj = workerState['LDBA']
+
+    # the peak is measured over this run alone, relative to what the worker
+    # already held before it started
+    startMemory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+
+    startTime = time.perf_counter()
+
+    POSMat = POS.makePOS(config['allLanes'], config['allowedLaneVelocites'],
+                         config['maxDist'], config['maxTime'],
+                         config['initCarX'], config['initCarY'],
+                         representation=config['representation'], seed=seed)
+
+    DTS = TRANSITION_SYSTEMS[config['system']](config['initCarX'],
+                                               config['initCarY'],
+                                               config['initCarT'],
+                                               config['initCarVel'],
+                                               config['maxTime'],
+                                               config['allLanes'],
+                                               config['allVelocities'],
+                                               config['allowedLaneVelocites'],
+                                               config['goalStates'], POSMat)
+
+    if config['method'] == 'astar':
+        (acceptingNode,
+         numExpanded) = DFA.formAndSolveProductAStar(DTS=DTS, LDBA=LDBAObj)
+    else:
+        acceptingNode = DFA.formAndSolveProduct(DTS=DTS, LDBA=LDBAObj)
+        numExpanded = None
+
+    wallTime = time.perf_counter() - startTime
+    peakMemory = tracemalloc.get_traced_memory()[1] - startMemory
+
+    if acceptingNode is not None:
+        timeToGoal = acceptingNode.state.carT - config['initCarT']
+    else:
+        timeToGoal = None
+
+    return {'seed': seed,
+            'feasible': acceptingNode is not None,
+            'timeToGoal': timeToGoal,
+            'productExpanded': numExpanded,
+            'tsStates': len(DTS),
+            'wallTime': wallTime,
+            'peakTracedKiB': peakMemory // 1024}
+
+
+class ResultWriter:
+    # @brief    Streams the per run results to a CSV file, or to a parquet
+    #           file in row groups of batchSize runs if pyarrow is installed
+
+    #
+    # @brief      Constructs the ResultWriter object.
+    #
+    # @param      self       The ResultWriter object instance
+    # @param      path       The output path, a parquet file if it ends in
+    #                        .parquet and a CSV file otherwise
+    # @param      batchSize  The number of runs per parquet row group
+    #
+    def __init__(self, path, batchSize=1024):
+
+        self.isParquet = path.endswith('.parquet')
+        if self.isParquet and pyarrow is None:
+            raise ImportError('writing %s needs pyarrow, write a .csv file '
+                              'instead' % path)
+
+        self.batch = []
+        self.batchSize = batchSize
+
+        if self.isParquet:
+            schema = pyarrow.schema([('seed', pyarrow.int64()),
+                                     ('feasible', pyarrow.bool_()),
+                                     ('timeToGoal', pyarrow.int64()),
+                                     ('productExpanded', pyarrow.int64()),
+                                     ('tsStates', pyarrow.int64()),
+                                     ('wallTime', pyarrow.float64()),
+                                     ('peakTracedKiB', pyarrow.int64())])
+            self.writer = pyarrow.parquet.ParquetWriter(path, schema)
+        else:
+            self.file = open(path, 'w', newline='')
+            self.writer = csv.DictWriter(self.file, fieldnames=RESULT_COLUMNS)
+            self.writer.writeheader()
+
+    #
+    # @brief      Writes the result of one run
+    #
+    # @param      self    The ResultWriter object instance
+    # @param      result  The result dict of the run
+    #
+    def write(self, result):
+
+        if not self.isParquet:
+            self.writer.writerow(result)
+            return
+
+        self.batch.append(result)
+        if len(self.batch) >= self.batchSize:
+            self.flush()
+
+    #
+    # @brief      Writes the buffered parquet rows out as a row group
+    #
+    # @param      self  The ResultWriter object instance
+    #
+    def flush(self):
+
+        if self.batch:
+            columns = {name: [result[name] for result in self.batch]
+                       for name in RESULT_COLUMNS}
+            self.writer.write_table(pyarrow.table(columns,
+                                                  schema=self.writer.schema))
+            self.batch = []
+
+    #
+    # @brief      Writes out anything buffered and closes the file
+    #
+    # @param      self  The ResultWriter object instance
+    #
+    def close(self):
+
+        if self.isParquet:
+            self.flush()
+            self.writer.close()
+        else:
+            self.file.close()
+
+
+#
+# @brief      Runs many scenarios over a process pool, streaming the results
+#             to a file as they finish
+#
+# @param      config      The config dict
+# @param      seeds       The iterable of traffic seeds, one run per seed
+# @param      outPath     The results file path (see ResultWriter)
+# @param      numWorkers  The number of worker processes, None for one per
+#                         CPU. 1 runs every scenario in this process.
+#
+# @return     list of the result dicts, in the order the runs finished
+#
+def runScenarios(config, seeds, outPath, numWorkers=None):
+
+    if numWorkers is None:
+        numWorkers = os.cpu_count() or 1
+
+    writer = ResultWriter(outPath)
+    results = []
+
+    try:
+        if numWorkers <= 1:
+            wasTracing = tracemalloc.is_tracing()
+            initWorker(config)
+            try:
+                for seed in seeds:
+                    result = runScenario(seed)
+                    writer.write(result)
+                    results.append(result)
+            finally:
+                if not wasTracing:
+                    tracemalloc.stop()
+        else:
+            with Pool(numWorkers, initializer=initWorker,
+                      initargs=(config,)) as pool:
+                for result in pool.imap_unordered(runScenario, seeds,
+                                                  chunksize=16):
+                    writer.write(result)
+                    results.append(result)
+    finally:
+        writer.close()
+
+    return results
+
+
+#
+# @brief      Prints the feasible fraction and the percentiles of the
+#             results
+#
+# @param      results  The list of result dicts
+#
+def printSummary(results):
+
+    numRuns = len(results)
+    numFeasible = sum(1 for result in results if result['feasible'])
+    print('%d runs, %d feasible (%.1f%%)' %
+          (numRuns, numFeasible, 100.0 * numFeasible / max(numRuns, 1)))
+
+    percentiles = [50, 90, 99, 100]
+    print('%-18s' % '' + ''.join('%12s' % ('p%d' % p) for p in percentiles))
+
+    for name, scale in [('timeToGoal', 1), ('productExpanded', 1),
+                        ('tsStates', 1), ('wallTime', 1e3),
+                        ('peakTracedKiB', 1)]:
+
+        values = [result[name] for result in results
+                  if result[name] is not None]
+        if not values:
+            continue
+
+        label = name + (' (ms)' if name == 'wallTime' else '')
+        row = scale * np.percentile(values, percentiles)
+        print('%-18s' % label + ''.join('%12.2f' % value for value in row))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Runs the planner over many random traffic scenarios')
+    parser.add_argument('--runs', type=int, default=1000,
+                        help='the number of scenarios to run')
+    parser.add_argument('--firstSeed', type=int, default=0,
+                        help='the traffic seed of the first scenario, the '
+                             'rest count up from it')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of worker processes, one per CPU '
+                             'by default')
+    parser.add_argument('--out', default='monteCarlo.csv',
+                        help='the results file, .csv or .parquet')
+    parser.add_argument('--method', choices=['astar', 'bfs'],
+                        default='astar',
+                        help='the product search, formAndSolveProductAStar '
+                             'or formAndSolveProduct')
+    parser.add_argument('--system', choices=sorted(TRANSITION_SYSTEMS),
+                        default='lazy',
+                        help='the transition system implementation')
+    parser.add_argument('--representation',
+                        choices=['dense', 'packed', 'vehicles'],
+                        default='dense',
+                        help='the POS representation')
+    parser.add_argument('--maxTime', type=int, default=None,
+                        help='the time horizon, from initialize by default')
+    parser.add_argument('--formula',
+                        default='G(!crashed & !speeding) & F(atGoal)',
+                        help='the LTL specification')
+    args = parser.parse_args()
+
+    config = makeConfig(args)
+    seeds = range(args.firstSeed, args.firstSeed + args.runs)
+
+    startTime = time.perf_counter()
+    results = runScenarios(config, seeds, args.out, args.workers)
+    seconds = time.perf_counter() - startTime
+
+    print('wrote %d results to %s in %.1f s' %
+          (len(results), args.out, seconds))
+    printSummary(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@ class NodeState:
     # @brief      This class (struct) contains all of the info needed to hold
     #             the state of a node in the DFAs used for this project
 
+    # a state is built for every TS and product Node, so its fields are
+    # slotted instead of kept in a per instance __dict__
+    __slots__ = ('carX', 'carY', 'carT', 'q', 'prevLane', 'prevVel')
+
     #
     # @brief      Constructs the NodeState object.
     #
@@ -26,13 +30,28 @@ class NodeState:
         self.prevVel = prevVel
 
 
+# bit flags used to pack the three observations into a single small integer,
+# so array based automata can store and index on them directly
+AT_GOAL = 1
+CRASHED = 2
+SPEEDING = 4
+
+
 class Observation:
     # @brief this is just an enum / struct for the three different observations
+    #
+    # There are only 8 different observations, so instead of building one per
+    # TS edge every Observation is one of the 8 interned, immutable instances
+    # in OBSERVATIONS (a flyweight): "constructing" an Observation just looks
+    # its instance up. Observations can therefore be compared by identity,
+    # and they stay interned through pickling and copying.
+
+    __slots__ = ('atGoal', 'crashed', 'speeding', 'bitmask')
 
     #
-    # @brief      Constructs the Observation object.
+    # @brief      Gets the Observation object.
     #
-    # @param      self      The Observation object instance
+    # @param      cls       The Observation class
     # @param      atGoal    @bool for inidicating the NodeState is in the goal
     #                       state
     # @param      crashed   @bool for inidicating the NodeState is in a state
@@ -41,11 +60,92 @@ class Observation:
     #                       the current velocity exceeds the defined maximum
     #                       allowable velocities
     #
-    def __init__(self, atGoal, crashed, speeding):
+    # @return     the interned Observation object
+    #
+    def __new__(cls, atGoal, crashed, speeding):
+
+        bitmask = 0
+        if atGoal:
+            bitmask |= AT_GOAL
+        if crashed:
+            bitmask |= CRASHED
+        if speeding:
+            bitmask |= SPEEDING
+
+        return OBSERVATIONS[bitmask]
+
+    #
+    # @brief      Stops an interned Observation from being changed, as every
+    #             Node with the same observations shares it
+    #
+    # @param      self   The Observation object instance
+    # @param      name   The attribute name
+    # @param      value  The attribute value
+    #
+    def __setattr__(self, name, value):
 
-        self.atGoal = atGoal
-        self.crashed = crashed
-        self.speeding = speeding
+        raise AttributeError('Observations are interned and can not be '
+                             'changed, use a different Observation instead')
+
+    #
+    # @brief      Pickles (and copies) the Observation as its bitmask, so it
+    #             is unpickled as the interned instance
+    #
+    # @param      self  The Observation object instance
+    #
+    # @return     the (callable, args) pair that rebuilds the Observation
+    #
+    def __reduce__(self):
+
+        return (observationFromBitmask, (self.bitmask,))
+
+    #
+    # @brief      Packs the observation into an integer bitmask
+    #
+    # @param      self  The Observation object instance
+    #
+    # @return     the OR of AT_GOAL, CRASHED and SPEEDING for each observation
+    #             that is True
+    #
+    def toBitmask(self):
+
+        return self.bitmask
+
+
+#
+# @brief      Builds the interned Observation object of a bitmask, only ever
+#             used to fill OBSERVATIONS
+#
+# @param      bitmask  The observation bitmask
+#
+# @return     the new Observation object
+#
+def makeObservation(bitmask):
+
+    obs = object.__new__(Observation)
+    object.__setattr__(obs, 'atGoal', bool(bitmask & AT_GOAL))
+    object.__setattr__(obs, 'crashed', bool(bitmask & CRASHED))
+    object.__setattr__(obs, 'speeding', bool(bitmask & SPEEDING))
+    object.__setattr__(obs, 'bitmask', bitmask)
+
+    return obs
+
+
+# the interned Observation of every bitmask, indexed by the bitmask
+OBSERVATIONS = tuple(makeObservation(bitmask)
+                     for bitmask in range((AT_GOAL | CRASHED | SPEEDING) + 1))
+
+
+#
+# @brief      Unpacks an observation bitmask into an Observation object
+#
+# @param      bitmask  The observation bitmask (see Observation.toBitmask)
+#
+# @return     The interned Observation object encoded by bitmask
+#
+def observationFromBitmask(bitmask):
+
+    return OBSERVATIONS[bitmask]
 
 
 class Node:
@@ -53,6 +153,9 @@ class Node:
     # @brief      Class for a full Node in an automata for this project
     #
 
+    __slots__ = ('state', 'index', 'obs', 'adjList', 'isAccepting',
+                 'isVisited', 'parent')
+
     #
     # @brief      Constructs the Node object.
     #
@@ -66,15 +169,21 @@ class Node:
     #                          2) 'crashed': @bool
     #                          3) 'speeding': @bool
     # @param      adjList      The Node's adjacency list, containing the
-    #                          connected Nodes to this Node instance
+    #                          connected Nodes to this Node instance. Defaults
+    #                          to a new, empty list.
     # @param      isAccepting  Indicates if this Node is accepting in a DBA
     # @param      isVisited    Indicates if this Node has been visited during a
     #                          graph search
     # @param      parent       The parent node
     #
-    def __init__(self, state, index=None, obs=None, adjList=[],
+    def __init__(self, state, index=None, obs=None, adjList=None,
                  isAccepting=False, isVisited=False, parent=None):
 
+        # a shared default list would link every Node built without an
+        # adjList to the successors of all of the others
+        if adjList is None:
+            adjList = []
+
         self.state = state
         self.index = index
         self.obs = obs
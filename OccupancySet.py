@@ -0,0 +1,339 @@
+import numpy as np
+
+
+class OccupancySet:
+    # @brief    Base class for the compact, read only stand ins for the dense
+    #           POS matrix
+    #
+    # Subclasses set self.shape = (numLanes, maxDist, maxTime) and implement
+    # occupiedMany, anyOccupied and anyOccupiedMany. This base class then
+    # makes them indexable like the dense matrix (e.g. POS[:, :, t] in
+    # POS.plotCarAndPOS).
+
+    #
+    # @brief      Reads cells or slices of the POS just like indexing the dense
+    #             POS matrix, e.g. POS[:, :, t]
+    #
+    # @param      self  The OccupancySet object instance
+    # @param      key   The (lane, y, t) index tuple, each an int or a slice
+    #
+    # @return     uint8 array (or scalar) of the requested cells, 1 where there
+    #             is a car
+    #
+    def __getitem__(self, key):
+
+        if not isinstance(key, tuple):
+            key = (key,)
+        key = key + (slice(None),) * (len(self.shape) - len(key))
+
+        indices = [np.arange(dim)[k] for dim, k in zip(self.shape, key)]
+        grids = np.ix_(*[np.atleast_1d(idx) for idx in indices])
+        cells = self.occupiedMany(*grids).astype(np.uint8)
+
+        # integer indices drop their axis, just like numpy indexing
+        keptShape = [len(np.atleast_1d(idx)) for idx in indices
+                     if np.ndim(idx) > 0]
+        cells = cells.reshape(keptShape)
+
+        return cells[()] if cells.ndim == 0 else cells
+
+    #
+    # @brief      Raises an IndexError for any cell outside of the POS, the
+    #             same way indexing the dense POS matrix would
+    #
+    # @param      self   The OccupancySet object instance
+    # @param      lanes  The lane (x) indices
+    # @param      ys     The distance (y) indices
+    # @param      ts     The time indices
+    #
+    def checkBounds(self, lanes, ys, ts):
+
+        for idx, dim in zip((lanes, ys, ts), self.shape):
+            if np.any(idx < 0) or np.any(idx >= dim):
+                raise IndexError('index out of bounds for POS with shape %s'
+                                 % (self.shape,))
+
+
+class PackedOccupancySet(OccupancySet):
+    # @brief    A compact, read only stand in for the dense POS matrix
+    #
+    # Every time slice of the POS made by POS.makePOS is the first slice
+    # shifted down the road by t * (the minimum velocity of the lane), so only
+    # the first slice is stored, bit-packed along the distance axis. Any cell
+    # or slice of the full (numLanes, maxDist, maxTime) matrix is served by
+    # looking up the shifted cell of the first slice:
+    #
+    #   POS[x, y, t] = firstSlice[x, y - t * laneVelocities[x]]
+    #
+    # where, like the dense propagation in POS.makePOS, the first cell of the
+    # road (y = 0) is not carried forward in time.
+
+    #
+    # @brief      Constructs the PackedOccupancySet object.
+    #
+    # @param      self            The PackedOccupancySet object instance
+    # @param      firstSlice      The (numLanes, maxDist) occupancy of the road
+    #                             at time 0, nonzero where there is a car
+    # @param      laneVelocities  The velocity the other cars in each lane
+    #                             travel at
+    # @param      maxTime         The maximum simulation time
+    #
+    def __init__(self, firstSlice, laneVelocities, maxTime):
+
+        firstSlice = np.asarray(firstSlice)
+        numLanes, maxDist = firstSlice.shape
+
+        self.shape = (numLanes, maxDist, maxTime)
+        self.bits = np.packbits(firstSlice != 0, axis=1)
+        self.laneVelocities = np.asarray(laneVelocities, dtype=np.int64)
+
+    #
+    # @brief      The total number of bytes used to store the occupancy set
+    #
+    # @param      self  The PackedOccupancySet object instance
+    #
+    @property
+    def nbytes(self):
+
+        return self.bits.nbytes + self.laneVelocities.nbytes
+
+    #
+    # @brief      Gets the occupancy of many individual cells at once
+    #
+    # @param      self   The PackedOccupancySet object instance
+    # @param      lanes  The array of lane (x) indices
+    # @param      ys     The array of distance (y) indices
+    # @param      ts     The array of time indices
+    #
+    # @return     boolean array broadcast from the arguments, True where the
+    #             cell is occupied
+    #
+    def occupiedMany(self, lanes, ys, ts):
+
+        lanes, ys, ts = np.broadcast_arrays(lanes, ys, ts)
+        self.checkBounds(lanes, ys, ts)
+
+        src = ys - ts * self.laneVelocities[lanes]
+        firstSrc = np.where(ts > 0, 1, 0)
+        isShiftedIn = (src >= firstSrc)
+        src = np.where(isShiftedIn, src, 0)
+
+        byte = self.bits[lanes, src >> 3]
+        bit = (byte >> (7 - (src & 7))) & 1
+
+        return (bit != 0) & isShiftedIn
+
+    #
+    # @brief      Determines if any other car occupies a stretch of a lane
+    #
+    # @param      self    The PackedOccupancySet object instance
+    # @param      lane    The lane (x) index
+    # @param      y       The first distance (y) index of the stretch
+    # @param      t       The time index
+    # @param      window  The length of the stretch, a window <= 0 is empty
+    #
+    # @return     True if any of POS[lane, y:y + window, t] is occupied
+    #
+    def anyOccupied(self, lane, y, t, window):
+
+        if window <= 0:
+            return False
+
+        self.checkBounds(lane, y, t)
+        self.checkBounds(lane, y + window - 1, t)
+
+        # map the stretch back onto the first slice
+        shift = t * int(self.laneVelocities[lane])
+        firstSrc = 1 if t > 0 else 0
+        lo = max(y - shift, firstSrc)
+        hi = y - shift + window
+        if hi <= lo:
+            return False
+
+        # test all of the bits in [lo, hi) with a single masked integer
+        firstByte = lo >> 3
+        lastByte = (hi - 1) >> 3
+        chunk = int.from_bytes(self.bits[lane, firstByte:lastByte + 1]
+                               .tobytes(), 'big')
+        numTrailing = (lastByte + 1) * 8 - hi
+        mask = ((1 << (hi - lo)) - 1) << numTrailing
+
+        return (chunk & mask) != 0
+
+    #
+    # @brief      Vectorized version of anyOccupied
+    #
+    # @param      self     The PackedOccupancySet object instance
+    # @param      lanes    The array of lane (x) indices
+    # @param      ys       The array of the first distance (y) index of each
+    #                      stretch
+    # @param      ts       The array of time indices
+    # @param      windows  The array of stretch lengths
+    #
+    # @return     boolean array broadcast from the arguments, True where the
+    #             corresponding stretch is occupied
+    #
+    def anyOccupiedMany(self, lanes, ys, ts, windows):
+
+        lanes, ys, ts, windows = np.broadcast_arrays(lanes, ys, ts, windows)
+        isOccupied = np.zeros(lanes.shape, dtype=bool)
+
+        # the windows are only ever a car length or so, so step along them
+        maxWindow = int(windows.max()) if windows.size else 0
+        for offset in range(0, maxWindow):
+
+            inWindow = (offset < windows)
+            cellYs = np.where(inWindow, ys + offset, 0)
+            isOccupied |= self.occupiedMany(lanes, cellYs, ts) & inWindow
+
+        return isOccupied
+
+
+class VehicleOccupancySet(OccupancySet):
+    # @brief    An implicit occupancy set that only keeps the list of other
+    #           cars
+    #
+    # The traffic made by POS.makePOS is a list of cars per lane, each moving
+    # at the lane's minimum velocity, so instead of rasterizing it onto a grid
+    # this only stores the time 0 car positions. Collision queries over a
+    # stretch [y, y + window) at time t are answered by moving the stretch
+    # back to time 0 and binary searching the sorted positions. Memory is
+    # O(number of cars), independent of maxDist and maxTime.
+    #
+    # The positions of all lanes are kept in a single sorted array of keys
+    # lane * (maxDist + 1) + position, so a whole batch of queries over
+    # different lanes is one np.searchsorted call.
+
+    #
+    # @brief      Constructs the VehicleOccupancySet object.
+    #
+    # @param      self              The VehicleOccupancySet object instance
+    # @param      laneCarPositions  A list with the time 0 positions (y) of
+    #                               the other cars in each lane
+    # @param      laneVelocities    The velocity the other cars in each lane
+    #                               travel at
+    # @param      maxDist           The maximum simulation distance
+    # @param      maxTime           The maximum simulation time
+    #
+    def __init__(self, laneCarPositions, laneVelocities, maxDist, maxTime):
+
+        numLanes = len(laneCarPositions)
+
+        self.shape = (numLanes, maxDist, maxTime)
+        self.laneVelocities = np.asarray(laneVelocities, dtype=np.int64)
+        self.laneStride = maxDist + 1
+
+        carKeys = [np.unique(np.asarray(positions, dtype=np.int64)) +
+                   lane * self.laneStride
+                   for lane, positions in enumerate(laneCarPositions)]
+        self.carKeys = np.concatenate(carKeys) if carKeys else \
+            np.zeros(0, dtype=np.int64)
+
+    #
+    # @brief      The total number of bytes used to store the occupancy set
+    #
+    # @param      self  The VehicleOccupancySet object instance
+    #
+    @property
+    def nbytes(self):
+
+        return self.carKeys.nbytes + self.laneVelocities.nbytes
+
+    #
+    # @brief      Gets the time 0 positions of the other cars in a lane
+    #
+    # @param      self  The VehicleOccupancySet object instance
+    # @param      lane  The lane (x) index
+    #
+    # @return     sorted array of the car positions (y) in lane
+    #
+    def getCarPositions(self, lane):
+
+        first, last = np.searchsorted(self.carKeys,
+                                      [lane * self.laneStride,
+                                       (lane + 1) * self.laneStride])
+
+        return self.carKeys[first:last] - lane * self.laneStride
+
+    #
+    # @brief      Gets the occupancy of many individual cells at once
+    #
+    # @param      self   The VehicleOccupancySet object instance
+    # @param      lanes  The array of lane (x) indices
+    # @param      ys     The array of distance (y) indices
+    # @param      ts     The array of time indices
+    #
+    # @return     boolean array broadcast from the arguments, True where the
+    #             cell is occupied
+    #
+    def occupiedMany(self, lanes, ys, ts):
+
+        return self.anyOccupiedMany(lanes, ys, ts, 1)
+
+    #
+    # @brief      Determines if any other car occupies a stretch of a lane
+    #
+    # @param      self    The VehicleOccupancySet object instance
+    # @param      lane    The lane (x) index
+    # @param      y       The first distance (y) index of the stretch
+    # @param      t       The time index
+    # @param      window  The length of the stretch, a window <= 0 is empty
+    #
+    # @return     True if any of POS[lane, y:y + window, t] is occupied
+    #
+    def anyOccupied(self, lane, y, t, window):
+
+        if window <= 0:
+            return False
+
+        self.checkBounds(lane, y, t)
+        self.checkBounds(lane, y + window - 1, t)
+
+        # map the stretch back onto the time 0 car positions, the first cell
+        # of the road is not carried forward in time
+        shift = t * int(self.laneVelocities[lane])
+        firstSrc = 1 if t > 0 else 0
+        lo = max(y - shift, firstSrc)
+        hi = y - shift + window
+        if hi <= lo:
+            return False
+
+        laneKey = lane * self.laneStride
+        first = np.searchsorted(self.carKeys, laneKey + lo)
+
+        return bool(first < len(self.carKeys) and
+                    self.carKeys[first] < laneKey + hi)
+
+    #
+    # @brief      Vectorized version of anyOccupied
+    #
+    # @param      self     The VehicleOccupancySet object instance
+    # @param      lanes    The array of lane (x) indices
+    # @param      ys       The array of the first distance (y) index of each
+    #                      stretch
+    # @param      ts       The array of time indices
+    # @param      windows  The array of stretch lengths
+    #
+    # @return     boolean array broadcast from the arguments, True where the
+    #             corresponding stretch is occupied
+    #
+    def anyOccupiedMany(self, lanes, ys, ts, windows):
+
+        lanes, ys, ts, windows = np.broadcast_arrays(lanes, ys, ts, windows)
+
+        # empty windows are never bounds checked, just like the scalar query
+        isEmpty = (windows <= 0)
+        lastYs = np.where(isEmpty, 0, ys + windows - 1)
+        self.checkBounds(lanes, np.where(isEmpty, 0, ys), ts)
+        self.checkBounds(lanes, lastYs, ts)
+
+        shift = ts * self.laneVelocities[lanes]
+        firstSrc = np.where(ts > 0, 1, 0)
+        lo = np.maximum(ys - shift, firstSrc)
+        hi = ys - shift + windows
+
+        laneKey = lanes * self.laneStride
+        first = np.searchsorted(self.carKeys, laneKey + lo)
+        last = np.searchsorted(self.carKeys, laneKey + hi)
+
+        return (last > first) & (hi > lo) & ~isEmpty
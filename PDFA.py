@@ -1,5 +1,6 @@
 from __future__ import print_function
 import Node
+import Instrumentation
 from collections import deque
 
 
@@ -66,83 +67,87 @@ def formAndSolveProduct(DTS, LDBA):
 
     index = 0
     prevProdNode = None
-    prevTSNode = None
     startProdNode = Node.Node(state=startProdState, index=index,
                               obs=obs, adjList=[],
                               isAccepting=False, isVisited=False,
                               parent=prevProdNode)
-
-    Nodes = []
-    Nodes.append(startProdNode)
     index += 1
 
+    # a product state is the pair (TS state, automaton state), so that is what
+    # has to be marked as visited - not the TS Node, which is shared by every
+    # automaton state it is paired with. The pairs are packed into a single
+    # integer key: TS Node index * number of automaton states + q
+    numQ = len(LDBA.DFA.nodes)
+    visited = set()
+    visited.add(startTSNode.index * numQ + q)
+
     nodeQueue = deque()
-    nodeQueue.append((startProdNode, prevTSNode, startTSNode))
-    accepts = []
+    nodeQueue.append((startProdNode, startTSNode))
+
+    stats = Instrumentation.active
 
     while nodeQueue:
 
-        prevProdNode,\
-            prevTSNode, currTSNode = nodeQueue.popleft()
-        newProdNode = prevProdNode
-
-        if not currTSNode.isVisited:
-
-            currTSNode.isVisited = True
-            keepSearching = True
-
-            if (prevTSNode is not None) and (prevProdNode is not None):
-                currObsv = currTSNode.obs
-
-                currState = currTSNode.state
-
-                carX = currState.carX
-                carY = currState.carY
-                carT = currState.carT
-                prevLane = currState.prevLane
-                prevVel = currState.prevVel
-
-                qNew = LDBA.DFA.transFcn(prevProdNode.state.q, currObsv)
-                qNewAccepts = (qNew in LDBA.DFA.accepts)
-
-                newProdState = Node.NodeState(carX, carY, carT, qNew,
-                                              prevLane, prevVel)
-                newProdNode = Node.Node(state=newProdState, index=index,
-                                        isAccepting=qNewAccepts,
-                                        parent=prevProdNode)
-
-                # anything Node after reaching state 1 will not work
-                keepSearching = (qNew != 1)
-                if keepSearching:
-                    accepts.append(index)
-                    prevProdNode.adjList.append(newProdNode)
-
-                # turn on for debug :)
-                # print('X:', carX,
-                #       'Y:', carY,
-                #       'T:', carT,
-                #       'index:', newProdNode.index,
-                #       'parentIdx:', newProdNode.parent.index,
-                #       'prevLane:', prevLane,
-                #       'q:', qNew,
-                #       'atGoal:', currObsv.atGoal,
-                #       'crashed:', currObsv.crashed,
-                #       'speeding:', currObsv.speeding,
-                #       'keepSearching:', keepSearching)
-
-                # goal state is defined in LDBA as q = 2
-                atGoal = (qNew == 2)
-                if atGoal:
-                    return newProdNode
-
-                index += 1
-
-            if keepSearching:
-                # now need after we have relaxed some of da edges its time to
-                # do the BFS queuing
-                for neighbor in currTSNode.adjList:
-                    if not neighbor.isVisited:
-                        nodeQueue.append((newProdNode, currTSNode, neighbor))
+        if stats is not None:
+            stats.add('productNodesExpanded')
+            stats.setMax('queueHighWater', len(nodeQueue))
+
+        prevProdNode, prevTSNode = nodeQueue.popleft()
+        prevQ = prevProdNode.state.q
+
+        # now need after we have relaxed some of da edges its time to do the
+        # BFS queuing
+        for currTSNode in DTS.successors(prevTSNode):
+
+            currObsv = currTSNode.obs
+            qNew = LDBA.DFA.transFcn(prevQ, currObsv)
+
+            prodKey = currTSNode.index * numQ + qNew
+            if prodKey in visited:
+                continue
+            visited.add(prodKey)
+
+            # anything Node after reaching the sink state will not work
+            keepSearching = (qNew != LDBA.sink)
+            if not keepSearching:
+                continue
+
+            currState = currTSNode.state
+
+            carX = currState.carX
+            carY = currState.carY
+            carT = currState.carT
+            prevLane = currState.prevLane
+            prevVel = currState.prevVel
+
+            qNewAccepts = (qNew in LDBA.DFA.accepts)
+
+            newProdState = Node.NodeState(carX, carY, carT, qNew,
+                                          prevLane, prevVel)
+            newProdNode = Node.Node(state=newProdState, index=index,
+                                    adjList=[], isAccepting=qNewAccepts,
+                                    parent=prevProdNode)
+            prevProdNode.adjList.append(newProdNode)
+            index += 1
+
+            # turn on for debug :)
+            # print('X:', carX,
+            #       'Y:', carY,
+            #       'T:', carT,
+            #       'index:', newProdNode.index,
+            #       'parentIdx:', newProdNode.parent.index,
+            #       'prevLane:', prevLane,
+            #       'q:', qNew,
+            #       'atGoal:', currObsv.atGoal,
+            #       'crashed:', currObsv.crashed,
+            #       'speeding:', currObsv.speeding)
+
+            # the goal is reached as soon as the automaton accepts (q = 2 for
+            # the 'G(!crashed & !speeding) & F(atGoal)' LDBA)
+            if qNewAccepts:
+                return newProdNode
+
+            nodeQueue.append((newProdNode, currTSNode))
 
     # if you get here things have gone horribly wrong
     return None
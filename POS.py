@@ -1,8 +1,16 @@
 from __future__ import print_function
 import numpy as np
-import random
 import matplotlib.pyplot as plt
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+import OccupancySet
+import GoalSet
+import os
+
+
+# the car icon plotted on the road, found next to this module so the plots
+# work from any working directory
+CAR_IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'car.png')
 
 
 #
@@ -11,7 +19,9 @@ from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 #             other vehicles (obstacles) exists
 #
 # The other cars' locations are drawn from uniform distributions and then
-# transformed to distribute them properly
+# transformed to distribute them properly: in each lane, the gaps between
+# consecutive cars are drawn uniformly from [0, spaceFactor * (the minimum
+# velocity of the lane)], all at once, and placed with a cumulative sum.
 #
 # @param      allLanes              A list of all possible lane numbers on the
 #                                   highway.
@@ -23,38 +33,128 @@ from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 #                                   highway
 # @param      initCarY              The initial carY state. CarY ~ distance
 #                                   down highway
+# @param      representation        The representation of the POS to return:
+#                                   - 'dense': the full numpy matrix
+#                                   - 'packed': an
+#                                     OccupancySet.PackedOccupancySet, which
+#                                     only stores the bit-packed first time
+#                                     slice
+#                                   - 'vehicles': an
+#                                     OccupancySet.VehicleOccupancySet, which
+#                                     only stores the other cars' positions
+# @param      seed                  The seed for the traffic: None for fresh
+#                                   entropy, an int, or a
+#                                   numpy.random.Generator to draw from
 #
 # @return     POS matrix given the simulation conditions
 #
 def makePOS(allLanes, allowedLaneVelocites, maxDist, maxTime,
-            initCarX, initCarY):
+            initCarX, initCarY, representation='dense', seed=None):
 
     spaceFactor = 6
+    rng = np.random.default_rng(seed)
 
     numLanes = max(allLanes) + 1
-    POS = np.zeros((numLanes, maxDist, maxTime))
+    laneVelocities = []
+    laneCarPositions = []
 
     for ii in range(0, numLanes):
 
         # generating the spacing for the random other cars
         currLaneVelocityRange = allowedLaneVelocites[ii]
         minAllowedVelInLane = min(currLaneVelocityRange)
-        dist = random.randint(0, minAllowedVelInLane * spaceFactor)
+        laneVelocities.append(minAllowedVelInLane)
 
         # generating the obstacles for one time slice
-        while dist < maxDist:
-            POS[ii, dist, 0] = 1
-            dist = dist + random.randint(0, minAllowedVelInLane * spaceFactor)
+        carPositions = drawCarPositions(rng, maxDist,
+                                        minAllowedVelInLane * spaceFactor)
 
         # make sure to delete any other car that happens to be at the initial
         # state of our car
-        POS[initCarX, initCarY, 0] = 0
+        if ii == initCarX:
+            carPositions = carPositions[carPositions != initCarY]
+
+        laneCarPositions.append(carPositions)
+
+    if representation == 'dense':
+        return rasterizePOS(laneCarPositions, laneVelocities,
+                            maxDist, maxTime)
+    elif representation == 'packed':
+        firstSlice = rasterizePOS(laneCarPositions, laneVelocities,
+                                  maxDist, 1)[:, :, 0]
+        return OccupancySet.PackedOccupancySet(firstSlice, laneVelocities,
+                                               maxTime)
+    elif representation == 'vehicles':
+        return OccupancySet.VehicleOccupancySet(laneCarPositions,
+                                                laneVelocities,
+                                                maxDist, maxTime)
+    else:
+        raise ValueError(representation)
+
+
+#
+# @brief      Draws the time 0 positions of the other cars in one lane
+#
+# @param      rng     The numpy.random.Generator to draw from
+# @param      maxDist The maximum simulation distance
+# @param      maxGap  The largest possible gap between two consecutive cars
+#
+# @return     the sorted array of car positions, all less than maxDist
+#
+def drawCarPositions(rng, maxDist, maxGap):
+
+    # the gaps average maxGap / 2, so draw enough of them to usually cover
+    # the whole road in one go, and top up in the rare case they did not
+    numGaps = int(2.5 * maxDist / max(maxGap, 1)) + 16
+    carPositions = np.cumsum(rng.integers(0, maxGap, size=numGaps,
+                                          endpoint=True))
+
+    while carPositions[-1] < maxDist:
+        moreGaps = rng.integers(0, maxGap, size=numGaps, endpoint=True)
+        carPositions = np.concatenate((carPositions,
+                                       carPositions[-1] + np.cumsum(moreGaps)))
+
+    return carPositions[carPositions < maxDist]
+
 
-        # propagating them forward through the time dimension of the occupancy
-        # set
-        for time in range(0, maxTime - 1):
-            vbuf = (time + 1) * minAllowedVelInLane
-            POS[ii, (vbuf + 1):, time + 1] = POS[ii, 1:-vbuf, 0]
+#
+# @brief      Rasterizes the other cars onto the dense POS matrix, propagating
+#             them forward through the time dimension of the occupancy set
+#
+#             At time t, every car has moved t * (its lane velocity) down the
+#             road. Cars that start at the very first cell of the road are
+#             not carried forward in time, and cars that move past maxDist
+#             leave the road.
+#
+# @param      laneCarPositions  A list with the time 0 positions (y) of the
+#                               other cars in each lane
+# @param      laneVelocities    The velocity the other cars in each lane
+#                               travel at
+# @param      maxDist           The maximum simulation distance
+# @param      maxTime           The maximum simulation time
+#
+# @return     the dense (numLanes, maxDist, maxTime) POS matrix
+#
+def rasterizePOS(laneCarPositions, laneVelocities, maxDist, maxTime):
+
+    numLanes = len(laneCarPositions)
+    POS = np.zeros((numLanes, maxDist, maxTime))
+
+    lanes = np.concatenate([np.full(len(positions), lane, dtype=np.int64)
+                            for lane, positions in
+                            enumerate(laneCarPositions)])
+    positions = np.concatenate([np.asarray(positions, dtype=np.int64)
+                                for positions in laneCarPositions])
+
+    # shift every car through every time step at once
+    times = np.arange(maxTime)[None, :]
+    shifted = positions[:, None] + \
+        times * np.asarray(laneVelocities, dtype=np.int64)[lanes][:, None]
+    onRoad = (shifted < maxDist) & ((times == 0) | (positions[:, None] > 0))
+
+    lanes = np.broadcast_to(lanes[:, None], shifted.shape)
+    times = np.broadcast_to(times, shifted.shape)
+    POS[lanes[onRoad], shifted[onRoad], times[onRoad]] = 1
 
     return POS
 
@@ -68,7 +168,8 @@ def makePOS(allLanes, allowedLaneVelocites, maxDist, maxTime,
 # @param      saveTitle  The save path string
 # @param      initCarY     The initial downrange distance of the car
 # @param      allLanes     All possible lane indices in a tuple
-# @param      goalStates   The goal states - a list of (x, y)
+# @param      goalStates   The GoalSet of goal regions (or a legacy list of
+#                          (x, y) goal states)
 # @param      maxTime      The maximum simulation time
 #
 # @return     a plot
@@ -77,9 +178,19 @@ def plotCarAndPOS(POSMat, optimalPath, saveTitle,
                   initCarY, allLanes, goalStates, maxTime):
 
     fig = plt.figure()
-    image = plt.imread('car.png')
+    image = plt.imread(CAR_IMAGE_PATH)
+    goalSet = GoalSet.getGoalSet(goalStates)
     shouldSavePlot = True
 
+    # show the road up to a little past the nearest goal region, or all of
+    # the plotted road if there are no goal regions
+    goalStarts = [goalYMin - initCarY
+                  for _, goalYMin, _ in goalSet.getRegions()]
+    if goalStarts:
+        maxX = min(goalStarts) * 1.2
+    else:
+        maxX = POSMat.shape[1] - 1 - initCarY
+
     # make a subplot for the state of the road for each time step
     for t in range(0, maxTime):
 
@@ -133,19 +244,15 @@ def plotCarAndPOS(POSMat, optimalPath, saveTitle,
         # plotting the goal states
         ########################################################
 
-        xGoal = []
-        yGoal = []
-        for state in goalStates:
-            # re-normalize all trimmed distances to be distances from the car's
-            # starting location
-            xGoal.append(state[1] - initCarY)
-            yGoal.append(state[0])
+        for goalLane, goalYMin, goalYMax in goalSet.getRegions():
 
-        minYGoal = min(yGoal) - 0.5
-        maxYGoal = max(yGoal) + 0.5
+            # re-normalize all trimmed distances to be distances from the car's
+            # starting location, and keep unbounded regions on the plot
+            xGoal = [goalYMin - initCarY,
+                     min(goalYMax, POSMat.shape[1] - 1) - initCarY]
 
-        ax.fill_between(xGoal, minYGoal, maxYGoal,
-                        alpha=0.5, color='green', label='Goal Region')
+            ax.fill_between(xGoal, goalLane - 0.5, goalLane + 0.5,
+                            alpha=0.5, color='green', label='Goal Region')
 
         ########################################################
         # plotting the car's position at time t
@@ -175,7 +282,6 @@ def plotCarAndPOS(POSMat, optimalPath, saveTitle,
 
         minY = min(allLanes) - 0.6
         maxY = max(allLanes) + 0.6
-        maxX = min(xGoal) * 1.2
         minX = 0
 
         plt.xlim((minX, maxX))
@@ -0,0 +1,262 @@
+from __future__ import print_function
+import ArrayTransitionSystem
+import Collision
+import POS
+import numpy as np
+import os
+import time
+from multiprocessing import Pool, shared_memory
+
+
+# the collision checker and per lane tables of a worker process, set up once
+# per worker by initWorker
+workerState = {}
+
+
+#
+# @brief      Sets up a worker process of the pool
+#
+#             A SweptCollisionTable is never sent to the workers. Its cumOcc
+#             table is put in shared memory once, and every worker maps it
+#             as is. The compact occupancy sets are small enough to send.
+#
+# @param      shmName  The name of the shared memory block holding the cumOcc
+#                      table, None to use checker instead
+# @param      shape    The shape of the cumOcc table
+# @param      dtype    The dtype string of the cumOcc table
+# @param      checker  The collision checker to use if there is no shared
+#                      memory block
+# @param      tables   The (velocities, minLaneSpeeds, minLane, maxLane) tuple
+#                      of expandFrontier arguments
+#
+def initWorker(shmName, shape, dtype, checker, tables):
+
+    if shmName is not None:
+        shm = shared_memory.SharedMemory(name=shmName)
+        cumOcc = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        checker = Collision.SweptCollisionTable(cumOcc=cumOcc)
+
+        # the table is only valid as long as the block stays mapped
+        workerState['shm'] = shm
+
+    workerState['POS'] = checker
+    workerState['tables'] = tables
+
+
+#
+# @brief      Expands one slice of a frontier in a worker process
+#
+# @param      task  The (frontierX, frontierY, t) tuple of the slice
+#
+# @return     the expandFrontier arrays of the slice
+#
+def expandChunk(task):
+
+    frontierX, frontierY, t = task
+    velocities, minLaneSpeeds, minLane, maxLane = workerState['tables']
+
+    return ArrayTransitionSystem.expandFrontier(frontierX, frontierY, t,
+                                                workerState['POS'],
+                                                velocities, minLaneSpeeds,
+                                                minLane, maxLane)
+
+
+class ParallelArrayTransitionSystem(
+        ArrayTransitionSystem.ArrayTransitionSystem):
+    # @brief    An ArrayTransitionSystem whose wide time layers are expanded
+    #           by a pool of worker processes
+    #
+    # Each layer's frontier is cut into one contiguous slice per worker. The
+    # workers form and crash check the successors of their slice, and send
+    # back only the arrays of the successors that do not crash. The parent
+    # concatenates them in slice order, which gives exactly the arrays of a
+    # serial expansion, and then deduplicates and numbers the new states as
+    # ArrayTransitionSystem.buildLayers always does. The built arrays are
+    # therefore identical to an ArrayTransitionSystem's.
+    #
+    # Narrow frontiers, where shipping the arrays costs more than the
+    # expansion, are expanded in process, and the pool is only started at the
+    # first frontier wide enough to need it.
+
+    #
+    # @brief      Constructs the ParallelArrayTransitionSystem object.
+    #
+    # @param      self                 The ParallelArrayTransitionSystem
+    #                                  object instance
+    # @param      initCarX             The initial carX state. CarX ~ lane on
+    #                                  highway
+    # @param      initCarY             The initial carY state. CarY ~
+    #                                  distance down highway
+    # @param      initCarT             The initial carT state. CarT ~ time
+    #                                  step
+    # @param      initCarVel           The initial velocity of the car
+    # @param      maxTime              The maximum time step allowed
+    # @param      allLanes             A list of all possible lane numbers on
+    #                                  the highway.
+    # @param      allVelocities        A list of all possible car velocities
+    #                                  for ALL lanes
+    # @param      allowedLaneVels      The allowed lane velocities tuple for a
+    #                                  certain lane number
+    # @param      goalStates           The goal states for the car
+    # @param      POS                  The POS (physical occupancy set) object
+    # @param      numWorkers           The number of worker processes, None
+    #                                  for one per CPU. 1 builds serially.
+    # @param      minParallelFrontier  The number of frontier states below
+    #                                  which a layer is expanded in process
+    #
+    def __init__(self, initCarX, initCarY, initCarT, initCarVel,
+                 maxTime, allLanes, allVelocities, allowedLaneVels,
+                 goalStates, POS, numWorkers=None, minParallelFrontier=4096):
+
+        if numWorkers is None:
+            numWorkers = os.cpu_count() or 1
+
+        self.numWorkers = numWorkers
+        self.minParallelFrontier = minParallelFrontier
+        self.pool = None
+        self.shm = None
+
+        try:
+            ArrayTransitionSystem.ArrayTransitionSystem.__init__(
+                self, initCarX, initCarY, initCarT, initCarVel, maxTime,
+                allLanes, allVelocities, allowedLaneVels, goalStates, POS,
+                vectorized=True)
+        finally:
+            self.closePool()
+
+    #
+    # @brief      Forms the successors of one time layer's frontier that do not
+    #             crash, across the worker pool if the frontier is wide
+    #
+    # @param      self           The ParallelArrayTransitionSystem object
+    #                            instance
+    # @param      frontierX      The carX array of the frontier states
+    # @param      frontierY      The carY array of the frontier states
+    # @param      t              The time of the frontier
+    # @param      POS            The collision checker for the POS
+    # @param      velocities     The int64 array of all car velocities
+    # @param      minLaneSpeeds  The minimum legal speed of each lane
+    # @param      minLane        The lowest lane number
+    # @param      maxLane        The highest lane number
+    #
+    # @return     the (parent, nextX, nextY, prevLane, velIdx) arrays
+    #
+    def expandFrontier(self, frontierX, frontierY, t, POS, velocities,
+                       minLaneSpeeds, minLane, maxLane):
+
+        numFrontier = len(frontierX)
+        if self.numWorkers <= 1 or numFrontier < self.minParallelFrontier:
+            return ArrayTransitionSystem.expandFrontier(frontierX, frontierY,
+                                                        t, POS, velocities,
+                                                        minLaneSpeeds,
+                                                        minLane, maxLane)
+
+        if self.pool is None:
+            self.openPool(POS, (velocities, minLaneSpeeds, minLane, maxLane))
+
+        bounds = np.linspace(0, numFrontier, self.numWorkers + 1).astype(int)
+        tasks = [(frontierX[start:end], frontierY[start:end], t)
+                 for start, end in zip(bounds[:-1], bounds[1:])]
+
+        results = self.pool.map(expandChunk, tasks)
+
+        # the parents index into each slice, so offset them into the frontier
+        parents = [parent + start
+                   for (parent, _, _, _, _), start in zip(results, bounds)]
+
+        return tuple([np.concatenate(parents)] +
+                     [np.concatenate([result[ii] for result in results])
+                      for ii in range(1, 5)])
+
+    #
+    # @brief      Starts the worker pool, sharing the collision table with the
+    #             workers
+    #
+    # @param      self    The ParallelArrayTransitionSystem object instance
+    # @param      POS     The collision checker for the POS
+    # @param      tables  The (velocities, minLaneSpeeds, minLane, maxLane)
+    #                     tuple of expandFrontier arguments
+    #
+    def openPool(self, POS, tables):
+
+        if isinstance(POS, Collision.SweptCollisionTable):
+            cumOcc = POS.cumOcc
+            self.shm = shared_memory.SharedMemory(create=True,
+                                                  size=max(cumOcc.nbytes, 1))
+            sharedCumOcc = np.ndarray(cumOcc.shape, dtype=cumOcc.dtype,
+                                      buffer=self.shm.buf)
+            sharedCumOcc[...] = cumOcc
+
+            initArgs = (self.shm.name, cumOcc.shape, cumOcc.dtype.str, None,
+                        tables)
+        else:
+            initArgs = (None, None, None, POS, tables)
+
+        self.pool = Pool(self.numWorkers, initializer=initWorker,
+                         initargs=initArgs)
+
+    #
+    # @brief      Shuts the worker pool down and frees the shared memory
+    #
+    # @param      self  The ParallelArrayTransitionSystem object instance
+    #
+    def closePool(self):
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def main():
+
+    # a wide problem: many lanes and velocities give wide frontiers
+    numLanes = 8
+    allLanes = tuple(range(numLanes))
+    allVelocities = tuple(range(20, 52, 2))
+    allowedLaneVels = [tuple(vel for vel in allVelocities
+                             if 20 + 4 * lane <= vel <= 30 + 4 * lane)
+                       for lane in allLanes]
+    maxTime = 7
+    initCarX, initCarY = 0, 100
+    initCarVel = min(allowedLaneVels[initCarX])
+    maxDist = initCarY + max(allVelocities) * (maxTime + 1)
+    goalStates = [(0, maxDist)]
+
+    POSMat = POS.makePOS(allLanes, allowedLaneVels, maxDist, maxTime,
+                         initCarX, initCarY, seed=0)
+
+    args = (initCarX, initCarY, 0, initCarVel, maxTime, allLanes,
+            allVelocities, allowedLaneVels, goalStates, POSMat)
+
+    startTime = time.perf_counter()
+    serialTS = ParallelArrayTransitionSystem(*args, numWorkers=1)
+    serialSeconds = time.perf_counter() - startTime
+    print('serial:     %8.3f s, %d states' % (serialSeconds, len(serialTS)))
+
+    for numWorkers in [2, 4, 8, 16, 32]:
+        if numWorkers > (os.cpu_count() or 1):
+            break
+
+        startTime = time.perf_counter()
+        parallelTS = ParallelArrayTransitionSystem(*args,
+                                                   numWorkers=numWorkers)
+        seconds = time.perf_counter() - startTime
+
+        isSame = all(np.array_equal(getattr(serialTS, name),
+                                    getattr(parallelTS, name))
+                     for name in ('carX', 'carY', 'carT', 'prevLane',
+                                  'prevVel', 'obs', 'edgeOffsets',
+                                  'edgeTargets'))
+        print('%2d workers: %8.3f s, %.1fx speedup%s' %
+              (numWorkers, seconds, serialSeconds / seconds,
+               '' if isSame else ', DIFFERENT ARRAYS'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+from __future__ import print_function
+import initialize
+import POS
+import LazyTransitionSystem
+import LDBA
+import DFA
+import Node
+import time
+
+
+class RecedingHorizonController:
+    # @brief    Drives the car with a receding horizon: every control cycle
+    #           it takes one step along the current plan, slides the planning
+    #           window forward and plans again
+    #
+    # Everything is kept in absolute time. The traffic is an occupancy set
+    # over the whole run, so sliding the occupancy window forward is only a
+    # matter of indexing it at later times, and the planning window is
+    # [carT, DTS.maxTime] of a single LazyTransitionSystem. Advancing re-roots
+    # the searches at the next state of the plan and extending the horizon
+    # moves DTS.maxTime out by one layer, so every TS Node (and every crash
+    # check) built in earlier cycles is reused as is.
+    #
+    # An accepting plan stays optimal from any of its own states, because the
+    # suffix of a shortest path is a shortest path. So while the traffic does
+    # not change, the rest of the previous plan is reused as the new plan
+    # without any product search. If no accepting plan fits in the horizon,
+    # the car follows the safe path to the horizon that gets it closest to
+    # the goal.
+
+    #
+    # @brief      Constructs the RecedingHorizonController object.
+    #
+    # @param      self  The RecedingHorizonController object instance
+    # @param      DTS   The LazyTransitionSystem, with its maxTime set to the
+    #                   end of the first planning window
+    # @param      LDBA  The LDBA (LTL Deterministic Buchi Automata) encoding
+    #                   the LTL specification on DTS
+    #
+    def __init__(self, DTS, LDBA):
+
+        self.DTS = DTS
+        self.LDBA = LDBA
+
+        self.currTSNode = DTS.DFA.startNode
+        self.currQ = LDBA.DFA.startNode.state.q
+
+        # the current plan of product Nodes, starting at the current state
+        self.plan = None
+        self.planAccepts = False
+
+        self.trajectory = [self.makeProductNode(self.currTSNode, self.currQ,
+                                                None)]
+        self.cycleStats = []
+
+    #
+    # @brief      Determines if the car has satisfied the specification
+    #
+    # @param      self  The RecedingHorizonController object instance
+    #
+    # @return     True if the current automaton state accepts
+    #
+    def isDone(self):
+
+        return self.currQ in self.LDBA.DFA.accepts
+
+    #
+    # @brief      Runs the control loop
+    #
+    # @param      self       The RecedingHorizonController object instance
+    # @param      numCycles  The maximum number of control cycles to run
+    #
+    # @return     the list of per cycle stats dicts (see runCycle)
+    #
+    def run(self, numCycles):
+
+        self.runCycle(advance=False)
+
+        for _ in range(numCycles):
+            if self.isDone() or self.plan is None or len(self.plan) < 2:
+                break
+
+            self.runCycle(advance=True)
+
+        return self.cycleStats
+
+    #
+    # @brief      Runs one control cycle: advances along the plan, slides the
+    #             horizon out by one layer and plans again
+    #
+    # @param      self     The RecedingHorizonController object instance
+    # @param      advance  Whether to advance the car first, False for the
+    #                      very first plan
+    #
+    # @return     dict of the cycle stats: the cycle, carT, latency (seconds),
+    #             productExpanded, tsNodesBuilt, tsNodesReused (TS Nodes from
+    #             earlier cycles still in the planning window), reusedPlan,
+    #             planAccepts and planSteps
+    #
+    def runCycle(self, advance):
+
+        DTS = self.DTS
+        numNodesBefore = len(DTS.nodes)
+        startTime = time.perf_counter()
+
+        if advance:
+            self.advance()
+            DTS.extendHorizon()
+
+        reusedPlan = self.planAccepts
+        numExpanded = 0
+        if reusedPlan:
+            self.plan = self.plan[1:]
+        else:
+            numExpanded = self.replan()
+
+        latency = time.perf_counter() - startTime
+
+        carT = self.currTSNode.state.carT
+        numReused = sum(1 for node in DTS.nodes[:numNodesBefore]
+                        if node.state.carT >= carT)
+
+        stats = {'cycle': len(self.cycleStats),
+                 'carT': carT,
+                 'latency': latency,
+                 'productExpanded': numExpanded,
+                 'tsNodesBuilt': len(DTS.nodes) - numNodesBefore,
+                 'tsNodesReused': numReused,
+                 'reusedPlan': reusedPlan,
+                 'planAccepts': self.planAccepts,
+                 'planSteps': len(self.plan) - 1}
+        self.cycleStats.append(stats)
+
+        return stats
+
+    #
+    # @brief      Moves the car to the next state of the current plan
+    #
+    # @param      self  The RecedingHorizonController object instance
+    #
+    def advance(self):
+
+        nextProdNode = self.plan[1]
+        nextState = nextProdNode.state
+
+        self.currTSNode = self.DTS.stateIndex[self.DTS.getStateKey(nextState)]
+        self.currQ = nextState.q
+        self.trajectory.append(nextProdNode)
+
+    #
+    # @brief      Plans from the current state: the shortest accepting plan if
+    #             one fits in the horizon, otherwise a safe plan to the horizon
+    #
+    # @param      self  The RecedingHorizonController object instance
+    #
+    # @return     the number of product Nodes expanded
+    #
+    def replan(self):
+
+        (acceptingNode,
+         numExpanded) = DFA.formAndSolveProductAStar(self.DTS, self.LDBA,
+                                                     self.currTSNode,
+                                                     self.currQ)
+
+        if acceptingNode is not None:
+            self.plan = DFA.getPathToRootFromLeaf(acceptingNode,
+                                                  verbose=False)
+            self.planAccepts = True
+        else:
+            self.plan = self.findSafePath()
+            self.planAccepts = False
+
+        return numExpanded
+
+    #
+    # @brief      Finds a path to the horizon that never violates the
+    #             specification, ending at the state closest to the goal
+    #
+    #             The product is searched one time layer at a time, so the
+    #             last layer reached is the deepest one the car can safely
+    #             get to.
+    #
+    # @param      self  The RecedingHorizonController object instance
+    #
+    # @return     list of product Nodes from the current state, just the
+    #             current state if the car can not safely move at all
+    #
+    def findSafePath(self):
+
+        DTS = self.DTS
+        transFcn = self.LDBA.DFA.transFcn
+
+        startProdNode = self.makeProductNode(self.currTSNode, self.currQ,
+                                             None)
+        layer = {(self.currTSNode.index, self.currQ): (startProdNode,
+                                                       self.currTSNode)}
+
+        while True:
+
+            nextLayer = {}
+            for prevProdNode, prevTSNode in layer.values():
+                for currTSNode in DTS.successors(prevTSNode):
+
+                    qNew = transFcn(prevProdNode.state.q, currTSNode.obs)
+
+                    # anything Node after reaching the sink state will not
+                    # work
+                    if qNew == self.LDBA.sink:
+                        continue
+
+                    prodKey = (currTSNode.index, qNew)
+                    if prodKey not in nextLayer:
+                        nextLayer[prodKey] = (
+                            self.makeProductNode(currTSNode, qNew,
+                                                 prevProdNode),
+                            currTSNode)
+
+            if not nextLayer:
+                break
+            layer = nextLayer
+
+        def goalDistance(prodNode):
+            state = prodNode.state
+            return (DTS.timeToGoalLowerBound(state.carX, state.carY),
+                    -state.carY)
+
+        bestProdNode = min((prodNode for prodNode, _ in layer.values()),
+                           key=goalDistance)
+
+        return DFA.getPathToRootFromLeaf(bestProdNode, verbose=False)
+
+    #
+    # @brief      Makes a product Node for a TS Node in an automaton state
+    #
+    # @param      self    The RecedingHorizonController object instance
+    # @param      tsNode  The TS Node object
+    # @param      q       The automaton state
+    # @param      parent  The parent product Node, None for a root
+    #
+    # @return     the new product Node object
+    #
+    def makeProductNode(self, tsNode, q, parent):
+
+        state = tsNode.state
+        prodState = Node.NodeState(state.carX, state.carY, state.carT, q,
+                                   state.prevLane, state.prevVel)
+
+        return Node.Node(state=prodState, index=0, obs=tsNode.obs,
+                         adjList=[],
+                         isAccepting=(q in self.LDBA.DFA.accepts),
+                         isVisited=False, parent=parent)
+
+
+def main():
+
+    (allLanes, allVelocities,
+     allowedLaneVelocites, _,
+     horizon, _, initCarX,
+     initCarY, initCarT, initCarVel,
+     _) = initialize.getSimSettings()
+
+    # a goal well beyond the first planning window, and a control period
+    # budget to check each cycle against
+    goalStates = initialize.makeGoalStates(0, 1500, 1700)
+    numCycles = 60
+    controlPeriod = 0.1
+
+    # the traffic over the whole run, in absolute time
+    runTime = horizon + numCycles + 1
+    maxDist = initCarY + max(allVelocities) * (runTime + 1)
+    traffic = POS.makePOS(allLanes, allowedLaneVelocites, maxDist, runTime,
+                          initCarX, initCarY, representation='vehicles',
+                          seed=1)
+
+    DTS = LazyTransitionSystem.LazyTransitionSystem(initCarX, initCarY,
+                                                    initCarT, initCarVel,
+                                                    horizon, allLanes,
+                                                    allVelocities,
+                                                    allowedLaneVelocites,
+                                                    goalStates, traffic)
+    LDBAObj = LDBA.LDBA('G(!crashed & !speeding) & F(atGoal)')
+
+    controller = RecedingHorizonController(DTS, LDBAObj)
+    cycleStats = controller.run(numCycles)
+
+    print('%5s %5s %10s %9s %9s %9s %6s %6s %6s' %
+          ('cycle', 'carT', 'ms', 'expanded', 'built', 'reused', 'plan',
+           'goal', 'warm'))
+    for stats in cycleStats:
+        print('%5d %5d %10.2f %9d %9d %9d %6d %6s %6s' %
+              (stats['cycle'], stats['carT'], 1e3 * stats['latency'],
+               stats['productExpanded'], stats['tsNodesBuilt'],
+               stats['tsNodesReused'], stats['planSteps'],
+               'yes' if stats['planAccepts'] else 'no',
+               'yes' if stats['reusedPlan'] else 'no'))
+
+    latencies = [stats['latency'] for stats in cycleStats]
+    numOverruns = sum(1 for latency in latencies if latency > controlPeriod)
+    print('mean %.2f ms, max %.2f ms per cycle, %d of %d cycles over the '
+          '%.0f ms budget' %
+          (1e3 * sum(latencies) / len(latencies), 1e3 * max(latencies),
+           numOverruns, len(latencies), 1e3 * controlPeriod))
+
+    state = controller.trajectory[-1].state
+    print('reached the goal' if controller.isDone() else
+          'did not reach the goal', 'at lane', state.carX, 'distance',
+          state.carY, 'time', state.carT)
+
+
+if __name__ == "__main__":
+    main()
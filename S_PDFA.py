@@ -20,6 +20,9 @@ class S_PDFA:
 
         accepts = [2]
 
+        # the state every violation leads to, which can never accept
+        self.sink = 1
+
         startNode = node0
 
         Nodes = []
@@ -1,5 +1,8 @@
 import Node
 import DFA
+import Collision
+import GoalSet
+import Instrumentation
 from collections import deque
 
 
@@ -36,83 +39,434 @@ class TransitionSystem:
                  maxTime, allLanes, allVelocities, allowedLaneVels,
                  goalStates, POS):
 
+        initNode = self.initStateSpace(initCarX, initCarY, initCarVel,
+                                       maxTime, allLanes, allVelocities,
+                                       allowedLaneVels, goalStates, POS)
+
+        nodeQueue = deque()
+        nodeQueue.append(initNode)
+
+        while nodeQueue:
+
+            currNode = nodeQueue.popleft()
+
+            if (currNode.state.carT != maxTime):
+                nodeQueue.extend(self.expandNode(currNode))
+            else:
+                break
+
+        self.DFA = DFA.DFA(nodes=self.nodes, startNode=initNode)
+
+    #
+    # @brief      Stores the parameters of the transition system and makes its
+    #             initial Node, without expanding any transitions
+    #
+    # @param      self             The TransitionSystem object instance
+    # @param      initCarX         The initial carX state. CarX ~ lane on
+    #                              highway
+    # @param      initCarY         The initial carY state. CarY ~ distance down
+    #                              highway
+    # @param      initCarVel       The initial velocity of the car
+    # @param      maxTime          The maximum time step allowed
+    # @param      allLanes         A list of all possible lane numbers on the
+    #                              highway.
+    # @param      allVelocities    A list of all possible car velocities for
+    #                              ALL lanes
+    # @param      allowedLaneVels  The allowed lane velocities tuple for a
+    #                              certain lane number
+    # @param      goalStates       The goal states for the car
+    # @param      POS              The POS (physical occupancy set) object
+    #
+    # @return     the initial Node object
+    #
+    def initStateSpace(self, initCarX, initCarY, initCarVel, maxTime,
+                       allLanes, allVelocities, allowedLaneVels, goalStates,
+                       POS):
+
+        self.maxTime = maxTime
+        self.allLanes = allLanes
+        self.allVelocities = allVelocities
+        self.allowedLaneVels = allowedLaneVels
+        self.goalStates = GoalSet.getGoalSet(goalStates)
+
+        # all of the crash checks go through a precomputed collision table
+        self.POS = Collision.getCollisionChecker(POS)
+
         newNodeState = Node.NodeState(initCarX, initCarY, carT=0,
                                       prevLane=initCarX, prevVel=initCarVel)
 
         newNodeObs = Node.Observation(atGoal=False, crashed=False,
                                       speeding=False)
 
-        initNode = Node.Node(state=newNodeState, obs=newNodeObs,
-                             isVisited=False)
-        Nodes = []
-        Nodes.append(initNode)
+        initNode = Node.Node(state=newNodeState, index=0, obs=newNodeObs,
+                             adjList=[], isVisited=False)
+        self.nodes = []
+        self.nodes.append(initNode)
 
-        nodeQueue = deque()
-        nodeQueue.append(initNode)
-        atGoal = False
+        # every distinct state is only ever built once. The index maps a
+        # state's (carX, carY, carT, prevLane, prevVel) key to its Node, so
+        # that all transitions reaching an existing state share that Node and
+        # the transition system is a DAG instead of an unrolled tree
+        self.stateIndex = {}
+        self.stateIndex[self.getStateKey(newNodeState)] = initNode
 
-        while True:
+        # indices of the Nodes that updateOccupancy found to crash. They stay
+        # in nodes as tombstones so that the other Nodes keep their indices
+        self.crashedNodeIndices = set()
 
-            currNode = nodeQueue.popleft()
-            allowedLanes = self.getAdjLanes(currNode.state.carX, allLanes)
+        return initNode
 
-            if (currNode.state.carT != maxTime):
-                for lane in allowedLanes:
-                    for vel in allVelocities:
-
-                        # populate a new node at this state
-                        currState = currNode.state
-                        carX = lane
-                        carY = currState.carY + vel
-                        carT = currState.carT + 1
-                        prevLane = currState.carX
-                        prevVel = vel
-
-                        nextState = Node.NodeState(carX=carX,
-                                                   carY=carY,
-                                                   carT=carT,
-                                                   prevLane=prevLane,
-                                                   prevVel=prevVel)
-
-                        nextNode = Node.Node(state=nextState,
-                                             isVisited=False,
-                                             adjList=[])
-
-                        allowedVelsPrevLane = allowedLaneVels[prevLane]
-                        allowedVelsCarXLane = allowedLaneVels[carX]
-
-                        # determining if there is crashing
-                        minSpeedInPrevLane = min(allowedVelsPrevLane)
-                        minSpeedInCarXLane = min(allowedVelsCarXLane)
-
-                        crashed = self.crashed(prevLane, prevVel, carX, carY,
-                                               carT, minSpeedInPrevLane,
-                                               minSpeedInCarXLane, POS)
-                        if not crashed:
-
-                            # determining if there is speeding
-                            speeding = self.speeding(prevLane, prevVel, carX,
-                                                     allowedVelsPrevLane,
-                                                     allowedVelsCarXLane)
-
-                            # determining if the new state is in the goal state
-                            atGoal = self.inGoalStates(carX, carY, goalStates)
-
-                            # adding these observations to the new node
-                            obs = Node.Observation(atGoal=atGoal,
-                                                   crashed=crashed,
-                                                   speeding=speeding)
-                            nextNode.obs = obs
-
-                            # need to add nextNode to the adj list of the node
-                            # that reached nextNode (currNode), then get ready
-                            # to build up nextNode
-                            currNode.adjList.append(nextNode)
-                            nodeQueue.append(nextNode)
+    #
+    # @brief      Builds all of the transitions out of a Node
+    #
+    #             Every lane change and velocity choice is tried, and each
+    #             successor state that does not crash is linked into the
+    #             Node's adjList, reusing the Node of any state that was
+    #             already built.
+    #
+    # @param      self      The TransitionSystem object instance
+    # @param      currNode  The Node object to expand
+    #
+    # @return     a list of the Node objects that were newly built
+    #
+    def expandNode(self, currNode):
+
+        allowedLaneVels = self.allowedLaneVels
+        POS = self.POS
+        newNodes = []
+
+        # every new state key is collision checked exactly once
+        numKeysBefore = len(self.stateIndex)
+
+        allowedLanes = self.getAdjLanes(currNode.state.carX, self.allLanes)
+
+        for lane in allowedLanes:
+            for vel in self.allVelocities:
+
+                # populate a new node at this state
+                currState = currNode.state
+                carX = lane
+                carY = currState.carY + vel
+                carT = currState.carT + 1
+                prevLane = currState.carX
+                prevVel = vel
+
+                # the observations are a function of the state alone, so an
+                # already built state can be linked directly. Crashed states
+                # are indexed as None so they are only ever collision checked
+                # once
+                stateKey = (carX, carY, carT, prevLane, prevVel)
+                if stateKey in self.stateIndex:
+                    nextNode = self.stateIndex[stateKey]
+                    if nextNode is not None:
+                        currNode.adjList.append(nextNode)
+                    continue
+
+                allowedVelsPrevLane = allowedLaneVels[prevLane]
+                allowedVelsCarXLane = allowedLaneVels[carX]
+
+                # determining if there is crashing
+                minSpeedInPrevLane = min(allowedVelsPrevLane)
+                minSpeedInCarXLane = min(allowedVelsCarXLane)
+
+                crashed = self.crashed(prevLane, prevVel, carX, carY,
+                                       carT, minSpeedInPrevLane,
+                                       minSpeedInCarXLane, POS)
+                if crashed:
+                    self.stateIndex[stateKey] = None
+                    continue
+
+                nextNode = self.buildNode(stateKey)
+
+                # need to add nextNode to the adj list of the node that
+                # reached nextNode (currNode), then get ready to build up
+                # nextNode
+                currNode.adjList.append(nextNode)
+                newNodes.append(nextNode)
+
+        stats = Instrumentation.active
+        if stats is not None:
+            numChecked = len(self.stateIndex) - numKeysBefore
+            stats.add('statesCreated', len(newNodes))
+            stats.add('edgesCrashChecked', numChecked)
+            stats.add('crashHits', numChecked - len(newNodes))
+
+        return newNodes
+
+    #
+    # @brief      Builds the Node of a state that does not crash, with its
+    #             observations, and indexes it
+    #
+    # @param      self      The TransitionSystem object instance
+    # @param      stateKey  The (carX, carY, carT, prevLane, prevVel) key of
+    #                       the state
+    #
+    # @return     the new Node object
+    #
+    def buildNode(self, stateKey):
+
+        carX, carY, carT, prevLane, prevVel = stateKey
+
+        # determining if there is speeding
+        speeding = self.speeding(prevLane, prevVel, carX,
+                                 self.allowedLaneVels[prevLane],
+                                 self.allowedLaneVels[carX])
+
+        # determining if the new state is in the goal state
+        atGoal = self.inGoalStates(carX, carY, self.goalStates)
+
+        # adding these observations to the new node
+        obs = Node.Observation(atGoal=atGoal,
+                               crashed=False,
+                               speeding=speeding)
 
+        nextState = Node.NodeState(carX=carX,
+                                   carY=carY,
+                                   carT=carT,
+                                   prevLane=prevLane,
+                                   prevVel=prevVel)
+
+        nextNode = Node.Node(state=nextState,
+                             index=len(self.nodes),
+                             obs=obs,
+                             isVisited=False,
+                             adjList=[])
+
+        self.stateIndex[stateKey] = nextNode
+        self.nodes.append(nextNode)
+
+        return nextNode
+
+    #
+    # @brief      Updates the transition system for a batch of changed POS
+    #             cells, without rebuilding it
+    #
+    #             Whether a state crashes only depends on its own state key
+    #             (its sweep starts at carY - prevVel in lanes prevLane and
+    #             carX at carT - 1), so a changed cell can only flip the
+    #             states whose sweep covers it. Only those states are checked
+    #             again: newly crashed states are unlinked from their parents,
+    #             and newly free states are built and linked in. States that
+    #             were never built are checked when they are.
+    #
+    #             The Node of a newly crashed state is left in nodes (and
+    #             DFA.nodes) as a tombstone, so no other Node's index changes:
+    #             it observes crashed, has no successors and is not counted by
+    #             len(). If its state is freed again, a new Node is built.
+    #
+    # @param      self          The TransitionSystem object instance
+    # @param      changedCells  An iterable of (lane, y, t, isOccupied) POS
+    #                           cells. The TransitionSystem has to have been
+    #                           built over a dense POS matrix.
+    #
+    # @return     list of the Node objects whose successors changed
+    #
+    def updateOccupancy(self, changedCells):
+
+        POS = self.POS
+        if not hasattr(POS, 'setOccupied'):
+            raise TypeError('the occupancy of a %s can not be updated, build '
+                            'the transition system over a dense POS matrix'
+                            % type(POS).__name__)
+
+        changedKeys = set()
+        for lane, y, t, isOccupied in changedCells:
+            if POS.setOccupied(lane, y, t, isOccupied):
+                changedKeys.update(self.getSweepingStateKeys(lane, y, t))
+
+        changedParents = {}
+        newNodes = []
+        newNodeIndices = set()
+        numChecked = 0
+        numCrashed = 0
+
+        for stateKey in changedKeys:
+
+            if stateKey not in self.stateIndex:
+                continue
+
+            carX, carY, carT, prevLane, prevVel = stateKey
+            crashed = self.crashed(prevLane, prevVel, carX, carY, carT,
+                                   min(self.allowedLaneVels[prevLane]),
+                                   min(self.allowedLaneVels[carX]), POS)
+            numChecked += 1
+            numCrashed += bool(crashed)
+
+            node = self.stateIndex[stateKey]
+            if crashed == (node is None):
+                continue
+
+            # the Nodes built earlier in this batch are not expanded until
+            # expandNewNodes, which links them to their successors as they
+            # are after the whole batch
+            parents = [parent for parent in self.getExpandedParents(stateKey)
+                       if parent.index not in newNodeIndices]
+            if crashed:
+                self.stateIndex[stateKey] = None
+                for parent in parents:
+                    parent.adjList.remove(node)
+                self.retireNode(node)
             else:
-                self.DFA = DFA.DFA(nodes=Nodes, startNode=initNode)
-                return
+                node = self.buildNode(stateKey)
+                newNodes.append(node)
+                newNodeIndices.add(node.index)
+                for parent in parents:
+                    parent.adjList.append(node)
+
+            for parent in parents:
+                changedParents[parent.index] = parent
+
+        stats = Instrumentation.active
+        if stats is not None:
+            stats.add('statesCreated', len(newNodes))
+            stats.add('edgesCrashChecked', numChecked)
+            stats.add('crashHits', numCrashed)
+
+        self.expandNewNodes(newNodes)
+
+        return list(changedParents.values())
+
+    #
+    # @brief      Turns the Node of a state that now crashes into a tombstone
+    #
+    # @param      self  The TransitionSystem object instance
+    # @param      node  The Node object, already unlinked from its parents
+    #
+    def retireNode(self, node):
+
+        obs = node.obs
+        node.obs = Node.Observation(atGoal=obs.atGoal, crashed=True,
+                                    speeding=obs.speeding)
+        node.adjList = []
+        self.crashedNodeIndices.add(node.index)
+
+    #
+    # @brief      The number of states in the transition system, not counting
+    #             the tombstones of states updateOccupancy found to crash
+    #
+    # @param      self  The TransitionSystem object instance
+    #
+    def __len__(self):
+
+        return len(self.nodes) - len(self.crashedNodeIndices)
+
+    #
+    # @brief      Gets the keys of every state whose swept collision check
+    #             covers a POS cell
+    #
+    # @param      self  The TransitionSystem object instance
+    # @param      lane  The lane (x) of the cell
+    # @param      y     The distance (y) of the cell
+    # @param      t     The time of the cell
+    #
+    # @return     generator of the (carX, carY, carT, prevLane, prevVel) keys
+    #
+    def getSweepingStateKeys(self, lane, y, t):
+
+        minSpeedInLane = min(self.allowedLaneVels[lane])
+
+        for prevLane in self.allLanes:
+            if abs(prevLane - lane) > 1:
+                continue
+
+            for carX in self.getAdjLanes(prevLane, self.allLanes):
+                if lane != prevLane and lane != carX:
+                    continue
+
+                # the lane is swept over [prevY, prevY + window)
+                for vel in self.allVelocities:
+                    window = vel - minSpeedInLane
+                    for prevY in range(y - window + 1, y + 1):
+                        yield (carX, prevY + vel, t + 1, prevLane, vel)
+
+    #
+    # @brief      Gets the already expanded Nodes that have a state as one of
+    #             their successors
+    #
+    # @param      self      The TransitionSystem object instance
+    # @param      stateKey  The (carX, carY, carT, prevLane, prevVel) key of
+    #                       the state
+    #
+    # @return     list of the parent Node objects
+    #
+    def getExpandedParents(self, stateKey):
+
+        carX, carY, carT, prevLane, prevVel = stateKey
+        parentY = carY - prevVel
+        parentT = carT - 1
+
+        parents = [self.stateIndex.get((prevLane, parentY, parentT,
+                                        parentPrevLane, parentPrevVel))
+                   for parentPrevLane in self.allLanes
+                   for parentPrevVel in self.allVelocities]
+
+        # the initial state's previous velocity need not be one of the
+        # velocities
+        initNode = self.nodes[0]
+        if self.getStateKey(initNode.state)[:3] == \
+                (prevLane, parentY, parentT) and initNode not in parents:
+            parents.append(initNode)
+
+        return [parent for parent in parents
+                if parent is not None and self.isExpanded(parent)]
+
+    #
+    # @brief      Determines if the transitions out of a Node have been built
+    #
+    # @param      self  The TransitionSystem object instance
+    # @param      node  The Node object
+    #
+    # @return     True if expanded, False otherwise.
+    #
+    def isExpanded(self, node):
+
+        return node.state.carT < self.maxTime
+
+    #
+    # @brief      Builds the transitions out of Nodes that were added by
+    #             updateOccupancy, and out of every new Node they reach, up to
+    #             the time horizon
+    #
+    # @param      self      The TransitionSystem object instance
+    # @param      newNodes  The list of new Node objects
+    #
+    def expandNewNodes(self, newNodes):
+
+        nodeQueue = deque(newNodes)
+        while nodeQueue:
+            currNode = nodeQueue.popleft()
+            if currNode.state.carT < self.maxTime:
+                nodeQueue.extend(self.expandNode(currNode))
+
+    #
+    # @brief      Gets the successors of a Node in the transition system
+    #
+    #             This is how graph searches over the transition system (e.g.
+    #             DFA.formAndSolveProduct) should walk it, as it lets
+    #             subclasses like LazyTransitionSystem build the transitions
+    #             on demand.
+    #
+    # @param      self  The TransitionSystem object instance
+    # @param      node  The Node object
+    #
+    # @return     the list of successor Node objects
+    #
+    def successors(self, node):
+
+        return node.adjList
+
+    #
+    # @brief      Returns the key a NodeState is indexed by in stateIndex
+    #
+    # @param      self   The TransitionSystem object instance
+    # @param      state  The NodeState object
+    #
+    # @return     The (carX, carY, carT, prevLane, prevVel) tuple of state
+    #
+    def getStateKey(self, state):
+
+        return (state.carX, state.carY, state.carT,
+                state.prevLane, state.prevVel)
 
     #
     # @brief      Calculates a boolean for whether the car is speeding
@@ -157,19 +511,36 @@ class TransitionSystem:
     # @param      self        The TransitionSystem object instance
     # @param      carX        The current carX value ~ lane on highway
     # @param      carY        The current carY value ~ distance down highway
-    # @param      goalStates  The set of goal states in x and y
+    # @param      goalStates  The GoalSet of goal regions (or a legacy list of
+    #                         goal states, see GoalSet.getGoalSet)
     #
     # @return     @bool indicating whether or not the car is in one of the set
     #             of goalStates during current time step
     #
     def inGoalStates(self, carX, carY, goalStates):
 
-        minYGoalState = goalStates[0][1]
-        xGoalState = goalStates[0][0]
-        if (carX == xGoalState) and (carY > minYGoalState):
-            return True
-        else:
-            return False
+        return GoalSet.getGoalSet(goalStates).contains(carX, carY)
+
+    #
+    # @brief      Calculates a lower bound on the number of time steps the car
+    #             needs to get from a state into the goal states
+    #
+    #             The car has to cover the distance left to a goal region
+    #             with at most max(allVelocities) per time step, and can change
+    #             at most one lane per time step, so the larger of the two step
+    #             counts (for the nearest region) is an admissible (and
+    #             consistent) bound.
+    #
+    # @param      self  The TransitionSystem object instance
+    # @param      carX  The current carX value ~ lane on highway
+    # @param      carY  The current carY value ~ distance down highway
+    #
+    # @return     the lower bound on the time steps to the goal states
+    #
+    def timeToGoalLowerBound(self, carX, carY):
+
+        return self.goalStates.getStepsLowerBound(carX, carY,
+                                                  max(self.allVelocities))
 
     #
     # @brief      Calculates a boolean for whether the car has crashed into
@@ -191,10 +562,9 @@ class TransitionSystem:
     # @param      minSpeedInPrevLane  The minimum legal speed in the previous
     #                                 lane
     # @param      minSpeedInCarXLane  The minimum legal speed in the carX lane
-    # @param      POS                 The POS (physical occupancy set) object
-    #                                 which contains the 3D projection of a
-    #                                 Node state onto the x, y, and time grid
-    #                                 for the empty road.
+    # @param      POS                 The collision checker for the POS
+    #                                 (physical occupancy set), as returned by
+    #                                 Collision.getCollisionChecker
     #
     # @return     @bool indicating whether or not the car will crash into
     #             another driver during the previous -> current time step if
@@ -203,29 +573,11 @@ class TransitionSystem:
     def crashed(self, prevLane, prevVel, carX, carY, carT,
                 minSpeedInPrevLane, minSpeedInCarXLane, POS):
 
-        # time steps are unit length for simplification
-        timeStepLength = 1
-        prevY = carY - prevVel * (timeStepLength)
-        prevT = carT - timeStepLength
-
         # POS[x, y, t] = True (1) if another car is at the specific (x,y)
-        # location of the road at time t
-        distDownTheHwy = prevVel - minSpeedInPrevLane
-        sumPrevLane = 0
-        for ii in range(0, distDownTheHwy):
-            sumPrevLane += POS[prevLane, prevY + ii, prevT]
-
-        distDownTheHwy = prevVel - minSpeedInCarXLane
-        sumCarXLane = 0
-        for ii in range(0, distDownTheHwy):
-            sumCarXLane += POS[carX, prevY + ii, prevT]
-
-        numCollisions = sumPrevLane + sumCarXLane
-
-        if numCollisions > 0:
-            return True
-        else:
-            return False
+        # location of the road at time t. Instead of summing the swept cells
+        # of POS one by one, the checker answers each lane's sweep in O(1)
+        return Collision.crashed(POS, prevLane, prevVel, carX, carY, carT,
+                                 minSpeedInPrevLane, minSpeedInCarXLane)
 
     #
     # @brief      Returns a tuple of physically possible lanes to change to
@@ -0,0 +1,538 @@
+from __future__ import print_function
+import matplotlib
+matplotlib.use('Agg')
+import initialize
+import POS
+import TransitionSystem
+import LDBA
+import DFA
+import graph
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+import numpy as np
+
+
+# the simulation parameters of the base benchmark point, and the values each
+# one is swept over (one parameter at a time, the rest at the base point)
+BASE_POINT = {'numLanes': 3, 'numVels': 4, 'maxTime': 6, 'maxDist': 400}
+SWEEPS = {'maxTime': [4, 5, 6, 7, 8],
+          'maxDist': [400, 800, 1600, 3200],
+          'numLanes': [2, 3, 4, 6],
+          'numVels': [2, 4, 6, 8]}
+QUICK_SWEEPS = {'maxTime': [4, 6],
+                'maxDist': [400, 1600],
+                'numLanes': [2, 4],
+                'numVels': [2, 6]}
+GRAPH_SIZES = [50, 100, 200]
+QUICK_GRAPH_SIZES = [50]
+
+STAGES = ['makePOS', 'TransitionSystem', 'crashed', 'formAndSolveProduct',
+          'findPathToGoal', 'plotCarAndPOS']
+
+# every benchmark draws its traffic and queries from this seed
+SEED = 1
+
+
+##
+# @brief      Makes a grid graph like a road network, with random edge weights
+#             of at least the distance between the (unit spaced) grid nodes
+#
+# @param      gridSize  The number of nodes along each side of the grid
+# @param      rng       The numpy random Generator
+#
+# @return     the graph.Graph, with a 'pos' on every node
+#
+def makeGridGraph(gridSize, rng):
+
+    nodes = [((x, y), {'pos': (x, y), 'heuristicDist': 0.0})
+             for x in range(gridSize) for y in range(gridSize)]
+
+    edges = []
+    for x in range(gridSize):
+        for y in range(gridSize):
+            if x + 1 < gridSize:
+                edges.append(((x, y), (x + 1, y)))
+            if y + 1 < gridSize:
+                edges.append(((x, y), (x, y + 1)))
+
+    weights = 1.0 + rng.random(len(edges))
+    edges = [(source, dest, {'weight': weight})
+             for (source, dest), weight in zip(edges, weights)]
+
+    return graph.Graph(nodes, edges)
+
+
+##
+# @brief      The straight line distance between two grid graph nodes, a
+#             consistent lower bound on their distance in the graph
+#
+# @param      source  The source node label
+# @param      dest    The destination node label
+#
+# @return     the euclidean distance between the nodes
+#
+def euclideanHeuristic(source, dest):
+
+    return np.hypot(source[0] - dest[0], source[1] - dest[1])
+
+
+##
+# @brief      Times every Graph.findPathToGoal method on the same random
+#             queries, and checks they all find equally short paths
+#
+# @param      G           The graph.Graph to query
+# @param      queries     The list of (start, goal) node label tuples
+# @param      methods     The list of method strings to time
+# @param      heuristic   The heuristic function for the methods using one
+#
+# @return     dict of method string to (mean seconds per query, mean number
+#             of iterations per query)
+#
+def benchmarkPathMethods(G, queries, methods, heuristic):
+
+    results = {}
+    lengths = {}
+
+    for method in methods:
+
+        seconds = 0.0
+        numIter = 0
+        lengths[method] = []
+
+        for start, goal in queries:
+
+            # the forward A star reads its heuristic off of the nodes
+            if method == 'A star':
+                for node in G.nodes:
+                    G.nodes[node]['heuristicDist'] = heuristic(node, goal)
+
+            startTime = time.perf_counter()
+            _, pathLength, queryIter = G.findPathToGoal(start, goal, method,
+                                                        heuristic=heuristic)
+            seconds += time.perf_counter() - startTime
+
+            numIter += queryIter
+            lengths[method].append(pathLength)
+
+        results[method] = (seconds / len(queries), numIter / len(queries))
+
+    referenceLengths = lengths[methods[0]]
+    for method in methods[1:]:
+        if not np.allclose(lengths[method], referenceLengths):
+            raise AssertionError('%s found different path lengths than %s'
+                                 % (method, methods[0]))
+
+    return results
+
+
+##
+# @brief      Prints the time and iterations of every Graph.findPathToGoal
+#             method on grid graphs of increasing size
+#
+# @param      quick  Whether to only use the QUICK_GRAPH_SIZES grids
+#
+def compareGraphMethods(quick=False):
+
+    rng = np.random.default_rng(SEED)
+    methods = ['Dijkstra', 'A star', 'bidirectional Dijkstra',
+               'bidirectional A star', 'ALT']
+    numQueries = 20
+
+    graphSizes = QUICK_GRAPH_SIZES if quick else GRAPH_SIZES
+    for gridSize in graphSizes:
+
+        G = makeGridGraph(gridSize, rng)
+        corners = rng.integers(0, gridSize, size=(numQueries, 4))
+        queries = [((x0, y0), (x1, y1)) for x0, y0, x1, y1 in corners
+                   if (x0, y0) != (x1, y1)]
+
+        startTime = time.perf_counter()
+        G.buildLandmarks()
+        landmarkSeconds = time.perf_counter() - startTime
+
+        results = benchmarkPathMethods(G, queries, methods,
+                                       euclideanHeuristic)
+
+        startTime = time.perf_counter()
+        compiledG = G.compile()
+        compileSeconds = time.perf_counter() - startTime
+
+        startTime = time.perf_counter()
+        for start, goal in queries:
+            compiledG.findPathToGoal(start, goal, 'Dijkstra')
+        compiledSeconds = (time.perf_counter() - startTime) / len(queries)
+
+        print('%d x %d grid, %d edges, %d queries:' %
+              (gridSize, gridSize, G.number_of_edges(), len(queries)))
+        for method in methods:
+            seconds, numIter = results[method]
+            print('    %-24s %9.2f ms/query %10.0f dequeues/query' %
+                  (method, 1e3 * seconds, numIter))
+        print('    %-24s %9.2f ms/query (%.2f ms to compile)' %
+              ('compiled Dijkstra', 1e3 * compiledSeconds,
+               1e3 * compileSeconds))
+        print('    %-24s %9.2f ms for %d landmarks' %
+              ('ALT preprocessing', 1e3 * landmarkSeconds,
+               len(G.landmarks)))
+
+
+##
+# @brief      Makes the simulation settings of one benchmark point
+#
+#             The velocities are 20, 25, 30, ... and every lane allows two
+#             consecutive ones, faster lanes allowing faster ones. The goal
+#             region and the car's initial state are those of
+#             initialize.getSimSettings, and the road is made long enough for
+#             the car to stay on it up to maxTime.
+#
+# @param      numLanes  The number of lanes
+# @param      numVels   The number of car velocities
+# @param      maxTime   The time horizon
+# @param      maxDist   The length of the road
+#
+# @return     the settings tuple, in the order of initialize.getSimSettings
+#             minus the save path
+#
+def makeSimSettings(numLanes, numVels, maxTime, maxDist):
+
+    (_, _, _, _, _, goalStates, initCarX, initCarY, initCarT, _,
+     _) = initialize.getSimSettings()
+
+    allLanes = tuple(range(numLanes))
+    allVelocities = tuple(20 + 5 * ii for ii in range(numVels))
+
+    allowedLaneVelocites = []
+    for lane in allLanes:
+        first = int(round(lane * max(numVels - 2, 0) /
+                          max(numLanes - 1, 1)))
+        allowedLaneVelocites.append(allVelocities[first:first + 2])
+
+    maxDist = max(maxDist, initCarY + max(allVelocities) * (maxTime + 1))
+    initCarVel = min(allowedLaneVelocites[initCarX])
+
+    return (allLanes, allVelocities, allowedLaneVelocites, maxDist, maxTime,
+            goalStates, initCarX, initCarY, initCarT, initCarVel)
+
+
+##
+# @brief      Times a function and measures its peak traced memory
+#
+#             Like timeit, fast functions are called in a loop long enough to
+#             take at least minSeconds, so their times are not lost in the
+#             timer and scheduler noise. The timing runs are separate from the
+#             (slower) tracemalloc run, so tracing does not skew the times.
+#
+# @param      fcn         The function to measure, returning a dict of extra
+#                         results to record
+# @param      repeats     The number of timing runs, the fastest one is kept
+# @param      minSeconds  The minimum length of each timing run
+#
+# @return     (the fastest time of one call in seconds, the peak traced
+#             bytes, the extra results dict of the last call)
+#
+def measure(fcn, repeats, minSeconds=0.2):
+
+    startTime = time.perf_counter()
+    extra = fcn()
+    seconds = time.perf_counter() - startTime
+    numCalls = max(1, int(np.ceil(minSeconds / max(seconds, 1e-9))))
+
+    # a first call slower than minSeconds already counts as a timing run
+    numRuns = repeats - 1 if numCalls == 1 else repeats
+    for _ in range(numRuns):
+        startTime = time.perf_counter()
+        for _ in range(numCalls):
+            extra = fcn()
+        seconds = min(seconds,
+                      (time.perf_counter() - startTime) / numCalls)
+
+    tracemalloc.start()
+    try:
+        fcn()
+        _, peakBytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return (seconds, peakBytes, extra)
+
+
+##
+# @brief      Measures the synthesis stages at one benchmark point
+#
+# @param      point    The dict of numLanes, numVels, maxTime and maxDist
+# @param      stages   The list of stage names to measure
+# @param      repeats  The number of timing runs per stage
+# @param      LDBAObj  The LDBA to form the product with
+# @param      plotDir  The directory to write the plots to
+#
+# @return     list of result dicts with the stage, params, seconds, peakBytes
+#             and extra keys
+#
+def benchmarkStages(point, stages, repeats, LDBAObj, plotDir):
+
+    (allLanes, allVelocities, allowedLaneVelocites, maxDist, maxTime,
+     goalStates, initCarX, initCarY, initCarT,
+     initCarVel) = makeSimSettings(**point)
+
+    def makePOS():
+        POS.makePOS(allLanes, allowedLaneVelocites, maxDist, maxTime,
+                    initCarX, initCarY, seed=SEED)
+        return {}
+
+    POSMat = POS.makePOS(allLanes, allowedLaneVelocites, maxDist, maxTime,
+                         initCarX, initCarY, seed=SEED)
+
+    def buildTS():
+        DTS = TransitionSystem.TransitionSystem(initCarX, initCarY, initCarT,
+                                                initCarVel, maxTime,
+                                                allLanes, allVelocities,
+                                                allowedLaneVelocites,
+                                                goalStates, POSMat)
+        return {'tsStates': len(DTS.nodes)}
+
+    DTS = TransitionSystem.TransitionSystem(initCarX, initCarY, initCarT,
+                                            initCarVel, maxTime, allLanes,
+                                            allVelocities,
+                                            allowedLaneVelocites, goalStates,
+                                            POSMat)
+
+    # every transition the build crash checked, crashed or not
+    crashChecks = [(prevLane, prevVel, carX, carY, carT,
+                    min(allowedLaneVelocites[prevLane]),
+                    min(allowedLaneVelocites[carX]))
+                   for carX, carY, carT, prevLane, prevVel in DTS.stateIndex
+                   if carT > 0]
+
+    def checkCrashes():
+        for crashCheck in crashChecks:
+            DTS.crashed(*(crashCheck + (DTS.POS,)))
+        return {'numCalls': len(crashChecks)}
+
+    def solveProduct():
+        acceptingNode = DFA.formAndSolveProduct(DTS=DTS, LDBA=LDBAObj)
+        return {'feasible': acceptingNode is not None}
+
+    acceptingNode = DFA.formAndSolveProduct(DTS=DTS, LDBA=LDBAObj)
+
+    def plot():
+        optimalPath = DFA.getPathToRootFromLeaf(acceptingNode, verbose=False)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            POS.plotCarAndPOS(POSMat, optimalPath,
+                              os.path.join(plotDir, 'results.pdf'), initCarY,
+                              allLanes, goalStates, maxTime)
+        matplotlib.pyplot.close('all')
+        return {}
+
+    stageFcns = {'makePOS': makePOS,
+                 'TransitionSystem': buildTS,
+                 'crashed': checkCrashes,
+                 'formAndSolveProduct': solveProduct,
+                 'plotCarAndPOS': plot}
+
+    results = []
+    for stage in stages:
+
+        # the plot has one subplot per time step on a 3 x 2 grid, and needs
+        # a path to plot
+        if stage not in stageFcns or (stage == 'plotCarAndPOS' and
+                                      (maxTime > 6 or acceptingNode is None)):
+            continue
+
+        # the plot is written at 500 dpi, once is plenty
+        stageRepeats = 1 if stage == 'plotCarAndPOS' else repeats
+        seconds, peakBytes, extra = measure(stageFcns[stage], stageRepeats)
+
+        results.append({'stage': stage, 'params': dict(point),
+                        'seconds': seconds, 'peakBytes': peakBytes,
+                        'extra': extra})
+
+    return results
+
+
+##
+# @brief      Measures Graph.findPathToGoal (Dijkstra) on a random grid graph
+#
+# @param      gridSize  The number of nodes along each side of the grid
+# @param      repeats   The number of timing runs
+#
+# @return     the result dict, with the seconds per query
+#
+def benchmarkGraph(gridSize, repeats):
+
+    rng = np.random.default_rng(SEED)
+    G = makeGridGraph(gridSize, rng)
+
+    numQueries = 10
+    corners = rng.integers(0, gridSize, size=(numQueries, 4))
+    queries = [((x0, y0), (x1, y1)) for x0, y0, x1, y1 in corners
+               if (x0, y0) != (x1, y1)]
+
+    def findPaths():
+        numIter = 0
+        for start, goal in queries:
+            numIter += G.findPathToGoal(start, goal, 'Dijkstra')[2]
+        return {'numQueries': len(queries), 'dequeues': numIter}
+
+    seconds, peakBytes, extra = measure(findPaths, repeats)
+
+    return {'stage': 'findPathToGoal', 'params': {'gridSize': gridSize},
+            'seconds': seconds / len(queries), 'peakBytes': peakBytes,
+            'extra': extra}
+
+
+##
+# @brief      Runs the whole benchmark suite
+#
+# @param      stages   The list of stage names to measure
+# @param      quick    Whether to run the smaller sweeps
+# @param      repeats  The number of timing runs per measurement
+#
+# @return     the results document dict, with the machine info and the
+#             list of result dicts
+#
+def runSuite(stages, quick, repeats):
+
+    sweeps = QUICK_SWEEPS if quick else SWEEPS
+    graphSizes = QUICK_GRAPH_SIZES if quick else GRAPH_SIZES
+
+    # every distinct point of the one-at-a-time sweeps, in sweep order
+    points = []
+    for name, values in sweeps.items():
+        for value in values:
+            point = dict(BASE_POINT, **{name: value})
+            if point not in points:
+                points.append(point)
+
+    LDBAObj = LDBA.LDBA('G(!crashed & !speeding) & F(atGoal)')
+
+    results = []
+    with tempfile.TemporaryDirectory() as plotDir:
+        for point in points:
+            results.extend(benchmarkStages(point, stages, repeats, LDBAObj,
+                                           plotDir))
+            print('measured', point)
+
+    if 'findPathToGoal' in stages:
+        for gridSize in graphSizes:
+            results.append(benchmarkGraph(gridSize, repeats))
+            print('measured', {'gridSize': gridSize})
+
+    return {'machine': {'python': sys.version.split()[0],
+                        'numpy': np.__version__,
+                        'platform': platform.platform(),
+                        'processor': platform.processor()},
+            'seed': SEED,
+            'repeats': repeats,
+            'results': results}
+
+
+##
+# @brief      Gets the key identifying a result across benchmark runs
+#
+# @param      result  The result dict
+#
+# @return     the (stage, sorted params) tuple
+#
+def getResultKey(result):
+
+    return (result['stage'], tuple(sorted(result['params'].items())))
+
+
+##
+# @brief      Compares results against a baseline run and prints the ratios
+#
+#             A result regresses if its time or peak memory grew by more than
+#             the tolerance, ignoring memory changes of less than a kibibyte.
+#
+# @param      results    The list of result dicts of this run
+# @param      baseline   The list of result dicts of the baseline run
+# @param      tolerance  The allowed fractional growth, e.g. 0.25 for 25%
+#
+# @return     list of the regressed result keys
+#
+def compareToBaseline(results, baseline, tolerance):
+
+    baselineByKey = {getResultKey(result): result for result in baseline}
+    regressions = []
+
+    print('%-20s %-44s %10s %10s' % ('stage', 'params', 'time', 'memory'))
+    for result in results:
+
+        key = getResultKey(result)
+        base = baselineByKey.get(key)
+        if base is None:
+            continue
+
+        timeRatio = result['seconds'] / max(base['seconds'], 1e-12)
+        memoryRatio = result['peakBytes'] / max(base['peakBytes'], 1)
+
+        slower = timeRatio > 1 + tolerance
+        bigger = (memoryRatio > 1 + tolerance and
+                  result['peakBytes'] - base['peakBytes'] > 1024)
+
+        params = ' '.join('%s=%s' % item for item in key[1])
+        print('%-20s %-44s %9.2fx %9.2fx%s' %
+              (result['stage'], params, timeRatio, memoryRatio,
+               '  REGRESSION' if slower or bigger else ''))
+
+        if slower or bigger:
+            regressions.append(key)
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Times and measures the memory of each synthesis stage '
+                    'over sweeps of the problem size')
+    parser.add_argument('--out', default='benchmarkResults.json',
+                        help='the JSON results file to write')
+    parser.add_argument('--baseline', default=None,
+                        help='a JSON results file to compare against, exits '
+                             'with status 1 on any regression')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='the allowed fractional slowdown or memory '
+                             'growth over the baseline, wide enough for the '
+                             'timing noise of a shared machine')
+    parser.add_argument('--stages', nargs='+', choices=STAGES,
+                        default=STAGES, help='the stages to measure')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='the number of timing runs, the fastest is kept')
+    parser.add_argument('--quick', action='store_true',
+                        help='run smaller sweeps')
+    parser.add_argument('--graphMethods', action='store_true',
+                        help='only compare the findPathToGoal methods')
+    args = parser.parse_args()
+
+    if args.graphMethods:
+        compareGraphMethods(args.quick)
+        return
+
+    document = runSuite(args.stages, args.quick, args.repeats)
+
+    with open(args.out, 'w') as outFile:
+        json.dump(document, outFile, indent=2)
+    print('wrote', len(document['results']), 'results to', args.out)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)['results']
+
+        regressions = compareToBaseline(document['results'], baseline,
+                                        args.tolerance)
+        if regressions:
+            print(len(regressions), 'regressions over', args.baseline)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
 # 3rd-party packages
 import matplotlib.pyplot as plt
 import networkx as nx
-import heapq
-import queue
 import numpy as np
-import copy
+import scipy.sparse
+import scipy.sparse.csgraph
 
 
 ##
@@ -12,6 +11,12 @@ import copy
 #
 class Graph(nx.Graph):
 
+    # the search bookkeeping node data is not kept in the networkx node
+    # attribute dicts, but in dense lists indexed by an integer node id. Each
+    # node's entries are only valid if its stamp matches the current search
+    # epoch, so reset() just starts a new epoch instead of touching every node.
+    SEARCH_DATA_DEFAULTS = {'dist': np.inf, 'priority': np.inf, 'prev': None}
+
     ##
     # @brief      Constructs a new instance of the Graph
     #
@@ -26,6 +31,23 @@ class Graph(nx.Graph):
         # need to start with a fully initialized networkx digraph
         super().__init__()
 
+        self.nodeLabels = []
+        self.nodeIds = {}
+
+        # bumped by every change to the set of nodes, so the node ids can tell
+        # that they are stale even if the number of nodes is the same
+        self.nodesVersion = 0
+        self.nodeIdsVersion = 0
+
+        self.searchData = {key: [] for key in self.SEARCH_DATA_DEFAULTS}
+        self.searchStamps = []
+        self.searchEpoch = 0
+
+        # ALT landmark distance tables, see buildLandmarks
+        self.landmarks = []
+        self.landmarkIds = {}
+        self.landmarkDists = None
+
         if nodes:
             self.add_nodes_from(nodes)
 
@@ -40,6 +62,8 @@ class Graph(nx.Graph):
             #   - 'dist'
             #   - 'priority'
             #   - 'pos'
+            # where 'prev', 'dist' and 'priority' are only read and written
+            # through the search bookkeeping lists (see getNodeData)
             self.nodeProperties = set([k for n in self.nodes
                                        for k in self.nodes[n].keys()])
 
@@ -47,18 +71,26 @@ class Graph(nx.Graph):
     # @brief      Finds a path in the graph from start to goal using the search
     #             algorithm specified by method string
     #
-    # @param      start   The start node label
-    # @param      goal    The goal node label
-    # @param      method  The method string:
-    #                       - 'A star'
-    #                       - 'Dijkstra'
+    # @param      start      The start node label
+    # @param      goal       The goal node label
+    # @param      method     The method string:
+    #                          - 'A star'
+    #                          - 'Dijkstra'
+    #                          - 'bidirectional Dijkstra'
+    #                          - 'bidirectional A star'
+    #                          - 'ALT': A star with the landmark heuristic
+    #                            (see buildLandmarks), needing no
+    #                            'heuristicDist' node data
+    # @param      heuristic  The heuristic function for 'bidirectional A
+    #                        star' (see findPathBidirectional), defaults to
+    #                        the landmark heuristic if landmarks were built
     #
     # @return     (path as a list of node labels in the graph - None if no path
     #             found, length of the shortest path - None if no path found,
     #             number of iterations of the while loop (num of node dequeues)
     #             needed to find a path)
     #
-    def findPathToGoal(self, start, goal, method):
+    def findPathToGoal(self, start, goal, method, heuristic=None):
 
         path = None
         pathLength = None
@@ -68,47 +100,257 @@ class Graph(nx.Graph):
             path = [start]
             return (path, pathLength, numIter)
 
+        if method == 'bidirectional Dijkstra':
+            return self.findPathBidirectional(start, goal)
+
+        elif method == 'bidirectional A star':
+            if heuristic is None:
+                if not self.landmarks:
+                    raise ValueError('bidirectional A star needs a heuristic '
+                                     'or landmarks')
+                heuristic = self.getLandmarkHeuristic()
+            return self.findPathBidirectional(start, goal, heuristic)
+
+        elif method == 'ALT':
+            if not self.landmarks:
+                self.buildLandmarks()
+            landmarkHeuristic = self.getLandmarkHeuristic()
+
+            def nodeHeuristic(node):
+                return landmarkHeuristic(node, goal)
+
+            return self.findPathToAnyGoal(start, (goal,), 'A star',
+                                          nodeHeuristic=nodeHeuristic)
+
+        elif method not in ('A star', 'Dijkstra'):
+            raise ValueError(method)
+
+        return self.findPathToAnyGoal(start, (goal,), method)
+
+    ##
+    # @brief      Finds a path in the graph from start to the nearest of a set
+    #             of goal nodes, with a single search that stops at the first
+    #             goal node to come off of the queue
+    #
+    # @param      start   The start node label
+    # @param      goals   The goal node labels, any container supporting `in`
+    #                     (e.g. a set of labels, or a GoalSet.GoalSet for
+    #                     (x, y) node labels)
+    # @param      method  The method string:
+    #                       - 'A star': the heuristic has to be a lower bound
+    #                         on the distance to the nearest goal
+    #                       - 'Dijkstra'
+    # @param      nodeHeuristic  The A star heuristic, a function of a node
+    #                            label. Defaults to the nodes' 'heuristicDist'.
+    #
+    # @return     (path as a list of node labels in the graph, ending at the
+    #             goal reached - None if no path found, length of the shortest
+    #             path - None if no path found, number of iterations of the
+    #             while loop (num of node dequeues) needed to find a path)
+    #
+    def findPathToAnyGoal(self, start, goals, method, nodeHeuristic=None):
+
+        path = None
+        pathLength = None
+        numIter = 0
+
+        if start in goals:
+            path = [start]
+            return (path, pathLength, numIter)
+
+        if method not in ('A star', 'Dijkstra'):
+            raise ValueError(method)
+        useHeuristic = (method == 'A star')
+
+        if nodeHeuristic is None:
+            def nodeHeuristic(node):
+                return self.nodes[node]['heuristicDist']
+
         # initialize the auxillary distance and tree arrays
         self.reset()
         self.setNodeData(start, 'priority', 0)
         self.setNodeData(start, 'dist', 0)
 
+        # the search loop works on the id indexed search lists directly, doing
+        # the same as isTense, relax and searchShouldHalt
+        nodeIds = self.nodeIds
+        dists = self.searchData['dist']
+        priorities = self.searchData['priority']
+        prevs = self.searchData['prev']
+        stamps = self.searchStamps
+        epoch = self.searchEpoch
+
         # both A star and dijkstra need a set type (unique element) priority
-        # queue
-        Q = UniquePriorityQueue()
+        # queue, with decrease-key for the nodes relaxed while queued
+        Q = IndexedPriorityQueue()
 
         # start the search at the start node
         Q.put(self.getPriorityTuple(start))
 
-        # iterate until we cant add any more nodes or we reach the goal node
+        # iterate until we cant add any more nodes or we reach a goal node
         while not Q.empty():
 
             # pop the minimum priority node off of the queue
             currPriority, currNode = Q.get()
             numIter += 1
 
-            # determine whether to stop searching based on the search
-            # method
-            if self.searchShouldHalt(currNode, goal, method):
+            currId = nodeIds[currNode]
+            currDist = dists[currId]
+            currPrev = prevs[currId]
+
+            # both methods can stop as soon as a goal comes off of the
+            # queue (see searchShouldHalt)
+            if currNode in goals:
 
-                pathLength = self.getNodeData(currNode, 'dist')
-                path = self.reversePathFromGoal(start, goal)
+                pathLength = currDist
+                path = self.reversePathFromGoal(start, currNode)
                 break
 
             # need to examine all outgoing edges and relax them
-            for neighbor in self.adj[currNode]:
+            for neighbor, edgeData in self.adj[currNode].items():
+
+                # need to prevent cyclical paths when using undirected graphs
+                if currPrev == neighbor:
+                    continue
+
+                destId = nodeIds[neighbor]
+                if stamps[destId] == epoch:
+                    oldDestDist = dists[destId]
+                else:
+                    oldDestDist = np.inf
 
-                currEdge = (currNode, neighbor)
+                destDist = currDist + edgeData['weight']
+                if destDist >= oldDestDist:
+                    continue
 
-                if self.isTense(currEdge, method):
+                # once we find a tense node, relax it and add it to the
+                # search priority queue
+                if useHeuristic:
+                    destPriority = destDist + nodeHeuristic(neighbor)
 
-                    # once we find a tense node, relax it and add it to the
-                    # search priority queue
-                    self.relax(currEdge, method)
-                    Q.put(self.getPriorityTuple(neighbor))
+                    # no goal can be reached from neighbor at all
+                    if destPriority == np.inf:
+                        continue
+                else:
+                    destPriority = destDist
+
+                dists[destId] = destDist
+                priorities[destId] = destPriority
+                prevs[destId] = currNode
+                stamps[destId] = epoch
+
+                Q.put((destPriority, neighbor))
 
         return (path, pathLength, numIter)
 
+    ##
+    # @brief      Finds a path in the graph from start to goal by searching
+    #             forwards from start and backwards from goal at the same time,
+    #             until the two searches meet in the middle
+    #
+    #             Without a heuristic this is bidirectional Dijkstra. With a
+    #             heuristic, both searches use the average potential
+    #
+    #               p(v) = (heuristic(v, goal) - heuristic(start, v)) / 2
+    #
+    #             forwards and -p(v) backwards. Both then search the same graph
+    #             of reduced edge weights, which are nonnegative for a
+    #             consistent heuristic, so the usual bidirectional Dijkstra
+    #             stopping rule stays exact: stop once the two queue minimums
+    #             add up to at least the best path found so far.
+    #
+    # @param      start      The start node label
+    # @param      goal       The goal node label
+    # @param      heuristic  Function of two node labels, giving a consistent
+    #                        lower bound on the distance between them. None
+    #                        for no heuristic.
+    #
+    # @return     (path as a list of node labels in the graph - None if no path
+    #             found, length of the shortest path - None if no path found,
+    #             number of node dequeues of both searches)
+    #
+    def findPathBidirectional(self, start, goal, heuristic=None):
+
+        if heuristic is None:
+            def potential(node):
+                return 0.0
+        else:
+            # each node's potential is needed every time it is relaxed
+            potentials = {}
+
+            def potential(node):
+                nodePotential = potentials.get(node)
+                if nodePotential is None:
+                    nodePotential = 0.5 * (heuristic(node, goal) -
+                                           heuristic(start, node))
+                    potentials[node] = nodePotential
+                return nodePotential
+
+        # forwards (index 0) and backwards (index 1) search data, keyed by
+        # node label as only a small part of the graph should be searched
+        dists = ({start: 0.0}, {goal: 0.0})
+        prevs = ({start: None}, {goal: None})
+        queues = (IndexedPriorityQueue(), IndexedPriorityQueue())
+        signs = (1.0, -1.0)
+        queues[0].put((potential(start), start))
+        queues[1].put((-potential(goal), goal))
+
+        bestLength = np.inf
+        meetNode = None
+        numIter = 0
+
+        while not queues[0].empty() and not queues[1].empty():
+
+            minKeys = (queues[0].heap[0][0], queues[1].heap[0][0])
+            if minKeys[0] + minKeys[1] >= bestLength:
+                break
+
+            # advance the search with the smaller queue minimum
+            side = 0 if minKeys[0] <= minKeys[1] else 1
+            dist, prev = dists[side], prevs[side]
+            otherDist = dists[1 - side]
+            sign = signs[side]
+
+            _, currNode = queues[side].get()
+            numIter += 1
+            currDist = dist[currNode]
+
+            for neighbor, edgeData in self.adj[currNode].items():
+
+                destDist = currDist + edgeData['weight']
+                if destDist >= dist.get(neighbor, np.inf):
+                    continue
+
+                dist[neighbor] = destDist
+                prev[neighbor] = currNode
+                queues[side].put((destDist + sign * potential(neighbor),
+                                  neighbor))
+
+                # a path through neighbor is found once both searches reach it
+                if neighbor in otherDist:
+                    length = destDist + otherDist[neighbor]
+                    if length < bestLength:
+                        bestLength = length
+                        meetNode = neighbor
+
+        if meetNode is None:
+            return (None, None, numIter)
+
+        # stitch the two halves of the path together at the meeting node
+        path = []
+        currNode = meetNode
+        while currNode is not None:
+            path.append(currNode)
+            currNode = prevs[0][currNode]
+        path.reverse()
+
+        currNode = prevs[1][meetNode]
+        while currNode is not None:
+            path.append(currNode)
+            currNode = prevs[1][currNode]
+
+        return (path, bestLength, numIter)
+
     ##
     # @brief      Determines if an edge is "tense" - not part of the solution
     #             as there exists an alternate path with smaller total expected
@@ -124,12 +366,12 @@ class Graph(nx.Graph):
     def isTense(self, edgeLabel, method):
 
         (source, dest, weight, srcDist, _,
-         _, destPriority) = self.getEdgeData(edgeLabel, method)
+         destDist, _) = self.getEdgeData(edgeLabel, method)
 
         # need to prevent cyclical paths when using undirected graphs
         alreadyVisitedEdge = (self.getNodeData(source, 'prev') == dest)
         if not alreadyVisitedEdge:
-            edgeIsTense = (srcDist + weight) < destPriority
+            edgeIsTense = (srcDist + weight) < destDist
         else:
             edgeIsTense = False
 
@@ -182,14 +424,13 @@ class Graph(nx.Graph):
 
         if method == 'A star':
 
-            destDist = copy.deepcopy(self.getNodeData(source, 'dist')) + weight
-            destPriority = copy.deepcopy(destDist) + \
-                self.getNodeData(dest, 'heuristicDist')
+            destDist = self.getNodeData(source, 'dist') + weight
+            destPriority = destDist + self.getNodeData(dest, 'heuristicDist')
 
         elif method == 'Dijkstra':
 
-            destDist = copy.deepcopy(self.getNodeData(source, 'dist')) + weight
-            destPriority = copy.deepcopy(destDist)
+            destDist = self.getNodeData(source, 'dist') + weight
+            destPriority = destDist
 
         else:
             raise ValueError(method)
@@ -215,7 +456,7 @@ class Graph(nx.Graph):
 
         source = edgeLabel[0]
         dest = edgeLabel[1]
-        weight = self.edges[edgeLabel]['weight']
+        weight = self.adj[source][dest]['weight']
 
         srcDist = self.getNodeData(source, 'dist')
         srcPriority = self.getNodeData(source, 'priority')
@@ -229,6 +470,11 @@ class Graph(nx.Graph):
     ##
     # @brief      Determines whether the search should halt
     #
+    #             The queue keeps every node at its current priority, so once
+    #             the goal is popped no shorter path is left to search, for
+    #             Dijkstra and for A star with an admissible heuristic (nodes
+    #             relaxed again after being popped are simply queued again).
+    #
     # @param      currNode  The current node label
     # @param      goal      The goal node label
     # @param      method    The method string:
@@ -241,19 +487,7 @@ class Graph(nx.Graph):
 
         atGoal = (currNode == goal)
 
-        if method == 'A star':
-
-            if atGoal:
-
-                prevNode = self.getNodeData(currNode, 'prev')
-                currDist = self.getNodeData(currNode, 'dist')
-                prevPriority = self.getNodeData(prevNode, 'priority')
-
-                noShorterPathsStillToSearch = (currDist <= prevPriority)
-
-                return noShorterPathsStillToSearch
-
-        elif method == 'Dijkstra':
+        if method in ('A star', 'Dijkstra'):
 
             return atGoal
 
@@ -377,6 +611,10 @@ class Graph(nx.Graph):
     ##
     # @brief      Gets the node's dataKey data from the graph
     #
+    #             The search bookkeeping keys ('dist', 'priority' and 'prev')
+    #             are read from the search lists, and read as their default
+    #             if the node has not been written to since the last reset().
+    #
     # @param      nodeLabel  The node label
     # @param      dataKey    The data key string
     #
@@ -384,9 +622,15 @@ class Graph(nx.Graph):
     #
     def getNodeData(self, nodeLabel, dataKey):
 
-        nodeData = self.nodes.data()
+        if dataKey in self.SEARCH_DATA_DEFAULTS:
+
+            nodeId = self.getNodeId(nodeLabel)
+            if self.searchStamps[nodeId] != self.searchEpoch:
+                return self.SEARCH_DATA_DEFAULTS[dataKey]
 
-        return nodeData[nodeLabel][dataKey]
+            return self.searchData[dataKey][nodeId]
+
+        return self.nodes[nodeLabel][dataKey]
 
     ##
     # @brief      Sets the node's dataKey data from the graph
@@ -397,8 +641,144 @@ class Graph(nx.Graph):
     #
     def setNodeData(self, nodeLabel, dataKey, data):
 
-        nodeData = self.nodes.data()
-        nodeData[nodeLabel][dataKey] = data
+        if dataKey in self.SEARCH_DATA_DEFAULTS:
+
+            nodeId = self.getNodeId(nodeLabel)
+
+            # first write to the node this search, so clear out its stale
+            # entries from previous searches
+            if self.searchStamps[nodeId] != self.searchEpoch:
+                for key, default in self.SEARCH_DATA_DEFAULTS.items():
+                    self.searchData[key][nodeId] = default
+                self.searchStamps[nodeId] = self.searchEpoch
+
+            self.searchData[dataKey][nodeId] = data
+
+        else:
+            self.nodes[nodeLabel][dataKey] = data
+
+    ##
+    # @brief      Gets the integer node id of a node label, the index of the
+    #             node into the search bookkeeping lists
+    #
+    # @param      nodeLabel  The node label
+    #
+    # @return     The node id
+    #
+    def getNodeId(self, nodeLabel):
+
+        nodeId = self.nodeIds.get(nodeLabel)
+
+        # nodes added since the ids were assigned get them now
+        if nodeId is None:
+            self.updateNodeIds(force=True)
+            nodeId = self.nodeIds[nodeLabel]
+
+        return nodeId
+
+    ##
+    # @brief      Reassigns the integer node ids and reallocates the search
+    #             bookkeeping lists, if the graph's nodes have changed
+    #
+    # @param      force  Reassign the ids even if the nodes are unchanged
+    #
+    def updateNodeIds(self, force=False):
+
+        if self.nodeIdsVersion == self.nodesVersion and not force:
+            return
+
+        numNodes = self.number_of_nodes()
+        self.nodeIdsVersion = self.nodesVersion
+        self.nodeLabels = list(self.nodes)
+        self.nodeIds = {label: i for i, label in enumerate(self.nodeLabels)}
+        self.searchData = {key: [default] * numNodes for key, default
+                           in self.SEARCH_DATA_DEFAULTS.items()}
+        self.searchStamps = [self.searchEpoch] * numNodes
+
+    ##
+    # @brief      Adds a node, invalidating the node ids if it is new
+    #
+    #             The networkx methods that add or remove nodes are all
+    #             wrapped like this one, as a remove followed by an add leaves
+    #             the number of nodes unchanged but the ids stale.
+    #
+    # @param      nodeLabel  The node label
+    # @param      attr       The node attributes
+    #
+    def add_node(self, nodeLabel, **attr):
+
+        numNodes = self.number_of_nodes()
+        super().add_node(nodeLabel, **attr)
+        if self.number_of_nodes() != numNodes:
+            self.nodesVersion += 1
+
+    ##
+    # @brief      Adds nodes, invalidating the node ids if any are new
+    #
+    # @param      nodes  The nodes, as for networkx's add_nodes_from
+    # @param      attr   The attributes of every node
+    #
+    def add_nodes_from(self, nodes, **attr):
+
+        numNodes = self.number_of_nodes()
+        super().add_nodes_from(nodes, **attr)
+        if self.number_of_nodes() != numNodes:
+            self.nodesVersion += 1
+
+    ##
+    # @brief      Removes a node, invalidating the node ids
+    #
+    # @param      nodeLabel  The node label
+    #
+    def remove_node(self, nodeLabel):
+
+        super().remove_node(nodeLabel)
+        self.nodesVersion += 1
+
+    ##
+    # @brief      Removes nodes, invalidating the node ids
+    #
+    # @param      nodes  The node labels
+    #
+    def remove_nodes_from(self, nodes):
+
+        super().remove_nodes_from(nodes)
+        self.nodesVersion += 1
+
+    ##
+    # @brief      Adds an edge, invalidating the node ids if it adds nodes
+    #
+    # @param      u     The source node label
+    # @param      v     The destination node label
+    # @param      attr  The edge attributes
+    #
+    def add_edge(self, u, v, **attr):
+
+        numNodes = self.number_of_nodes()
+        super().add_edge(u, v, **attr)
+        if self.number_of_nodes() != numNodes:
+            self.nodesVersion += 1
+
+    ##
+    # @brief      Adds edges, invalidating the node ids if they add nodes
+    #
+    # @param      edges  The edges, as for networkx's add_edges_from
+    # @param      attr   The attributes of every edge
+    #
+    def add_edges_from(self, edges, **attr):
+
+        numNodes = self.number_of_nodes()
+        super().add_edges_from(edges, **attr)
+        if self.number_of_nodes() != numNodes:
+            self.nodesVersion += 1
+
+    ##
+    # @brief      Removes every node and edge, invalidating the node ids
+    #
+    def clear(self):
+
+        super().clear()
+        self.nodesVersion += 1
 
     ##
     # @brief      prints the graph as a sequence of weighted edges
@@ -416,98 +796,550 @@ class Graph(nx.Graph):
     #
     def dispNodes(self):
 
-        for node in self.nodes(data=True):
-            print(node)
+        for node, data in self.nodes(data=True):
+
+            data = dict(data)
+            for key in self.SEARCH_DATA_DEFAULTS:
+                data[key] = self.getNodeData(node, key)
+            print((node, data))
 
     ##
     # @brief      Resets the graph's nodes to default state in order to run
     #             search algorithms on
     #
+    #             Starting a new search epoch invalidates every node's search
+    #             data at once, so this is O(1) unless the nodes have changed.
+    #
     def reset(self):
 
-        for node in self.nodes:
+        self.updateNodeIds()
+        self.searchEpoch += 1
+
+    ##
+    # @brief      Picks landmark nodes and stores every node's distance to
+    #             them, for the ALT (A star, Landmarks, Triangle inequality)
+    #             heuristic
+    #
+    #             The landmarks are picked by farthest point selection: each
+    #             new landmark is the node farthest from all of the landmarks
+    #             picked so far (nodes in another connected component count as
+    #             infinitely far), which spreads them around the edges of the
+    #             graph where they give the tightest bounds. The distance
+    #             tables are a snapshot, rebuild them after changing the graph.
+    #
+    # @param      numLandmarks  The number of landmarks to pick
+    #
+    # @return     the list of landmark node labels
+    #
+    def buildLandmarks(self, numLandmarks=8):
+
+        compiledGraph = self.compile()
+        numNodes = len(compiledGraph.labels)
+
+        landmarkIds = []
+        rows = []
+
+        # start the farthest point selection from the node farthest from an
+        # arbitrary node, as it is on the edge of the graph
+        minDists = np.full(numNodes, np.inf)
+        if numNodes:
+            minDists = compiledGraph.getDistanceMatrix(
+                [compiledGraph.labels[0]])[0]
+
+        while len(landmarkIds) < min(numLandmarks, numNodes):
+
+            nextId = int(np.argmax(minDists))
+            if landmarkIds and minDists[nextId] == 0:
+                break
+
+            row = compiledGraph.getDistanceMatrix(
+                [compiledGraph.labels[nextId]])[0]
+            landmarkIds.append(nextId)
+            rows.append(row)
+            minDists = row if len(rows) == 1 else np.minimum(minDists, row)
+
+        self.landmarks = [compiledGraph.labels[i] for i in landmarkIds]
+        self.landmarkIds = compiledGraph.labelIds
+        self.landmarkDists = np.ascontiguousarray(np.array(rows).T) if rows \
+            else np.zeros((numNodes, 0))
+
+        return self.landmarks
+
+    ##
+    # @brief      Gets the ALT heuristic of the landmarks
+    #
+    #             By the triangle inequality, every landmark L bounds the
+    #             distance between any two nodes u and v of the undirected
+    #             graph by |d(L, u) - d(L, v)|, and the heuristic is the
+    #             tightest of these bounds. It is admissible and consistent.
+    #
+    # @return     function of two node labels, giving a lower bound on the
+    #             distance between them
+    #
+    def getLandmarkHeuristic(self):
+
+        landmarkIds = self.landmarkIds
+        landmarkDists = self.landmarkDists
+
+        def heuristic(source, dest):
+
+            with np.errstate(invalid='ignore'):
+                bounds = np.abs(landmarkDists[landmarkIds[source]] -
+                                landmarkDists[landmarkIds[dest]])
+
+            # landmarks in another component than both nodes give nan bounds,
+            # which fmax skips
+            return float(np.fmax.reduce(bounds, initial=0.0))
+
+        return heuristic
+
+    ##
+    # @brief      Saves the landmark distance tables to a .npz file
+    #
+    # @param      path  The file path
+    #
+    def saveLandmarks(self, path):
+
+        labels = np.empty(len(self.landmarkIds), dtype=object)
+        for label, i in self.landmarkIds.items():
+            labels[i] = label
+
+        landmarks = np.empty(len(self.landmarks), dtype=object)
+        for i, label in enumerate(self.landmarks):
+            landmarks[i] = label
+
+        np.savez(path, labels=labels, landmarks=landmarks,
+                 landmarkDists=self.landmarkDists)
+
+    ##
+    # @brief      Loads landmark distance tables saved by saveLandmarks
+    #
+    # @param      path  The file path
+    #
+    # @return     the list of landmark node labels
+    #
+    def loadLandmarks(self, path):
+
+        # the node labels are stored as pickled python objects
+        with np.load(path, allow_pickle=True) as saved:
+            labels = saved['labels'].tolist()
+            landmarks = saved['landmarks'].tolist()
+            landmarkDists = saved['landmarkDists']
+
+        landmarkIds = {label: i for i, label in enumerate(labels)}
+        missingNodes = [node for node in self.nodes
+                        if node not in landmarkIds]
+        if missingNodes:
+            raise ValueError('landmark tables in %s are missing %d of the '
+                             'graph\'s nodes' % (path, len(missingNodes)))
+
+        self.landmarks = landmarks
+        self.landmarkIds = landmarkIds
+        self.landmarkDists = landmarkDists
+
+        return self.landmarks
+
+    ##
+    # @brief      Freezes the graph into a CompiledGraph for fast, read only
+    #             shortest path queries
+    #
+    #             The CompiledGraph is a snapshot, it does not see any nodes or
+    #             edges added to the graph afterwards.
+    #
+    # @return     the CompiledGraph of this graph
+    #
+    def compile(self):
 
-            self.setNodeData(node, 'dist', np.inf)
-            self.setNodeData(node, 'priority', np.inf)
-            self.setNodeData(node, 'prev', None)
+        return CompiledGraph(self)
 
 
 ##
-# @brief      Implements a priority queue that maintains unique elements
+# @brief      A read only snapshot of a Graph as a CSR sparse matrix, answering
+#             shortest path queries with scipy.sparse.csgraph
 #
-#             Implemented according to official heapq documentation:
-#             https://stackoverflow.com/questions/5997189/how-can-i-make-a-unique-value-priority-queue-in-python
+#             Each node label is mapped to its row / column index in the
+#             matrix, every query runs in compiled code over the whole matrix,
+#             and the results are translated back to node labels.
+#
+class CompiledGraph:
+
+    ##
+    # @brief      Constructs a new instance of the CompiledGraph
+    #
+    # @param      graph  The Graph to compile, with a 'weight' on every edge
+    #
+    def __init__(self, graph):
+
+        self.labels = list(graph.nodes)
+        self.labelIds = {label: i for i, label in enumerate(self.labels)}
+        numNodes = len(self.labels)
+
+        numEdges = graph.number_of_edges()
+        sources = np.empty(numEdges, dtype=np.int64)
+        dests = np.empty(numEdges, dtype=np.int64)
+        weights = np.empty(numEdges, dtype=np.float64)
+        for i, (source, dest, weight) in enumerate(graph.edges(data='weight')):
+            sources[i] = self.labelIds[source]
+            dests[i] = self.labelIds[dest]
+            weights[i] = weight
+
+        # the graph is undirected, so each edge is stored once and csgraph is
+        # told to treat it as going both ways
+        self.matrix = scipy.sparse.csr_matrix((weights, (sources, dests)),
+                                              shape=(numNodes, numNodes))
+
+    ##
+    # @brief      Runs Dijkstra's algorithm from each of the source nodes
+    #
+    # @param      sourceIds  The source node indices
+    # @param      minOnly    Whether to only find the distance to the nearest
+    #                        of the sources, instead of one row per source
+    #
+    # @return     (the distance array(s), the predecessor array(s) - -9999 for
+    #             no predecessor, and the nearest source array if minOnly)
+    #
+    def runDijkstra(self, sourceIds, minOnly=False):
+
+        return scipy.sparse.csgraph.dijkstra(self.matrix, directed=False,
+                                             indices=sourceIds,
+                                             return_predecessors=True,
+                                             min_only=minOnly)
+
+    ##
+    # @brief      Finds a path in the graph from start to goal, with the same
+    #             interface as Graph.findPathToGoal
+    #
+    # @param      start      The start node label
+    # @param      goal       The goal node label
+    # @param      method     The method string, all find the same shortest
+    #                        path here:
+    #                          - 'A star'
+    #                          - 'Dijkstra'
+    #                          - 'bidirectional Dijkstra'
+    #                          - 'bidirectional A star'
+    #                          - 'ALT'
+    # @param      heuristic  Unused, only here for the same interface as
+    #                        Graph.findPathToGoal
+    #
+    # @return     (path as a list of node labels in the graph - None if no path
+    #             found, length of the shortest path - None if no path found,
+    #             number of nodes reached by the search)
+    #
+    def findPathToGoal(self, start, goal, method, heuristic=None):
+
+        if start == goal:
+            return ([start], None, 0)
+
+        if method not in ('A star', 'Dijkstra', 'bidirectional Dijkstra',
+                          'bidirectional A star', 'ALT'):
+            raise ValueError(method)
+
+        dists, prevs = self.runDijkstra(self.labelIds[start])
+        numReached = int(np.count_nonzero(np.isfinite(dists)))
+
+        goalId = self.labelIds[goal]
+        if not np.isfinite(dists[goalId]):
+            return (None, None, numReached)
+
+        path = self.getPathFromPredecessors(prevs, goalId)
+
+        return (path, float(dists[goalId]), numReached)
+
+    ##
+    # @brief      Finds a path in the graph from start to the nearest of a set
+    #             of goal nodes, with the same interface as
+    #             Graph.findPathToAnyGoal
+    #
+    # @param      start   The start node label
+    # @param      goals   The goal node labels, any container supporting `in`
+    # @param      method  The method string, both find the same shortest path
+    #                     here:
+    #                       - 'A star'
+    #                       - 'Dijkstra'
+    #
+    # @return     (path as a list of node labels in the graph, ending at the
+    #             goal reached - None if no path found, length of the shortest
+    #             path - None if no path found, number of nodes reached by the
+    #             search)
+    #
+    def findPathToAnyGoal(self, start, goals, method):
+
+        if start in goals:
+            return ([start], None, 0)
+
+        if method not in ('A star', 'Dijkstra'):
+            raise ValueError(method)
+
+        dists, prevs = self.runDijkstra(self.labelIds[start])
+        numReached = int(np.count_nonzero(np.isfinite(dists)))
+
+        goalIds = np.array([i for i, label in enumerate(self.labels)
+                            if label in goals], dtype=np.int64)
+        if not len(goalIds) or not np.isfinite(dists[goalIds]).any():
+            return (None, None, numReached)
+
+        goalId = goalIds[np.argmin(dists[goalIds])]
+        path = self.getPathFromPredecessors(prevs, goalId)
+
+        return (path, float(dists[goalId]), numReached)
+
+    ##
+    # @brief      Finds the shortest distances and the shortest path tree from
+    #             a source node to every node it can reach
+    #
+    # @param      source  The source node label
+    #
+    # @return     (dict of node label to its distance from source, dict of node
+    #             label to its previous node label on the shortest path - None
+    #             for the source)
+    #
+    def getShortestPathsFrom(self, source):
+
+        dists, prevs = self.runDijkstra(self.labelIds[source])
+
+        return self.getLabelledResults(dists, prevs)
+
+    ##
+    # @brief      Finds the shortest distance from every node to the nearest of
+    #             a set of source nodes
+    #
+    # @param      sources  The list of source node labels
+    #
+    # @return     (dict of node label to its distance from the nearest source,
+    #             dict of node label to that nearest source's label), over the
+    #             nodes any source can reach
+    #
+    def getShortestPathsFromMany(self, sources):
+
+        sourceIds = [self.labelIds[source] for source in sources]
+        dists, _, nearest = self.runDijkstra(sourceIds, minOnly=True)
+
+        return self.getLabelledResults(dists, nearest)
+
+    ##
+    # @brief      Finds the shortest distances from each source node to all of
+    #             the nodes
+    #
+    # @param      sources  The list of source node labels
+    #
+    # @return     (len(sources), number of nodes) array of the distances, inf
+    #             where unreachable. The columns are in the order of
+    #             self.labels.
+    #
+    def getDistanceMatrix(self, sources):
+
+        sourceIds = [self.labelIds[source] for source in sources]
+        dists, _ = self.runDijkstra(sourceIds)
+
+        return np.atleast_2d(dists)
+
+    ##
+    # @brief      Translates distance and node index arrays over all nodes into
+    #             dicts over the reachable node labels
+    #
+    # @param      dists    The distance array
+    # @param      nodeIds  The array of node indices per node, < 0 for none
+    #
+    # @return     (dict of node label to distance, dict of node label to the
+    #             label of its entry in nodeIds - None for < 0)
+    #
+    def getLabelledResults(self, dists, nodeIds):
+
+        labels = self.labels
+        distDict = {}
+        nodeDict = {}
+        for i in np.flatnonzero(np.isfinite(dists)):
+            distDict[labels[i]] = float(dists[i])
+            nodeDict[labels[i]] = labels[nodeIds[i]] if nodeIds[i] >= 0 \
+                else None
+
+        return (distDict, nodeDict)
+
+    ##
+    # @brief      Follows a predecessor array back from the goal to the source
+    #             of the search
+    #
+    # @param      prevs   The predecessor array, < 0 at the source
+    # @param      goalId  The goal node index
+    #
+    # @return     list of node labels starting with the source node
+    #
+    def getPathFromPredecessors(self, prevs, goalId):
+
+        path = []
+        currId = goalId
+        while currId >= 0:
+            path.append(self.labels[currId])
+            currId = prevs[currId]
+
+        path.reverse()
+
+        return path
+
+
+##
+# @brief      Implements an indexed binary min-heap priority queue with a
+#             real decrease-key
 #
-# - https://github.com/python/cpython/blob/2.7/Lib/Queue.py
-# - https://docs.python.org/3/library/heapq.html
+#             Each task is in the queue at most once. A position map from task
+#             to heap index lets putting an already queued task change its
+#             priority in place (O(log n)), instead of leaving the task queued
+#             at its old priority. Popped tasks can be put back in again.
+#             There is no locking, the queue is meant for single threaded
+#             searches.
 #
-class UniquePriorityQueue(queue.Queue):
-
-    def _init(self, maxsize):
-        """!
-        @brief      Initializes the given maxsize.
-        @param      maxsize  The maxsize
-        """
-
-        self.queue = []
-        self.REMOVED = '<removed-task>'
-        self.entry_finder = {}
-
-    def _put(self, item, heappush=heapq.heappush):
-        """!
-        @brief      adds the tuple of priority and item to the queue
-        @param      item      The item
-        @param      heappush  The heappush
-        """
-
-        item = list(item)
+class IndexedPriorityQueue:
+
+    ##
+    # @brief      Constructs a new, empty instance of the IndexedPriorityQueue
+    #
+    def __init__(self):
+
+        # the heap of [priority, task] entries and each task's heap index
+        self.heap = []
+        self.positions = {}
+
+    def __len__(self):
+
+        return len(self.heap)
+
+    def __contains__(self, task):
+
+        return task in self.positions
+
+    ##
+    # @brief      Determines if the queue has no tasks in it
+    #
+    # @return     True if empty, False otherwise.
+    #
+    def empty(self):
+
+        return not self.heap
+
+    ##
+    # @brief      Adds a task to the queue, or changes the priority of the
+    #             task if it is already queued
+    #
+    # @param      item  The (priority, task) tuple
+    #
+    def put(self, item):
+
         priority, task = item
 
-        if task in self.entry_finder:
-            # Do not add new item.
-            pass
+        pos = self.positions.get(task)
+        if pos is None:
+            pos = len(self.heap)
+            self.heap.append([priority, task])
+            self.positions[task] = pos
+            self.siftUp(pos)
+
         else:
-            self.entry_finder[task] = item
-            heappush(self.queue, item)
+            oldPriority = self.heap[pos][0]
+            self.heap[pos][0] = priority
+
+            if priority < oldPriority:
+                self.siftUp(pos)
+            else:
+                self.siftDown(pos)
 
-    def _qsize(self, len=len):
+    ##
+    # @brief      Removes the task with the lowest priority from the queue
+    #
+    # @return     the (priority, task) tuple with the lowest priority
+    #
+    def get(self):
 
-        return len(self.entry_finder)
+        if not self.heap:
+            raise KeyError('pop from an empty priority queue')
 
-    def is_empty(self):
-        """!
-        Determines if the priority queue has any elements. Performs removal of
-        any elements that were "marked-as-invalid".
+        heap = self.heap
+        priority, task = heap[0]
+        del self.positions[task]
 
-        :returns: true iff the priority queue has no elements.
+        last = heap.pop()
+        if heap:
+            heap[0] = last
+            self.positions[last[1]] = 0
+            self.siftDown(0)
 
-        @return     True if empty, False otherwise.
-        """
-        while self.pq:
-            if self.queue[0][1] != self.REMOVED:
-                return False
+        return (priority, task)
+
+    ##
+    # @brief      Removes a task from anywhere in the queue
+    #
+    # @param      task  The task to remove
+    #
+    def remove(self, task):
+
+        heap = self.heap
+        pos = self.positions.pop(task)
+        removed = heap[pos]
+
+        last = heap.pop()
+        if pos < len(heap):
+            heap[pos] = last
+            self.positions[last[1]] = pos
+
+            if last[0] < removed[0]:
+                self.siftUp(pos)
             else:
-                _, _, element = heapq.heappop(self.pq)
-                if element in self.element_finder:
-                    del self.element_finder[element]
-        return True
+                self.siftDown(pos)
 
-    def _get(self, heappop=heapq.heappop):
-        """
-        The base makes sure this shouldn't be called if `_qsize` is 0.
+    ##
+    # @brief      Moves the entry at pos up the heap until its parent has a
+    #             lower or equal priority
+    #
+    # @param      pos   The heap index of the entry
+    #
+    def siftUp(self, pos):
 
-        @param      heappop  The heappop
+        heap = self.heap
+        positions = self.positions
+        entry = heap[pos]
+
+        while pos > 0:
+            parentPos = (pos - 1) >> 1
+            parent = heap[parentPos]
+            if entry[0] >= parent[0]:
+                break
 
-        @return     the lowest priority item
-        """
-        while self.queue:
+            heap[pos] = parent
+            positions[parent[1]] = pos
+            pos = parentPos
 
-            item = heappop(self.queue)
-            _, task = item
+        heap[pos] = entry
+        positions[entry[1]] = pos
 
-            if task is not self.REMOVED:
+    ##
+    # @brief      Moves the entry at pos down the heap until its children have
+    #             higher or equal priorities
+    #
+    # @param      pos   The heap index of the entry
+    #
+    def siftDown(self, pos):
+
+        heap = self.heap
+        positions = self.positions
+        entry = heap[pos]
+        numEntries = len(heap)
+
+        while True:
+            childPos = 2 * pos + 1
+            if childPos >= numEntries:
+                break
+
+            # move down towards the smaller of the two children
+            rightPos = childPos + 1
+            if rightPos < numEntries and heap[rightPos][0] < heap[childPos][0]:
+                childPos = rightPos
+
+            child = heap[childPos]
+            if entry[0] <= child[0]:
+                break
 
-                del self.entry_finder[task]
-                return item
+            heap[pos] = child
+            positions[child[1]] = pos
+            pos = childPos
 
-        raise KeyError('should never happen: pop from an empty priority queue')
+        heap[pos] = entry
+        positions[entry[1]] = pos
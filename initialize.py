@@ -1,4 +1,5 @@
 import os
+import GoalSet
 
 
 def getSimSettings():
@@ -60,11 +61,8 @@ def getSimSettings():
             savePath)
 
 
+# the car is at the goal in lane goalX once it is past goalYMin, up to and
+# including goalYMax. More exits can be added with GoalSet.addRegion.
 def makeGoalStates(goalX, goalYMin, goalYMax):
 
-    goalStates = []
-    for goalY in range(goalYMin, goalYMax + 1):
-        goal = (goalX, goalY)
-        goalStates.append(goal)
-
-    return goalStates
+    return GoalSet.GoalSet([(goalX, goalYMin + 1, goalYMax)])
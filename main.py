@@ -2,15 +2,57 @@ from __future__ import print_function
 import OS_Calls
 import initialize
 import POS
-import TransitionSystem
+import LazyTransitionSystem
 import LDBA
 import DFA
+import Instrumentation
+import argparse
+import json
 
 
 def main():
 
+    parser = argparse.ArgumentParser(
+        description='Synthesizes a controller for the highway scenario')
+    parser.add_argument('--stats', nargs='?', const='-', default=None,
+                        metavar='FILE',
+                        help='print the time and peak memory of each phase '
+                             'and the planner counters, or dump them to FILE '
+                             'as JSON')
+    parser.add_argument('--profile', default=None, metavar='FILE',
+                        help='profile the run with cProfile and dump the '
+                             'profile to FILE')
+    args = parser.parse_args()
+
     OS_Calls.clear_screen()
 
+    if args.stats is not None:
+        Instrumentation.enable()
+
+    if args.profile is not None:
+        with Instrumentation.profile(args.profile):
+            runPlanner()
+    else:
+        runPlanner()
+
+    if args.stats is not None:
+        stats = Instrumentation.disable()
+        if args.stats == '-':
+            print(stats.report())
+        else:
+            with open(args.stats, 'w') as statsFile:
+                json.dump(stats.asDict(), statsFile, indent=2)
+            print('wrote the planner stats to', args.stats)
+
+
+#
+# @brief      Runs the whole pipeline: builds the occupancy set, transition
+#             system and LDBA, solves their product and plots the solution
+#
+#             Each phase is measured if Instrumentation is enabled.
+#
+def runPlanner():
+
     ########################################################
     # defining simulation properties
     ########################################################
@@ -27,9 +69,10 @@ def main():
     # Defining the Occupancy Set
     ########################################################
 
-    POSMat = POS.makePOS(allLanes, allowedLaneVelocites,
-                         maxDist, maxTime,
-                         initCarX, initCarY)
+    with Instrumentation.phase('POS'):
+        POSMat = POS.makePOS(allLanes, allowedLaneVelocites,
+                             maxDist, maxTime,
+                             initCarX, initCarY)
 
     print('built the occupancy set')
 
@@ -37,22 +80,25 @@ def main():
     # Defining the Transition System
     ########################################################
 
-    print('building the transition system...')
-
-    DTS = TransitionSystem.TransitionSystem(initCarX, initCarY, initCarT,
-                                            initCarVel, maxTime, allLanes,
-                                            allVelocities,
-                                            allowedLaneVelocites,
-                                            goalStates, POSMat)
+    # the transitions are only built as the product search reaches them, so
+    # most of the transition system is built (and timed) in the product phase
+    with Instrumentation.phase('transitionSystem'):
+        DTS = LazyTransitionSystem.LazyTransitionSystem(initCarX, initCarY,
+                                                        initCarT, initCarVel,
+                                                        maxTime, allLanes,
+                                                        allVelocities,
+                                                        allowedLaneVelocites,
+                                                        goalStates, POSMat)
 
-    print('built the transition system')
+    print('set up the transition system')
 
     ########################################################
     # Defining the LTL Deterministic Buchi Automata (LDBA)
     #######################################################
 
     LTLFormula = 'G(!crashed & !speeding) & F(atGoal)'
-    LDBAObj = LDBA.LDBA(LTLFormula)
+    with Instrumentation.phase('LDBA'):
+        LDBAObj = LDBA.LDBA(LTLFormula)
 
     print('built the LDBA')
 
@@ -63,14 +109,23 @@ def main():
 
     print('calculating the product automata')
 
-    acceptingGoalNode = DFA.formAndSolveProduct(DTS=DTS, LDBA=LDBAObj)
+    # best-first search, guided by a lower bound on the time left to the goal
+    with Instrumentation.phase('product'):
+        (acceptingGoalNode,
+         numProdExpanded) = DFA.formAndSolveProductAStar(DTS=DTS,
+                                                         LDBA=LDBAObj)
+
+    print('expanded', numProdExpanded, 'product states, and',
+          len(DTS.expandedNodes), 'of the', len(DTS.DFA.nodes),
+          'transition system states built')
 
     if acceptingGoalNode is not None:
         print('found the final solution node in the product:')
     else:
         print('found no accepting path through product')
 
-    optimalPath = DFA.getPathToRootFromLeaf(acceptingGoalNode)
+    with Instrumentation.phase('path'):
+        optimalPath = DFA.getPathToRootFromLeaf(acceptingGoalNode)
 
     ########################################################
     # Print Results
@@ -78,8 +133,9 @@ def main():
 
     if acceptingGoalNode is not None:
         print('plotting results...')
-        POS.plotCarAndPOS(POSMat, optimalPath, savePath,
-                          initCarY, allLanes, goalStates, maxTime)
+        with Instrumentation.phase('plot'):
+            POS.plotCarAndPOS(POSMat, optimalPath, savePath,
+                              initCarY, allLanes, goalStates, maxTime)
         print('done. Have a swagtastic day!')
 
 
@@ -0,0 +1,43 @@
+import numpy as np
+import initialize
+import POS
+import ArrayTransitionSystem
+import ArrayProduct
+import LDBA
+
+
+def makeArrayTransitionSystem():
+
+    (allLanes, allVelocities,
+     allowedLaneVelocites, maxDist,
+     maxTime, goalStates, initCarX,
+     initCarY, initCarT, initCarVel,
+     _) = initialize.getSimSettings()
+
+    POSMat = POS.makePOS(allLanes, allowedLaneVelocites, maxDist, maxTime,
+                         initCarX, initCarY, seed=1)
+
+    return ArrayTransitionSystem.ArrayTransitionSystem(initCarX, initCarY,
+                                                       initCarT, initCarVel,
+                                                       maxTime, allLanes,
+                                                       allVelocities,
+                                                       allowedLaneVelocites,
+                                                       goalStates, POSMat)
+
+
+def test_acceptingPathWithEitherStopAtFirstAccept():
+
+    ATS = makeArrayTransitionSystem()
+    LDBAObj = LDBA.LDBA('G(!crashed & !speeding) & F(atGoal)')
+
+    stopped = ArrayProduct.ArrayProduct(ATS, LDBAObj, stopAtFirstAccept=True)
+    full = ArrayProduct.ArrayProduct(ATS, LDBAObj, stopAtFirstAccept=False)
+
+    assert stopped.acceptingIndex is not None
+    assert full.acceptingIndex == stopped.acceptingIndex
+    assert np.array_equal(full.getPath(), stopped.getPath())
+    assert full.getNodePath() is not None
+
+    # the full search keeps going past the first accepting layer
+    assert len(full) > len(stopped)
+    assert full.numExpanded > stopped.numExpanded
@@ -0,0 +1,97 @@
+import numpy as np
+import TransitionSystem
+
+
+# a small road, so every state can be checked against a fresh build
+ALL_LANES = (0, 1)
+ALL_VELOCITIES = (1, 2, 3)
+ALLOWED_LANE_VELS = [(1, 2, 3), (1, 2, 3)]
+MAX_TIME = 3
+MAX_DIST = 20
+INIT_CAR_X, INIT_CAR_Y, INIT_CAR_VEL = 0, 0, 1
+GOAL_STATES = [(0, MAX_DIST)]
+
+
+def makeTS(POS):
+
+    return TransitionSystem.TransitionSystem(INIT_CAR_X, INIT_CAR_Y, 0,
+                                             INIT_CAR_VEL, MAX_TIME,
+                                             ALL_LANES, ALL_VELOCITIES,
+                                             ALLOWED_LANE_VELS, GOAL_STATES,
+                                             POS)
+
+
+# the sorted successor keys of every state reachable from the initial state,
+# keeping any duplicate edges
+def getAdjacency(TS):
+
+    adjacency = {}
+    nodeStack = [TS.nodes[0]]
+    while nodeStack:
+        node = nodeStack.pop()
+        stateKey = TS.getStateKey(node.state)
+        if stateKey in adjacency:
+            continue
+
+        adjacency[stateKey] = sorted(TS.getStateKey(nextNode.state)
+                                     for nextNode in node.adjList)
+        nodeStack.extend(node.adjList)
+
+    return adjacency
+
+
+# a POS cell in the lane swept by the last step into a state, which crashes
+# that state
+def getCrashingCell(stateKey):
+
+    carX, carY, carT, prevLane, prevVel = stateKey
+
+    return (prevLane, carY - prevVel, carT - 1)
+
+
+def test_updateOccupancyMatchesFreshBuild():
+
+    POS = np.zeros((len(ALL_LANES), MAX_DIST, MAX_TIME), dtype=bool)
+    TS = makeTS(POS.copy())
+
+    # every state after the first step that can be crashed, with each of its
+    # successors that can be crashed too
+    pairs = [(parent, child)
+             for parent in TS.nodes if parent.state.carT == 1
+             for child in parent.adjList
+             if parent.state.prevVel > min(ALL_VELOCITIES) and
+             child.state.prevVel > min(ALL_VELOCITIES)]
+    assert pairs
+
+    for parent, child in pairs:
+
+        parentCell = getCrashingCell(TS.getStateKey(parent.state))
+        childCell = getCrashingCell(TS.getStateKey(child.state))
+
+        # crash the parent, then in one batch free it again and crash one of
+        # the successors it is about to be rebuilt with
+        for batch in ([parentCell + (True,)],
+                      [parentCell + (False,), childCell + (True,)],
+                      [childCell + (False,)]):
+
+            for lane, y, t, isOccupied in batch:
+                POS[lane, y, t] = isOccupied
+
+            TS.updateOccupancy(batch)
+            assert getAdjacency(TS) == getAdjacency(makeTS(POS.copy()))
+            assertTombstonesExcluded(TS)
+
+
+# the Nodes of crashed states are kept as tombstones, which observe crashed,
+# have no successors and are not counted
+def assertTombstonesExcluded(TS):
+
+    liveNodes = [node for node in TS.stateIndex.values() if node is not None]
+    assert len(TS) == len(liveNodes)
+
+    for node in TS.nodes:
+        if node.index in TS.crashedNodeIndices:
+            assert node.obs.crashed and not node.adjList
+            assert TS.stateIndex[TS.getStateKey(node.state)] is not node
+        else:
+            assert TS.stateIndex[TS.getStateKey(node.state)] is node